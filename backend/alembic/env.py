@@ -10,7 +10,7 @@ config = context.config
 from src.settings import Settings  # noqa: E402
 
 settings = Settings()
-config.set_main_option("sqlalchemy.url", settings.postgres_dsn.unicode_string())
+config.set_main_option("sqlalchemy.url", settings.database_dsn)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,27 @@
+"""Keep article text and text processor
+
+Revision ID: 5d2c8e41a7f3
+Revises: b19a91a8178e
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2c8e41a7f3'
+down_revision: Union[str, None] = 'b19a91a8178e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('article', sa.Column('raw_content', sa.LargeBinary(), nullable=True))
+    op.add_column('article', sa.Column('text_processor', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('article', 'text_processor')
+    op.drop_column('article', 'raw_content')
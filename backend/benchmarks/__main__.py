@@ -0,0 +1,60 @@
+"""
+Command line interface for the benchmark suite. From the `backend` directory, with the project installed:
+
+    python -m benchmarks run --output results.json
+    python -m benchmarks compare baseline.json results.json
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.suite import DEFAULT_NUMBER_OF_QUERIES, DEFAULT_QUERY_LENGTHS, DEFAULT_SIZES, compare, run
+from common.reporting import print_comparison
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="benchmarks", description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and write the results as JSON.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Corpus sizes, in documents.")
+    run_parser.add_argument("--query-lengths", type=int, nargs="+", default=DEFAULT_QUERY_LENGTHS)
+    run_parser.add_argument("--queries", type=int, default=DEFAULT_NUMBER_OF_QUERIES, help="Queries per length.")
+    run_parser.add_argument("--impact-ordered", action="store_true", help="Build impact-ordered indexes.")
+    run_parser.add_argument("--compact-terms", action="store_true", help="Compact the indexes once they are built.")
+    run_parser.add_argument("--workers", type=int, default=1, help="The number of processes to build indexes with.")
+    run_parser.add_argument(
+        "--common-term-idf", type=float, help="Only score terms with a lower IDF for documents with other query terms."
+    )
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two sets of results.")
+    compare_parser.add_argument("baseline", type=argparse.FileType())
+    compare_parser.add_argument("candidate", type=argparse.FileType())
+
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> None:
+    parsed_args = _parse_args(args)
+    if parsed_args.command == "run":
+        results = run(
+            sizes=parsed_args.sizes,
+            query_lengths=parsed_args.query_lengths,
+            number_of_queries=parsed_args.queries,
+            impact_ordered=parsed_args.impact_ordered,
+            seed=parsed_args.seed,
+            compact_terms=parsed_args.compact_terms,
+            workers=parsed_args.workers,
+            common_term_idf=parsed_args.common_term_idf,
+        )
+        json.dump(results, parsed_args.output, indent=2)
+        parsed_args.output.write("\n")
+        return
+
+    print_comparison(compare(json.load(parsed_args.baseline), json.load(parsed_args.candidate)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
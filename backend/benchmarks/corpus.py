@@ -0,0 +1,99 @@
+"""
+Synthetic corpora for benchmarking.
+
+Term frequencies follow a Zipfian distribution and the vocabulary grows with the corpus following Heaps' law, which is
+roughly how Wikipedia text behaves. Everything is generated from a seed, so a corpus is identical between runs.
+"""
+from __future__ import annotations
+
+import itertools
+import random
+import string
+from typing import Iterator, Optional
+
+from wikipedia.schema import ArticleSchema
+
+ZIPF_EXPONENT = 1.07
+HEAPS_K = 10
+HEAPS_BETA = 0.5
+MEAN_DOCUMENT_LENGTH = 200
+MEAN_TITLE_LENGTH = 3
+
+
+def _word(rank: int) -> str:
+    """ Returns a distinct pronounceable-ish word for a vocabulary rank. """
+    letters = []
+    rank += 1
+    while rank:
+        rank, remainder = divmod(rank - 1, len(string.ascii_lowercase))
+        letters.append(string.ascii_lowercase[remainder])
+    return "".join(reversed(letters))
+
+
+class ZipfianVocabulary:
+    """ A vocabulary whose words are drawn with probability inversely proportional to a power of their rank. """
+
+    def __init__(self, size: int, exponent: float = ZIPF_EXPONENT):
+        self.words = [_word(rank) for rank in range(size)]
+        self.cumulative_weights = list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+    @classmethod
+    def for_corpus(cls, number_of_documents: int) -> ZipfianVocabulary:
+        """ Returns a vocabulary sized by Heaps' law for the expected number of tokens in the corpus. """
+        expected_tokens = number_of_documents * MEAN_DOCUMENT_LENGTH
+        return cls(size=int(HEAPS_K * expected_tokens ** HEAPS_BETA))
+
+    def sample(self, rng: random.Random, k: int) -> list[str]:
+        return rng.choices(self.words, cum_weights=self.cumulative_weights, k=k)
+
+
+def generate_articles(
+        number_of_documents: int,
+        seed: int = 0,
+        analyzer_id: Optional[str] = None,
+) -> Iterator[ArticleSchema]:
+    """ Lazily generates tokenized articles, so that the corpus itself does not count towards memory usage. They are
+    recorded as tokenized by `analyzer_id`, as an index built with an analyzer skips articles tokenized by any other.
+    """
+    rng = random.Random(seed)
+    vocabulary = ZipfianVocabulary.for_corpus(number_of_documents)
+    for document_number in range(number_of_documents):
+        length = max(1, int(rng.expovariate(1 / MEAN_DOCUMENT_LENGTH)))
+        title = vocabulary.sample(rng, k=rng.randint(1, 2 * MEAN_TITLE_LENGTH - 1))
+        # skip validation, the indexer only reads the title, tokenized content and text processor
+        yield ArticleSchema.model_construct(
+            title=f"{' '.join(title)} {document_number}",
+            tokenized_content=vocabulary.sample(rng, k=length),
+            text_processor=analyzer_id,
+        )
+
+
+def generate_queries(
+        number_of_documents: int,
+        query_length: int,
+        number_of_queries: int,
+        seed: int = 0,
+) -> list[list[str]]:
+    """ Generates tokenized queries drawn from the same vocabulary as the corpus of the given size. """
+    rng = random.Random(seed + query_length)
+    vocabulary = ZipfianVocabulary.for_corpus(number_of_documents)
+    return [vocabulary.sample(rng, k=query_length) for _ in range(number_of_queries)]
+
+
+def generate_text(number_of_words: int, seed: int = 0) -> str:
+    """ Generates raw text with capitalisation, punctuation, numbers and hyphens for the text processors to clean. """
+    rng = random.Random(seed)
+    vocabulary = ZipfianVocabulary(size=HEAPS_K * int(number_of_words ** HEAPS_BETA))
+    words = []
+    for word in vocabulary.sample(rng, k=number_of_words):
+        roll = rng.random()
+        if roll < 0.05:
+            word = word.capitalize() + "."
+        elif roll < 0.1:
+            word += ","
+        elif roll < 0.12:
+            word = f"{word}-{rng.choice(vocabulary.words)}"
+        elif roll < 0.14:
+            word = str(rng.randint(0, 2024))
+        words.append(word)
+    return " ".join(words)
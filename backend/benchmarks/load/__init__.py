@@ -0,0 +1,4 @@
+"""
+Load tests of the whole app, against a stub of the Wikipedia API, measuring throughput, latency and error rates under
+mixed search and ingest traffic.
+"""
@@ -0,0 +1,259 @@
+"""
+Drives mixed `/search` and `POST /articles` traffic at the app, at a target rate, and summarises what happened.
+
+Requests are sent open-loop: each one is scheduled at a fixed time from the start of the stage, whether or not earlier
+requests have finished, like independent users would send them. Latency is measured from the scheduled time, so time
+spent waiting for a free connection counts too, and a slow app cannot slow the load down and hide its own latency.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+import requests
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from benchmarks.load.stub import WikipediaStub
+from common.models import Base
+from common.reporting import compare_metrics, latency_summary
+from index.nlp import TextProcessor, get_analyzer_id
+from wikipedia.models import Article
+from wikipedia.schema import ArticleSchema
+from wikipedia.service import add_articles_bulk
+
+SEARCH = "search"
+INGEST = "ingest"
+DEFAULT_QPS = (10.0,)
+DEFAULT_DURATION = 30.0
+DEFAULT_INGEST_FRACTION = 0.05
+DEFAULT_CONCURRENCY = 64
+REQUEST_TIMEOUT = 60.0
+SEED_BATCH_SIZE = 1000
+
+
+class RequestRecord(NamedTuple):
+    """ A request sent to the app: what it was, when it was scheduled and finished, and its status code (0 if it failed
+    without a response, e.g. timed out).
+    """
+    kind: str
+    scheduled: float
+    finished: float
+    status: int
+
+    @property
+    def latency(self) -> float:
+        return self.finished - self.scheduled
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+def seed_database(
+        database_url: str,
+        stub: WikipediaStub,
+        number_of_documents: int,
+        text_processor: TextProcessor,
+) -> int:
+    """ Creates the tables if needed, and adds the stub's first articles to the database if it has fewer. Returns the
+    number of articles in the database, so the stub can serve new articles after them.
+    """
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    analyzer_id = get_analyzer_id(text_processor)
+    with Session(engine) as db_session:
+        number_of_articles = db_session.scalar(select(func.count()).select_from(Article))
+        for start in range(number_of_articles, number_of_documents, SEED_BATCH_SIZE):
+            articles = []
+            for number in range(start, min(start + SEED_BATCH_SIZE, number_of_documents)):
+                title, text = stub.get_article(number)
+                articles.append(ArticleSchema(
+                    title=title, tokenized_content=text_processor(text), text=text, text_processor=analyzer_id
+                ).to_db_model())
+            add_articles_bulk(db_session, articles)
+        number_of_articles = db_session.scalar(select(func.count()).select_from(Article))
+    engine.dispose()
+    return number_of_articles
+
+
+class App:
+    """ Runs the app with uvicorn in another process, so that the load does not compete with it for the GIL. """
+
+    def __init__(self, env: dict[str, str], port: int, startup_timeout: float):
+        self.url = f"http://127.0.0.1:{port}"
+        app_dir = Path(importlib.util.find_spec("main").origin).parent
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(app_dir), "--port", str(port),
+             "--log-level", "warning"],
+            env={**os.environ, **env},
+        )
+        self._wait_until_ready(startup_timeout)
+
+    def _wait_until_ready(self, timeout: float) -> None:
+        """ Waits for the app to index the articles in the database and start serving requests. """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"The app exited with code {self._process.returncode} while starting up")
+            try:
+                requests.get(self.url, timeout=1).raise_for_status()
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError(f"The app did not start up within {timeout} seconds")
+
+    def __enter__(self) -> App:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+
+
+def _sender(app_url: str):
+    """ Returns a function that sends a request to the app, with a connection pool per thread. """
+    local = threading.local()
+
+    def send(kind: str, scheduled: float, query: Optional[str]) -> RequestRecord:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            if kind == SEARCH:
+                response = session.get(f"{app_url}/search", params={"query": query}, timeout=REQUEST_TIMEOUT)
+            else:
+                response = session.post(f"{app_url}/articles", timeout=REQUEST_TIMEOUT)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        return RequestRecord(kind, scheduled, time.perf_counter(), status)
+
+    return send
+
+
+def drive_traffic(
+        app_url: str,
+        queries: list[str],
+        qps: float,
+        duration: float,
+        ingest_fraction: float = DEFAULT_INGEST_FRACTION,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        seed: int = 0,
+) -> list[RequestRecord]:
+    """ Sends requests to the app at `qps` requests per second for `duration` seconds, and returns a record of each.
+
+    Each request is an ingest (`POST /articles`) with probability `ingest_fraction`, and otherwise a search for one of
+    the queries. At most `concurrency` requests are in flight at once, later ones wait for a free connection.
+    """
+    rng = random.Random(seed)
+    send = _sender(app_url)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        start = time.perf_counter()
+        for number in range(int(qps * duration)):
+            scheduled = start + number / qps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if rng.random() < ingest_fraction:
+                futures.append(executor.submit(send, INGEST, scheduled, None))
+            else:
+                futures.append(executor.submit(send, SEARCH, scheduled, rng.choice(queries)))
+        return [future.result() for future in futures]
+
+
+def _summarise_requests(records: list[RequestRecord], duration: float) -> dict:
+    """ Summarises requests by their throughput, error rate and latency. Only successful requests count towards
+    throughput and latency.
+    """
+    successful = [record for record in records if record.ok]
+    return {
+        "requests": len(records),
+        "throughput_per_second": len(successful) / duration,
+        "error_rate": 1 - len(successful) / len(records) if records else 0.0,
+        "errors": dict(sorted({
+            str(status): sum(record.status == status for record in records)
+            for status in {record.status for record in records if not record.ok}
+        }.items())),
+        **latency_summary([record.latency for record in successful]),
+    }
+
+
+def _during_ingest(search: RequestRecord, ingests: list[RequestRecord]) -> bool:
+    return any(ingest.scheduled < search.finished and search.scheduled < ingest.finished for ingest in ingests)
+
+
+def summarise(records: list[RequestRecord]) -> dict:
+    """ Summarises the requests of a stage, overall and by kind. Searches are also summarised by whether an ingest was
+    in flight while they were, to show the effect of ingest on search latency.
+
+    Throughput is over the time from the first request being scheduled to the last one finishing.
+    """
+    duration = max(record.finished for record in records) - min(record.scheduled for record in records)
+    searches = [record for record in records if record.kind == SEARCH]
+    ingests = [record for record in records if record.kind == INGEST]
+    during_ingest = [search for search in searches if _during_ingest(search, ingests)]
+    return {
+        "all": _summarise_requests(records, duration),
+        SEARCH: _summarise_requests(searches, duration),
+        INGEST: _summarise_requests(ingests, duration),
+        "search_during_ingest": _summarise_requests(during_ingest, duration),
+        "search_without_ingest": _summarise_requests(
+            [search for search in searches if not _during_ingest(search, ingests)], duration
+        ),
+    }
+
+
+def generate_query_strings(stub: WikipediaStub, number_of_queries: int, seed: int = 0) -> list[str]:
+    """ Generates queries of one to three words, drawn from the vocabulary of the stub's articles. """
+    rng = random.Random(seed)
+    return [" ".join(stub.vocabulary.sample(rng, k=rng.randint(1, 3))) for _ in range(number_of_queries)]
+
+
+def run_stages(
+        app_url: str,
+        queries: list[str],
+        rates: Iterable[float],
+        duration: float,
+        **traffic_kwargs,
+) -> list[dict]:
+    """ Drives traffic at each rate in turn, e.g. increasing rates to find the capacity of the app. """
+    stages = []
+    for qps in rates:
+        records = drive_traffic(app_url, queries, qps, duration, **traffic_kwargs)
+        stages.append({"target_qps": qps, **summarise(records)})
+    return stages
+
+
+def _flatten(results: dict) -> dict[str, float]:
+    """ Flattens results into comparable metrics, keyed by what was measured. """
+    metrics = {}
+    for stage in results["results"]["stages"]:
+        for kind, summary in stage.items():
+            if not isinstance(summary, dict):
+                continue
+            for metric, value in summary.items():
+                if isinstance(value, (int, float)):
+                    metrics[f"stage[{stage['target_qps']:g}].{kind}.{metric}"] = value
+    return metrics
+
+
+def compare(baseline: dict, candidate: dict) -> list[dict]:
+    """ Compares the metrics shared by two sets of results. Change is relative to the baseline. """
+    return compare_metrics(_flatten(baseline), _flatten(candidate))
@@ -0,0 +1,138 @@
+"""
+A stub of the Wikipedia API (`api.php`) serving synthetic articles with a configurable latency, so that the app can be
+load tested without sending any requests to Wikipedia.
+
+Only the requests that the app sends are served: random article titles, the latest revision of pages and the parsed
+HTML of a page. Random titles are numbered so they never repeat, and the text of each article is generated from its
+number, so it is the same whenever it is fetched.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.corpus import MEAN_DOCUMENT_LENGTH, ZipfianVocabulary
+
+TITLE_PREFIX = "Synthetic article"
+REVISION_ID = 1
+
+
+def _title(number: int) -> str:
+    return f"{TITLE_PREFIX} {number}"
+
+
+def _number(title: str) -> int:
+    return int(title.rsplit(" ", 1)[-1])
+
+
+class WikipediaStub:
+    """ Serves synthetic articles the way the Wikipedia API does, from a thread, waiting `latency` seconds before each
+    response to emulate the network and Wikipedia.
+
+    Articles have a vocabulary sized for a corpus of `corpus_size` documents. Random titles start from the first
+    article, see `serve_articles_from` to skip articles that are already in the database.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            corpus_size: int = 1_000,
+            seed: int = 0,
+            host: str = "127.0.0.1",
+            port: int = 0,
+    ):
+        self.latency = latency
+        self.seed = seed
+        self.vocabulary = ZipfianVocabulary.for_corpus(corpus_size)
+        self.requests: Counter[str] = Counter()
+        self._article_numbers = itertools.count()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubRequestHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/w/api.php"
+
+    def __enter__(self) -> WikipediaStub:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_articles_from(self, number: int) -> None:
+        """ Sets the number of the next article to serve as a random article. """
+        with self._lock:
+            self._article_numbers = itertools.count(number)
+
+    def get_text(self, number: int) -> str:
+        """ Returns the plain text of an article, by number. """
+        rng = random.Random(self.seed * 1_000_003 + number)
+        return " ".join(self.vocabulary.sample(rng, k=max(1, int(rng.expovariate(1 / MEAN_DOCUMENT_LENGTH)))))
+
+    def get_article(self, number: int) -> tuple[str, str]:
+        """ Returns the title and plain text of an article, by number. """
+        return _title(number), self.get_text(number)
+
+    def respond(self, params: dict[str, str]) -> dict:
+        """ Returns the body of the API response to a request with the given parameters. """
+        if params.get("action") == "parse":
+            self._count("parse")
+            return {
+                "parse": {
+                    "title": params["page"],
+                    "revid": REVISION_ID,
+                    "text": {"*": f"<div><p>{self.get_text(_number(params['page']))}</p></div>"},
+                },
+            }
+        if params.get("list") == "random":
+            self._count("random")
+            with self._lock:
+                numbers = list(itertools.islice(self._article_numbers, int(params.get("rnlimit", 1))))
+            return {"query": {"random": [{"id": number, "ns": 0, "title": _title(number)} for number in numbers]}}
+        if params.get("prop") == "info":
+            self._count("info")
+            titles = params["titles"].split("|")
+            return {
+                "query": {
+                    "pages": {str(_number(title)): {"title": title, "lastrevid": REVISION_ID} for title in titles},
+                },
+            }
+        self._count("unknown")
+        return {"error": {"code": "badvalue", "info": "The stub does not serve this request."}}
+
+    def _count(self, request: str) -> None:
+        with self._lock:
+            self.requests[request] += 1
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    server: ThreadingHTTPServer
+
+    def do_GET(self) -> None:
+        stub: WikipediaStub = self.server.stub
+        params = {name: values[-1] for name, values in parse_qs(urlsplit(self.path).query).items()}
+        if stub.latency:
+            time.sleep(stub.latency)
+        body = json.dumps(stub.respond(params)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
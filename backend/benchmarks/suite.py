@@ -0,0 +1,178 @@
+"""
+Benchmarks for index building, searching and text processing.
+
+Each corpus size is benchmarked in a fresh process, so that its peak RSS is not inflated by a previous, larger corpus.
+"""
+from __future__ import annotations
+
+import platform
+import resource
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from time import perf_counter
+from typing import Iterable, Optional
+
+from benchmarks.corpus import generate_articles, generate_queries, generate_text
+from common.reporting import compare_metrics, latency_summary
+from index.indexer import Index, create_or_update_inverted_index, rank_documents
+from index.nlp import TEXT_PROCESSORS, TextProcessorTypes, basic_preprocess, get_analyzer_id
+from index.schema import RankingFunctionTypes
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_QUERY_LENGTHS = (1, 2, 3, 5, 8)
+DEFAULT_NUMBER_OF_QUERIES = 200
+TOKENIZER_DOCUMENTS = 500
+TOKENIZER_DOCUMENT_WORDS = 200
+
+
+def _peak_rss_bytes() -> int:
+    """ Returns the peak resident set size of this process. Linux reports it in kilobytes, macOS in bytes. """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def benchmark_corpus(
+        number_of_documents: int,
+        query_lengths: Iterable[int],
+        number_of_queries: int,
+        impact_ordered: bool,
+        seed: int,
+        compact_terms: bool = False,
+        workers: int = 1,
+        common_term_idf: Optional[float] = None,
+) -> dict:
+    """ Benchmarks building an index of a synthetic corpus, then searching it with queries of different lengths. """
+    rss_before_build = _peak_rss_bytes()
+    start = perf_counter()
+    index = create_or_update_inverted_index(
+        articles=generate_articles(number_of_documents, seed=seed, analyzer_id=get_analyzer_id(basic_preprocess)),
+        index=Index(),
+        text_processor=basic_preprocess,
+        impact_ordered=impact_ordered,
+        compact_terms=compact_terms,
+        workers=workers,
+        common_term_idf=common_term_idf,
+    )
+    index_result = {
+        "documents": number_of_documents,
+        "tokens": index.corpus_size,
+        "vocabulary": index.get_vocabulary_size(),
+        "build_seconds": perf_counter() - start,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "rss_before_build_bytes": rss_before_build,
+    }
+
+    search_results = []
+    for ranking_function in RankingFunctionTypes:
+        for query_length in query_lengths:
+            latencies = []
+            for query in generate_queries(number_of_documents, query_length, number_of_queries, seed=seed):
+                start = perf_counter()
+                rank_documents(query, inverted_index=index, ranking_function=ranking_function)
+                latencies.append(perf_counter() - start)
+            search_results.append({
+                "documents": number_of_documents,
+                "ranking_function": ranking_function.value,
+                "query_length": query_length,
+                "queries": number_of_queries,
+                **latency_summary(latencies),
+            })
+
+    return {"index": index_result, "search": search_results}
+
+
+def benchmark_text_processors(seed: int) -> list[dict]:
+    """ Measures the throughput of each text processor over synthetic raw text. """
+    texts = [generate_text(TOKENIZER_DOCUMENT_WORDS, seed=seed + i) for i in range(TOKENIZER_DOCUMENTS)]
+    number_of_bytes = sum(len(text.encode()) for text in texts)
+    results = []
+    for processor_type in TextProcessorTypes:
+        text_processor = TEXT_PROCESSORS[processor_type]
+        try:
+            start = perf_counter()
+            number_of_tokens = sum(len(text_processor(text)) for text in texts)
+            seconds = perf_counter() - start
+        except LookupError as e:
+            # the NLTK data for this processor has not been provisioned
+            message = next(line.strip() for line in str(e).splitlines() if line.strip("* "))
+            results.append({"processor": processor_type.value, "error": message})
+            continue
+        results.append({
+            "processor": processor_type.value,
+            "documents": len(texts),
+            "seconds": seconds,
+            "tokens_per_second": number_of_tokens / seconds,
+            "bytes_per_second": number_of_bytes / seconds,
+        })
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+        sizes: Iterable[int] = DEFAULT_SIZES,
+        query_lengths: Iterable[int] = DEFAULT_QUERY_LENGTHS,
+        number_of_queries: int = DEFAULT_NUMBER_OF_QUERIES,
+        impact_ordered: bool = False,
+        seed: int = 0,
+        compact_terms: bool = False,
+        workers: int = 1,
+        common_term_idf: Optional[float] = None,
+) -> dict:
+    """ Runs the whole benchmark suite and returns the results with metadata about the run. """
+    query_lengths = tuple(query_lengths)
+    results = {"index": [], "search": [], "tokenize": benchmark_text_processors(seed=seed)}
+    for number_of_documents in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            corpus_results = executor.submit(
+                benchmark_corpus, number_of_documents, query_lengths, number_of_queries, impact_ordered, seed,
+                compact_terms, workers, common_term_idf,
+            ).result()
+        results["index"].append(corpus_results["index"])
+        results["search"].extend(corpus_results["search"])
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "impact_ordered": impact_ordered,
+            "compact_terms": compact_terms,
+            "workers": workers,
+            "common_term_idf": common_term_idf,
+        },
+        "results": results,
+    }
+
+
+def _flatten(results: dict) -> dict[str, float]:
+    """ Flattens results into comparable metrics, keyed by what was measured. """
+    metrics = {}
+    for entry in results["results"]["index"]:
+        for metric in ("build_seconds", "peak_rss_bytes"):
+            metrics[f"index[{entry['documents']}].{metric}"] = entry[metric]
+    for entry in results["results"]["search"]:
+        key = f"search[{entry['documents']},{entry['ranking_function']},{entry['query_length']}]"
+        for metric in ("p50_ms", "p99_ms"):
+            metrics[f"{key}.{metric}"] = entry[metric]
+    for entry in results["results"]["tokenize"]:
+        if "tokens_per_second" in entry:
+            metrics[f"tokenize[{entry['processor']}].tokens_per_second"] = entry["tokens_per_second"]
+    return metrics
+
+
+def compare(baseline: dict, candidate: dict) -> list[dict]:
+    """ Compares the metrics shared by two sets of results. Change is relative to the baseline. """
+    return compare_metrics(_flatten(baseline), _flatten(candidate))
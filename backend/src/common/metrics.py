@@ -0,0 +1,108 @@
+"""
+Prometheus metrics for the application, served at `/metrics`.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import weakref
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Iterator, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from index.schema import Fields
+
+SEARCH_PHASE_SECONDS = Histogram(
+    "search_phase_seconds",
+    "Time spent in each phase of a search: tokenize, candidates, scoring and sort.",
+    ["phase"],
+)
+INGEST_PHASE_SECONDS = Histogram(
+    "ingest_phase_seconds",
+    "Time spent in each phase of ingesting articles: fetch, html_parse, retokenize, db_load and index.",
+    ["phase"],
+)
+HTTP_CACHE_REQUESTS = Counter(
+    "http_cache_requests",
+    "Wikipedia API requests through the response cache, by result: hit, revalidated (304) or miss.",
+    ["result"],
+)
+INDEX_DOCUMENTS = Gauge("index_documents", "Number of documents in the index.")
+INDEX_GENERATION = Gauge("index_generation", "Generation of the index, incremented each time articles are added.")
+INDEX_VOCABULARY_SIZE = Gauge("index_vocabulary_size", "Number of distinct terms in the index.", ["field"])
+INDEX_POSTINGS = Gauge("index_postings", "Number of postings in the index.", ["field"])
+INDEX_MEMORY_BYTES = Gauge(
+    "index_memory_bytes",
+    "Approximate memory used by each structure of the index, including everything it references.",
+    ["structure"],
+)
+
+
+@contextmanager
+def time_phase(histogram: Histogram, phase: str, timings: Optional[dict[str, float]] = None) -> Iterator[None]:
+    """ Observes the time taken by a phase in the histogram, and also records it in `timings` if provided. """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        histogram.labels(phase).observe(elapsed)
+        if timings is not None:
+            timings[phase] = elapsed
+
+
+def deep_getsizeof(value: Any, seen: set[int] | None = None) -> int:
+    """ Returns the approximate size in bytes of a value and everything it references, counting each object once. """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += deep_getsizeof(vars(value), seen)
+    return size
+
+
+def update_index_metrics(index: "Index") -> None:  # noqa: F821
+    """ Updates the index gauges that are cheap to compute, after the index changes. See `update_index_memory_metrics`
+    for the memory used by the index.
+    """
+    INDEX_DOCUMENTS.set(index.number_of_documents)
+    INDEX_GENERATION.set(index.generation)
+    for field in Fields:
+        INDEX_VOCABULARY_SIZE.labels(field.value).set(index.get_vocabulary_size(field))
+        INDEX_POSTINGS.labels(field.value).set(index.get_number_of_postings(field))
+
+
+# the index (generation) that the memory gauges were last updated for
+_memory_metrics_index: Optional[weakref.ref] = None
+_memory_metrics_lock = threading.Lock()
+
+
+def update_index_memory_metrics(
+        index: "Index",  # noqa: F821
+        forward_index: Optional["ForwardIndex"] = None,  # noqa: F821
+) -> None:
+    """ Updates the index memory gauges, unless they were already updated for this index. This walks the whole index, so
+    is done when the metrics are scraped rather than every time articles are added, and at most once per generation.
+
+    The forward index, if any, is reported as the `forward_index` structure. Articles are added to it along with each
+    new generation of the index, so it is measured at the same time.
+    """
+    global _memory_metrics_index
+    with _memory_metrics_lock:
+        if _memory_metrics_index is not None and _memory_metrics_index() is index:
+            return
+        for structure, size in index.memory_usage().items():
+            INDEX_MEMORY_BYTES.labels(structure).set(size)
+        if forward_index is not None:
+            INDEX_MEMORY_BYTES.labels("forward_index").set(forward_index.memory_usage())
+        _memory_metrics_index = weakref.ref(index)
@@ -0,0 +1,49 @@
+"""
+Summarising latencies and comparing two sets of results, shared by the benchmarks, the load tests and the evaluation.
+
+Each of them flattens its own results into metrics keyed by what was measured, then compares and prints them the same
+way, e.g. `python -m benchmarks compare baseline.json results.json`.
+"""
+from __future__ import annotations
+
+import statistics
+from typing import Iterable
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    """ Summarises latencies, in seconds, as percentiles, maximum and mean in milliseconds. Empty if there are none. """
+    if not latencies:
+        return {}
+    if len(latencies) < 2:
+        percentiles = latencies * 99
+    else:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": percentiles[49] * 1000,
+        "p90_ms": percentiles[89] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "max_ms": max(latencies) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def compare_metrics(baseline_metrics: dict[str, float], candidate_metrics: dict[str, float]) -> list[dict]:
+    """ Compares the metrics shared by two sets of flattened results. Change is relative to the baseline. """
+    return [
+        {
+            "metric": metric,
+            "baseline": baseline_metrics[metric],
+            "candidate": candidate_metrics[metric],
+            "change": (candidate_metrics[metric] - baseline_metrics[metric]) / baseline_metrics[metric]
+            if baseline_metrics[metric] else None,
+        }
+        for metric in baseline_metrics
+        if metric in candidate_metrics
+    ]
+
+
+def print_comparison(rows: Iterable[dict]) -> None:
+    """ Prints a comparison as a table of each metric's baseline and candidate values, and the change between them. """
+    for row in rows:
+        change = "n/a" if row["change"] is None else f"{row['change']:+.1%}"
+        print(f"{row['metric']:<60} {row['baseline']:>14.4f} {row['candidate']:>14.4f} {change:>9}")
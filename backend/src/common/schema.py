@@ -5,6 +5,8 @@ from enum import Enum
 
 from pydantic import BaseModel, Field
 
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+
 
 class DataFormats(Enum):
     """
@@ -0,0 +1,4 @@
+"""
+Offline evaluation of search quality against relevance judgments, so that changes to the ranking functions, their
+parameters, the analyzers or pruned retrieval can be checked for their effect on results as well as on speed.
+"""
@@ -0,0 +1,175 @@
+"""
+Command line interface for evaluating search quality. Indexes the articles in the database from their plain text, runs
+the judged queries against the index and writes NDCG, MRR, recall and latency as JSON. From the `src` folder:
+
+    python -m evaluation run judgments.jsonl --ranking-function bm25 --k-1 1.5 --output results.json
+    python -m evaluation run judgments.jsonl --approximate --output results.json
+    python -m evaluation run judgments.jsonl --common-term-idf 1.0 --output results.json
+    python -m evaluation compare baseline.json results.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from common.reporting import print_comparison
+from evaluation.harness import DEFAULT_CUTOFFS, Ranker, compare, diff_rankings, evaluate, load_judgments
+from index.indexer import Index, create_or_update_inverted_index, rank_document_ids
+from index.nlp import ANALYZERS, Analyzer, get_analyzer, get_analyzer_id
+from index.schema import RankingFunctionTypes
+from settings import Settings
+from wikipedia.retokenize import iter_retokenized_articles
+
+RANKING_PARAMETERS = ("b", "k_1", "delta", "title_boost")
+EXACT = "exact"
+
+
+def build_indexes(
+        db_session: Session,
+        analyzer: Analyzer,
+        approximate: bool,
+        workers: int = 1,
+        common_term_idf: Optional[float] = None,
+) -> dict[str, Index]:
+    """ Indexes the articles in the database with the analyzer, by configuration: the exact index, an impact-ordered
+    index if approximate, and an index planning queries with the common term IDF if provided (see `index.planner`).
+
+    The articles are tokenized once for all the indexes, and not written back to the database.
+    """
+    indexes = {EXACT: Index(analyzer_id=analyzer.id)}
+    if approximate:
+        indexes["approximate"] = Index(impact_ordered=True, analyzer_id=analyzer.id)
+    if common_term_idf is not None:
+        indexes["planned"] = Index(analyzer_id=analyzer.id, common_term_idf=common_term_idf)
+    for articles in iter_retokenized_articles(db_session, analyzer, workers=workers, force=True):
+        for index in indexes.values():
+            create_or_update_inverted_index(articles, index=index, text_processor=analyzer, precompute=False)
+    for index in indexes.values():
+        if index.number_of_documents:
+            index.precompute_statistics()
+    return indexes
+
+
+def _ranker(index: Index, analyzer: Analyzer, ranking_function: RankingFunctionTypes, top_k: int, **kwargs) -> Ranker:
+    def rank(query: str):
+        return rank_document_ids(
+            analyzer(query), inverted_index=index, ranking_function=ranking_function, top_k=top_k, **kwargs
+        )
+
+    return rank
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="evaluation", description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Evaluate the judged queries and write the results as JSON.")
+    run_parser.add_argument("judgments", type=argparse.FileType(), help="Judged queries, as JSON lines.")
+    run_parser.add_argument(
+        "--analyzer", choices=list(ANALYZERS), help="Defaults to the text processor configured for the app."
+    )
+    run_parser.add_argument(
+        "--ranking-function", choices=RankingFunctionTypes.values(), default=RankingFunctionTypes.BM25.value
+    )
+    for parameter in RANKING_PARAMETERS:
+        run_parser.add_argument(f"--{parameter.replace('_', '-')}", type=float)
+    run_parser.add_argument(
+        "--cutoffs", type=int, nargs="+", default=DEFAULT_CUTOFFS, help="The k to measure NDCG@k and recall@k at."
+    )
+    run_parser.add_argument(
+        "--approximate",
+        action="store_true",
+        help="Also rank from an impact-ordered index, and diff its top results against the exact ranking.",
+    )
+    run_parser.add_argument("--workers", type=int, default=1, help="The number of processes to tokenize with.")
+    run_parser.add_argument(
+        "--common-term-idf",
+        type=float,
+        help="Also rank from an index planning queries with this common term IDF, and diff its top results against the "
+        "exact ranking.",
+    )
+    run_parser.add_argument("--database-url", help="Defaults to the database configured for the app.")
+    run_parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two sets of results.")
+    compare_parser.add_argument("baseline", type=argparse.FileType())
+    compare_parser.add_argument("candidate", type=argparse.FileType())
+
+    parsed_args = parser.parse_args(args)
+    if parsed_args.command == "run" and parsed_args.approximate and (
+            parsed_args.ranking_function != RankingFunctionTypes.BM25.value
+            or any(getattr(parsed_args, parameter) is not None for parameter in RANKING_PARAMETERS)
+    ):
+        parser.error("--approximate only applies to BM25 with its default parameters")
+    return parsed_args
+
+
+def run(parsed_args: argparse.Namespace) -> dict:
+    """ Evaluates the judged queries against the articles in the database, with the analyzer and ranking function. """
+    settings = Settings()
+    analyzer = get_analyzer(parsed_args.analyzer or get_analyzer_id(settings.text_processor))
+    query_judgments = load_judgments(parsed_args.judgments)
+    engine = create_engine(parsed_args.database_url or settings.database_dsn)
+    with sessionmaker(bind=engine)() as db_session:
+        indexes = build_indexes(
+            db_session,
+            analyzer,
+            parsed_args.approximate,
+            workers=parsed_args.workers,
+            common_term_idf=parsed_args.common_term_idf,
+        )
+
+    ranking_function = RankingFunctionTypes(parsed_args.ranking_function)
+    parameters = {parameter: getattr(parsed_args, parameter) for parameter in RANKING_PARAMETERS}
+    top_k = max(parsed_args.cutoffs)
+    results = {}
+    rankings = {}
+    for name, index in indexes.items():
+        results[name], rankings[name] = evaluate(
+            query_judgments,
+            _ranker(index, analyzer, ranking_function, top_k, **parameters),
+            cutoffs=parsed_args.cutoffs,
+        )
+    queries = [judged_query.query for judged_query in query_judgments]
+    if diffs := {
+        name: diff_rankings(queries, rankings[EXACT], approximate_rankings, k=top_k)
+        for name, approximate_rankings in rankings.items()
+        if name != EXACT
+    }:
+        results["diff"] = diffs
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "analyzer": analyzer.id,
+            "ranking_function": ranking_function.value,
+            "parameters": parameters,
+            "cutoffs": parsed_args.cutoffs,
+            "common_term_idf": parsed_args.common_term_idf,
+            "documents": indexes[EXACT].number_of_documents,
+            "queries": len(query_judgments),
+        },
+        "results": results,
+    }
+
+
+def main(args: list[str]) -> None:
+    parsed_args = _parse_args(args)
+    if parsed_args.command == "run":
+        json.dump(run(parsed_args), parsed_args.output, indent=2)
+        parsed_args.output.write("\n")
+        return
+
+    print_comparison(compare(json.load(parsed_args.baseline), json.load(parsed_args.candidate)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main(sys.argv[1:])
@@ -0,0 +1,154 @@
+"""
+Runs a set of judged queries through a ranker and measures the quality of its rankings alongside its latency, and
+diffs the rankings of an approximate ranker (e.g. one using pruned, impact-ordered postings) against an exact one.
+
+Judgments are read from JSON lines, one query per line, with the relevance grade of the documents judged for it:
+
+    {"query": "linux kernel", "judgments": {"Linux kernel": 3, "Linus Torvalds": 1, "Helsinki": 0}}
+
+Documents are identified by article title, as in the index. Documents that are not judged are taken as not relevant.
+"""
+from __future__ import annotations
+
+import json
+import statistics
+from time import perf_counter
+from typing import Callable, Iterable, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from common.reporting import compare_metrics, latency_summary
+from evaluation.metrics import ndcg_at_k, overlap_at_k, recall_at_k, reciprocal_rank
+from index.pagination import RankedDocument
+
+DEFAULT_CUTOFFS = (10, 100)
+
+# ranks the documents for a query, from its text so that tokenizing it is timed along with ranking
+Ranker = Callable[[str], list[RankedDocument]]
+
+
+class QueryJudgments(BaseModel):
+    """ A query and the relevance grade of the documents judged for it. """
+    query: str
+    judgments: dict[str, int] = Field(default_factory=dict)
+
+
+def load_judgments(lines: Iterable[str]) -> list[QueryJudgments]:
+    """ Parses judged queries from JSON lines, skipping blank lines. Raises a ValueError for invalid lines. """
+    query_judgments = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            query_judgments.append(QueryJudgments.model_validate(json.loads(line)))
+        except (ValidationError, ValueError) as e:
+            raise ValueError(f"Invalid judgments on line {line_number}: {e}") from e
+    return query_judgments
+
+
+def run_queries(query_judgments: list[QueryJudgments], rank: Ranker) -> tuple[list[list[RankedDocument]], list[float]]:
+    """ Returns the ranking of every judged query, and how long each took in seconds. """
+    rankings, latencies = [], []
+    for judged_query in query_judgments:
+        start = perf_counter()
+        rankings.append(rank(judged_query.query))
+        latencies.append(perf_counter() - start)
+    return rankings, latencies
+
+
+def measure_rankings(
+        query_judgments: list[QueryJudgments],
+        rankings: list[list[RankedDocument]],
+        cutoffs: Iterable[int] = DEFAULT_CUTOFFS,
+) -> dict:
+    """ Measures NDCG and recall at each cutoff, and the reciprocal rank, of every query and on average. """
+    cutoffs = tuple(cutoffs)
+    queries = []
+    for judged_query, ranked_documents in zip(query_judgments, rankings):
+        ranking = [document_id for document_id, _ in ranked_documents]
+        measures = {"mrr": reciprocal_rank(ranking, judged_query.judgments)}
+        for k in cutoffs:
+            measures[f"ndcg@{k}"] = ndcg_at_k(ranking, judged_query.judgments, k)
+            measures[f"recall@{k}"] = recall_at_k(ranking, judged_query.judgments, k)
+        queries.append({"query": judged_query.query, **measures})
+
+    names = ["mrr"] + [f"{measure}@{k}" for k in cutoffs for measure in ("ndcg", "recall")]
+    return {
+        "mean": {name: statistics.fmean(query[name] for query in queries) if queries else 0.0 for name in names},
+        "queries": queries,
+    }
+
+
+def evaluate(
+        query_judgments: list[QueryJudgments],
+        rank: Ranker,
+        cutoffs: Iterable[int] = DEFAULT_CUTOFFS,
+) -> tuple[dict, list[list[RankedDocument]]]:
+    """ Runs the judged queries through the ranker, and returns their quality and latency along with the rankings. """
+    rankings, latencies = run_queries(query_judgments, rank)
+    results = measure_rankings(query_judgments, rankings, cutoffs)
+    results["latency"] = latency_summary(latencies)
+    return results, rankings
+
+
+def _max_score_error(exact: list[RankedDocument], approximate: list[RankedDocument]) -> Optional[float]:
+    """ Returns the largest difference in score of the documents in both rankings, or None if they share none. """
+    approximate_scores = dict(approximate)
+    errors = [
+        abs(score - approximate_scores[document_id]) for document_id, score in exact
+        if document_id in approximate_scores
+    ]
+    return max(errors) if errors else None
+
+
+def diff_rankings(
+        queries: list[str],
+        exact_rankings: list[list[RankedDocument]],
+        approximate_rankings: list[list[RankedDocument]],
+        k: int,
+) -> dict:
+    """ Diffs the top k documents of the approximate ranking of each query against those of the exact ranking.
+
+    Returns the mean overlap of the top k documents, the fraction of queries whose top k documents are identical and in
+    the same order, and the documents missing from or added to the top k of every query that differs.
+    """
+    differences = []
+    overlaps = []
+    for query, exact, approximate in zip(queries, exact_rankings, approximate_rankings):
+        exact_top, approximate_top = exact[:k], approximate[:k]
+        exact_ids = [document_id for document_id, _ in exact_top]
+        approximate_ids = [document_id for document_id, _ in approximate_top]
+        overlaps.append(overlap_at_k(approximate_ids, exact_ids, k))
+        if approximate_ids != exact_ids:
+            differences.append({
+                "query": query,
+                f"overlap@{k}": overlaps[-1],
+                "missing": [document_id for document_id in exact_ids if document_id not in approximate_ids],
+                "extra": [document_id for document_id in approximate_ids if document_id not in exact_ids],
+                "max_score_error": _max_score_error(exact_top, approximate_top),
+            })
+    return {
+        f"mean_overlap@{k}": statistics.fmean(overlaps) if overlaps else 1.0,
+        "identical_fraction": 1 - len(differences) / len(queries) if queries else 1.0,
+        "differences": differences,
+    }
+
+
+def _flatten(results: dict) -> dict[str, float]:
+    """ Flattens results into comparable metrics, keyed by ranker and measure. """
+    metrics = {}
+    for ranker, ranker_results in results["results"].items():
+        if ranker == "diff":
+            for approximate_ranker, diff in ranker_results.items():
+                metrics.update({
+                    f"diff.{approximate_ranker}.{name}": value for name, value in diff.items() if name != "differences"
+                })
+            continue
+        metrics.update({f"{ranker}.{name}": value for name, value in ranker_results["mean"].items()})
+        metrics.update({f"{ranker}.{name}": value for name, value in ranker_results["latency"].items()})
+    return metrics
+
+
+def compare(baseline: dict, candidate: dict) -> list[dict]:
+    """ Compares the metrics shared by two sets of results. Change is relative to the baseline. """
+    return compare_metrics(_flatten(baseline), _flatten(candidate))
@@ -0,0 +1,49 @@
+"""
+Relevance measures for a single ranking of document IDs, given graded relevance judgments for its query.
+
+Judgments map document IDs to a grade, where 0 (or no judgment) is not relevant and higher grades are more relevant.
+"""
+from __future__ import annotations
+
+import math
+from typing import Sequence
+
+
+def _discounted_cumulative_gain(grades: Sequence[int]) -> float:
+    """ Returns the DCG of grades in ranked order, with exponential gain so highly relevant documents count more. """
+    return sum((2 ** grade - 1) / math.log2(rank + 2) for rank, grade in enumerate(grades))
+
+
+def ndcg_at_k(ranking: Sequence[str], judgments: dict[str, int], k: int) -> float:
+    """ Returns the normalised discounted cumulative gain of the top k documents, between 0 and 1.
+
+    See Järvelin & Kekäläinen, "Cumulated gain-based evaluation of IR techniques" (2002).
+    """
+    ideal_dcg = _discounted_cumulative_gain(sorted(judgments.values(), reverse=True)[:k])
+    if not ideal_dcg:
+        return 0.0
+    return _discounted_cumulative_gain([judgments.get(document_id, 0) for document_id in ranking[:k]]) / ideal_dcg
+
+
+def reciprocal_rank(ranking: Sequence[str], judgments: dict[str, int]) -> float:
+    """ Returns one over the rank of the first relevant document, or 0 if none of the documents are relevant. """
+    for rank, document_id in enumerate(ranking, start=1):
+        if judgments.get(document_id, 0) > 0:
+            return 1 / rank
+    return 0.0
+
+
+def recall_at_k(ranking: Sequence[str], judgments: dict[str, int], k: int) -> float:
+    """ Returns the fraction of the relevant documents that are in the top k documents. """
+    relevant = {document_id for document_id, grade in judgments.items() if grade > 0}
+    if not relevant:
+        return 0.0
+    return len(relevant.intersection(ranking[:k])) / len(relevant)
+
+
+def overlap_at_k(ranking: Sequence[str], reference: Sequence[str], k: int) -> float:
+    """ Returns the fraction of the top k documents of a reference ranking that are in the top k of another. """
+    expected = set(reference[:k])
+    if not expected:
+        return 1.0
+    return len(expected.intersection(ranking[:k])) / len(expected)
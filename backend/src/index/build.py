@@ -0,0 +1,141 @@
+"""
+Parallel build of an index, as a map over batches of articles and a reduce into the index.
+
+Each worker process builds a partial index of a batch of articles: the postings of every term, with documents
+numbered from 0 within the batch, in flat arrays so that sending them back to the main process is cheap. The main
+process then adds the partial indexes to the index in the order of the batches, remapping the document numbers of each
+batch to document IDs (or, when building a compact index, to document numbers offset by the documents in the batches
+before it), see `Index.add_partial_indexes`.
+"""
+from __future__ import annotations
+
+import gc
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from index.nlp import TextProcessor
+
+if TYPE_CHECKING:
+    from wikipedia.schema import ArticleSchema
+
+DEFAULT_BATCH_SIZE = 1000
+
+_text_processor: Optional[TextProcessor] = None
+
+
+@dataclass
+class PartialFieldPostings:
+    """ The postings of every term of a field in a batch of documents.
+
+    The postings of the i-th term are at positions `offsets[i]` up to `offsets[i + 1]` of the documents (numbered
+    within the batch) and term frequencies.
+    """
+    terms: list[str]
+    offsets: array
+    documents: array
+    term_frequencies: array
+
+
+@dataclass
+class PartialIndex:
+    """ An index of a batch of documents, built by a worker process. """
+    document_ids: list[str]
+    document_lengths: array
+    title_lengths: array
+    body: PartialFieldPostings
+    title: PartialFieldPostings
+
+
+def _set_up_worker(text_processor: Optional[TextProcessor]) -> None:
+    """ Sets the text processor for the current process, to tokenize titles with.
+
+    Everything the worker inherited from the main process (e.g. the articles) is frozen, so that the garbage collector
+    does not scan it over and over while the partial index is built.
+    """
+    global _text_processor
+    _text_processor = text_processor
+    gc.freeze()
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """ Pauses the garbage collector, e.g. while merging partial indexes. Adding millions of postings would otherwise
+    trigger it over and over, each time scanning the growing index without finding anything to collect.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _build_field_postings(tokenized_documents: Iterable[list[str]], lengths: array) -> PartialFieldPostings:
+    """ Builds the postings of a field from its tokens in each document, and appends the field lengths to `lengths`. """
+    postings: dict[str, tuple[array, array]] = {}
+    for document_number, tokens in enumerate(tokenized_documents):
+        lengths.append(len(tokens))
+        for term, term_frequency in Counter(tokens).items():
+            term_postings = postings.get(term)
+            if term_postings is None:
+                term_postings = postings[term] = (array("I"), array("I"))
+            term_postings[0].append(document_number)
+            term_postings[1].append(term_frequency)
+
+    field_postings = PartialFieldPostings(list(postings), array("Q", [0]), array("I"), array("I"))
+    for documents, term_frequencies in postings.values():
+        field_postings.documents.extend(documents)
+        field_postings.term_frequencies.extend(term_frequencies)
+        field_postings.offsets.append(len(field_postings.documents))
+    return field_postings
+
+
+def build_partial_index(documents: list[tuple[str, list[str]]]) -> PartialIndex:
+    """ Builds a partial index of a batch of documents, given as their ID and tokens.
+
+    Titles (i.e. document IDs) are tokenized with the text processor of the process, if it has one.
+    """
+    document_ids = [document_id for document_id, _ in documents]
+    document_lengths, title_lengths = array("I"), array("I")
+    return PartialIndex(
+        document_ids=document_ids,
+        document_lengths=document_lengths,
+        title_lengths=title_lengths,
+        body=_build_field_postings((tokens for _, tokens in documents), document_lengths),
+        title=_build_field_postings(
+            (_text_processor(document_id) if _text_processor else [] for document_id in document_ids), title_lengths
+        ),
+    )
+
+
+def _batches(articles: Iterable[ArticleSchema], batch_size: int) -> Iterator[list[tuple[str, list[str]]]]:
+    batch = []
+    for article in articles:
+        batch.append((article.title, article.tokenized_content or []))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_partial_indexes(
+        articles: Iterable[ArticleSchema],
+        text_processor: Optional[TextProcessor] = None,
+        workers: int = 2,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[PartialIndex]:
+    """ Yields partial indexes of batches of the articles, built in worker processes, in the order of the articles.
+
+    :param articles: The tokenized articles to index.
+    :param text_processor: The text processor to tokenize titles with. Titles are not indexed without one.
+    :param workers: The number of processes to build partial indexes in.
+    :param batch_size: The number of articles in each partial index.
+    """
+    with Pool(workers, initializer=_set_up_worker, initargs=(text_processor,)) as pool:
+        yield from pool.imap(build_partial_index, _batches(articles, batch_size))
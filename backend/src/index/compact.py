@@ -0,0 +1,334 @@
+"""
+Compact, read-only layout of an index's terms, for indexes that are built once and then only searched.
+
+The vocabulary of every field is kept in one `TermDictionary`: the terms, UTF-8 encoded and sorted, concatenated into a
+single bytes object with an array of offsets, so a term's ID is its position in sorted order and it is looked up by
+binary search. Everything keyed by term (postings, IDFs, impact segments) is then kept in flat arrays indexed by term
+ID, rather than in dicts of per-term objects. Documents are numbered in the order they were indexed, and postings hold
+document numbers, which keeps them in increasing order within a term.
+
+The views in this module let the ranking functions read compact postings and IDFs the same way as the dicts of a
+dynamic index, see `Index.compact`.
+"""
+from __future__ import annotations
+
+import itertools
+import math
+from array import array
+from bisect import bisect_left
+from collections.abc import Collection, Mapping, Sequence
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from index.build import PartialFieldPostings
+    from index.impact import ImpactSegment
+    from index.indexer import DocumentTermInfo, TermData
+
+
+class TermDictionary:
+    """ A sorted vocabulary stored as one contiguous blob of UTF-8 terms and their offsets. """
+
+    def __init__(self, terms: Iterable[str]):
+        # sorting UTF-8 bytes sorts by code point, so lookups can compare bytes without decoding
+        encoded_terms = sorted(set(term.encode() for term in terms))
+        self._offsets = array("Q", [0])
+        position = 0
+        for encoded_term in encoded_terms:
+            position += len(encoded_term)
+            self._offsets.append(position)
+        self._blob = b"".join(encoded_terms)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        """ Yields every term, in term ID order. """
+        for term_id in range(len(self)):
+            yield self.term(term_id)
+
+    def _encoded_term(self, term_id: int) -> bytes:
+        return self._blob[self._offsets[term_id]:self._offsets[term_id + 1]]
+
+    def term(self, term_id: int) -> str:
+        return self._encoded_term(term_id).decode()
+
+    def lookup(self, term: str) -> Optional[int]:
+        """ Returns the ID of the term, or None if it is not in the vocabulary. """
+        encoded_term = term.encode()
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded_term(middle) < encoded_term:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._encoded_term(low) == encoded_term:
+            return low
+        return None
+
+
+class TermFrequencies(Mapping):
+    """ The postings of a term in a dynamic index, as a mapping of document ID to term frequency. """
+    __slots__ = ("_document_index",)
+
+    def __init__(self, document_index: dict[str, DocumentTermInfo]):
+        self._document_index = document_index
+
+    def __getitem__(self, document_id: str) -> int:
+        return self._document_index[document_id].term_frequency
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._document_index)
+
+    def __len__(self) -> int:
+        return len(self._document_index)
+
+    def items(self) -> Iterator[tuple[str, int]]:
+        return ((document_id, info.term_frequency) for document_id, info in self._document_index.items())
+
+    def restrict(self, document_ids: Collection[str]) -> dict[str, int]:
+        """ Returns the postings of the given documents only, looking up whichever of the two has fewer documents. """
+        document_index = self._document_index
+        if len(document_ids) < len(document_index):
+            return {
+                document_id: document_index[document_id].term_frequency
+                for document_id in document_ids
+                if document_id in document_index
+            }
+        return {
+            document_id: info.term_frequency
+            for document_id, info in document_index.items()
+            if document_id in document_ids
+        }
+
+
+class CompactTermFrequencies(Mapping):
+    """ The postings of a term in a compact index, as a mapping of document ID to term frequency.
+
+    Documents are looked up by binary search of their number, as document numbers are in increasing order.
+    """
+    __slots__ = ("_document_ids", "_document_numbers", "_documents", "_term_frequencies")
+
+    def __init__(
+            self,
+            document_ids: list[str],
+            document_numbers: Mapping[str, int],
+            documents: Sequence[int],
+            term_frequencies: Sequence[int],
+    ):
+        self._document_ids = document_ids
+        self._document_numbers = document_numbers
+        self._documents = documents
+        self._term_frequencies = term_frequencies
+
+    def _position(self, document_id: str) -> Optional[int]:
+        """ Returns the position of the document in the postings, or None if it does not contain the term. """
+        document_number = self._document_numbers.get(document_id)
+        if document_number is None:
+            return None
+        position = bisect_left(self._documents, document_number)
+        if position < len(self._documents) and self._documents[position] == document_number:
+            return position
+        return None
+
+    def __getitem__(self, document_id: str) -> int:
+        position = self._position(document_id)
+        if position is None:
+            raise KeyError(document_id)
+        return self._term_frequencies[position]
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._document_ids.__getitem__, self._documents)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def items(self) -> Iterator[tuple[str, int]]:
+        return zip(map(self._document_ids.__getitem__, self._documents), self._term_frequencies)
+
+    def restrict(self, document_ids: Collection[str]) -> dict[str, int]:
+        """ Returns the postings of the given documents only, looking them up by binary search if there are fewer of
+        them than postings, and otherwise scanning the postings.
+        """
+        if len(document_ids) < len(self._documents):
+            positions = ((document_id, self._position(document_id)) for document_id in document_ids)
+            return {
+                document_id: self._term_frequencies[position] for document_id, position in positions
+                if position is not None
+            }
+        return {
+            document_id: term_frequency for document_id, term_frequency in self.items() if document_id in document_ids
+        }
+
+
+EMPTY_POSTINGS = TermFrequencies({})
+
+
+class CompactFieldPostings:
+    """ The postings of every term of a field, as parallel arrays of document numbers and term frequencies.
+
+    The postings of the term with ID i are at positions `offsets[i]` up to `offsets[i + 1]`.
+    """
+
+    def __init__(self, offsets: array, documents: array, term_frequencies: array, vocabulary_size: int):
+        self.offsets = offsets
+        self.documents = documents
+        self.term_frequencies = term_frequencies
+        self.vocabulary_size = vocabulary_size
+
+    @classmethod
+    def from_terms(
+            cls,
+            dictionary: TermDictionary,
+            field_terms: dict[str, TermData],
+            document_numbers: dict[str, int],
+    ) -> CompactFieldPostings:
+        """ Builds the postings from the term index of a dynamic index. """
+        field_postings = cls(array("Q", [0]), array("I"), array("I"), 0)
+        for term in dictionary:
+            term_data = field_terms.get(term)
+            if term_data is not None and term_data.document_index:
+                field_postings.vocabulary_size += 1
+                for document_id, document_info in term_data.document_index.items():
+                    field_postings.documents.append(document_numbers[document_id])
+                    field_postings.term_frequencies.append(document_info.term_frequency)
+            field_postings.offsets.append(len(field_postings.documents))
+        return field_postings
+
+    @classmethod
+    def from_partial_postings(
+            cls,
+            term_ids: dict[str, int],
+            partial_postings: list[PartialFieldPostings],
+            document_offsets: list[int],
+    ) -> CompactFieldPostings:
+        """ Merges the postings of partial indexes of consecutive batches of documents, see `index.build`.
+
+        The documents of each batch are numbered from 0, so they are remapped by adding the number of documents in the
+        batches before it, given in `document_offsets`. The postings of each term are counted first, so that the
+        postings of every batch can be copied straight to where they belong.
+        """
+        counts = [0] * len(term_ids)
+        for postings in partial_postings:
+            for term, start, end in zip(postings.terms, postings.offsets, postings.offsets[1:]):
+                counts[term_ids[term]] += end - start
+        offsets = array("Q", itertools.accumulate(counts, initial=0))
+        documents = array("I", bytes(4 * offsets[-1]))
+        term_frequencies = array("I", bytes(4 * offsets[-1]))
+
+        positions = array("Q", offsets)
+        for postings, document_offset in zip(partial_postings, document_offsets):
+            for term, start, end in zip(postings.terms, postings.offsets, postings.offsets[1:]):
+                term_id = term_ids[term]
+                position = positions[term_id]
+                positions[term_id] += end - start
+                documents[position:position + end - start] = array(
+                    "I", [document + document_offset for document in postings.documents[start:end]]
+                )
+                term_frequencies[position:position + end - start] = postings.term_frequencies[start:end]
+        return cls(offsets, documents, term_frequencies, sum(1 for count in counts if count))
+
+    def document_frequency(self, term_id: int) -> int:
+        return self.offsets[term_id + 1] - self.offsets[term_id]
+
+    def get_postings(
+            self,
+            term_id: int,
+            document_ids: list[str],
+            document_numbers: Mapping[str, int],
+    ) -> CompactTermFrequencies:
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return CompactTermFrequencies(
+            document_ids,
+            document_numbers,
+            memoryview(self.documents)[start:end],
+            memoryview(self.term_frequencies)[start:end],
+        )
+
+
+class CompactTermValues(Mapping):
+    """ A value per term, such as its IDF, as an array indexed by term ID. Terms without a value are NaN. """
+
+    def __init__(self, dictionary: TermDictionary, values: dict[str, float]):
+        self._dictionary = dictionary
+        self._values = array("d", (values.get(term, math.nan) for term in dictionary))
+        self._length = len(values)
+
+    def __getitem__(self, term: str) -> float:
+        term_id = self._dictionary.lookup(term)
+        if term_id is None or math.isnan(self._values[term_id]):
+            raise KeyError(term)
+        return self._values[term_id]
+
+    def __iter__(self) -> Iterator[str]:
+        for term_id, term in enumerate(self._dictionary):
+            if not math.isnan(self._values[term_id]):
+                yield term
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class CompactImpactSegments(Sequence):
+    """ The impact-ordered segments of a term's postings in a compact index. """
+    __slots__ = ("_impact_postings", "_start", "_end")
+
+    def __init__(self, impact_postings: CompactImpactPostings, start: int, end: int):
+        self._impact_postings = impact_postings
+        self._start = start
+        self._end = end
+
+    def __getitem__(self, position: int) -> ImpactSegment:
+        if not 0 <= position < self._end - self._start:
+            raise IndexError(position)
+        return self._impact_postings.segment(self._start + position)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+
+class CompactImpactPostings(Mapping):
+    """ The impact-ordered segments of every term, as arrays of segment impacts and document numbers.
+
+    The segments of the term with ID i are at positions `term_offsets[i]` up to `term_offsets[i + 1]`, and the
+    documents of segment j at positions `segment_offsets[j]` up to `segment_offsets[j + 1]`.
+    """
+
+    def __init__(
+            self,
+            dictionary: TermDictionary,
+            impact_postings: dict[str, list[ImpactSegment]],
+            document_ids: list[str],
+            document_numbers: dict[str, int],
+    ):
+        self._dictionary = dictionary
+        self._document_ids = document_ids
+        self.term_offsets = array("Q", [0])
+        self.impacts = array("H")
+        self.segment_offsets = array("Q", [0])
+        self.documents = array("I")
+        for term in dictionary:
+            for impact, segment_documents in impact_postings.get(term, ()):
+                self.impacts.append(impact)
+                self.documents.extend(document_numbers[document_id] for document_id in segment_documents)
+                self.segment_offsets.append(len(self.documents))
+            self.term_offsets.append(len(self.impacts))
+        self._length = len(impact_postings)
+
+    def segment(self, segment_number: int) -> ImpactSegment:
+        start, end = self.segment_offsets[segment_number], self.segment_offsets[segment_number + 1]
+        return self.impacts[segment_number], [self._document_ids[document] for document in self.documents[start:end]]
+
+    def __getitem__(self, term: str) -> CompactImpactSegments:
+        term_id = self._dictionary.lookup(term)
+        if term_id is None or self.term_offsets[term_id] == self.term_offsets[term_id + 1]:
+            raise KeyError(term)
+        return CompactImpactSegments(self, self.term_offsets[term_id], self.term_offsets[term_id + 1])
+
+    def __iter__(self) -> Iterator[str]:
+        for term_id, term in enumerate(self._dictionary):
+            if self.term_offsets[term_id] != self.term_offsets[term_id + 1]:
+                yield term
+
+    def __len__(self) -> int:
+        return self._length
@@ -0,0 +1,133 @@
+"""
+Forward index of the plain text of each document, for showing a snippet of the text of each search result with the
+query terms highlighted, without clients having to fetch whole articles.
+
+The text of each document is compressed on its own with zlib, in the same format that articles keep their text in the
+database, so texts loaded from the database are stored as they are. Snippets are only made for the results that are
+returned, by decompressing their text and tokenizing it one word at a time with the analyzer of the index that was
+searched, so the highlighted words are exactly those that matched the query terms.
+"""
+from __future__ import annotations
+
+import itertools
+import re
+import sys
+import zlib
+from typing import TYPE_CHECKING, Callable, Iterable, NamedTuple, Optional, Sequence
+
+if TYPE_CHECKING:
+    from wikipedia.schema import ArticleSchema
+
+DEFAULT_SNIPPET_WORDS = 30
+WORD = re.compile(r"\w+")
+
+# tokenizes a single word of a document, returning no tokens for words that are not indexed, such as stopwords
+WordTokenizer = Callable[[str], Sequence[str]]
+
+
+class Snippet(NamedTuple):
+    """ A snippet of the text of a document, and the start and end offsets of the query terms in it. """
+    text: str
+    highlights: list[tuple[int, int]]
+
+
+class ForwardIndex:
+    """ The compressed plain text of each document, by document ID. """
+
+    def __init__(self):
+        self._texts: dict[str, bytes] = {}
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._texts
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, document_id: str, text: Optional[str] = None, compressed_text: Optional[bytes] = None) -> None:
+        """ Adds the text of a document, either as plain text or already compressed with zlib. """
+        if compressed_text is None:
+            compressed_text = zlib.compress(text.encode())
+        self._texts[document_id] = compressed_text
+
+    def add_articles(self, articles: Iterable[ArticleSchema]) -> int:
+        """ Adds the text of articles that have it, from the database or just fetched. Returns how many were added. """
+        added = 0
+        for article in articles:
+            if article.raw_content is not None or article.text is not None:
+                self.add(article.title, text=article.text, compressed_text=article.raw_content)
+                added += 1
+        return added
+
+    def get_text(self, document_id: str) -> Optional[str]:
+        """ Returns the text of a document, or None if it has no text in the forward index. """
+        compressed_text = self._texts.get(document_id)
+        return zlib.decompress(compressed_text).decode() if compressed_text is not None else None
+
+    def get_snippet(
+            self,
+            document_id: str,
+            query_terms: Iterable[str],
+            tokenize_word: WordTokenizer,
+            length: int = DEFAULT_SNIPPET_WORDS,
+    ) -> Optional[Snippet]:
+        """ Returns the best snippet of the text of a document for the query terms, see `make_snippet`. """
+        text = self.get_text(document_id)
+        if text is None:
+            return None
+        return make_snippet(text, set(query_terms), tokenize_word, length)
+
+    def memory_usage(self) -> int:
+        """ Returns the approximate memory used by the forward index, in bytes. """
+        return sys.getsizeof(self._texts) + sum(
+            sys.getsizeof(document_id) + sys.getsizeof(text) for document_id, text in self._texts.items()
+        )
+
+
+def _best_window(positions: list[int], terms: list[frozenset[str]], length: int) -> int:
+    """ Returns the position of the first match of the window of `length` words with the most distinct query terms
+    matched, then the most matches. Ties go to the earliest window.
+    """
+    best_start, best_score = positions[0], (0, 0)
+    end = 0
+    for start in range(len(positions)):
+        while end < len(positions) and positions[end] < positions[start] + length:
+            end += 1
+        window_terms = frozenset().union(*terms[start:end])
+        score = (len(window_terms), end - start)
+        if score > best_score:
+            best_start, best_score = positions[start], score
+    return best_start
+
+
+def make_snippet(
+        text: str,
+        query_terms: set[str],
+        tokenize_word: WordTokenizer,
+        length: int = DEFAULT_SNIPPET_WORDS,
+) -> Snippet:
+    """ Returns the window of `length` words of the text that matches the most query terms, and where they are in it.
+
+    Words match a query term if tokenizing them gives that term. The matches are centred in the window where possible,
+    and the start of the text is returned if nothing matches. Whitespace in the snippet is replaced by spaces, and the
+    highlights are the character offsets of the matching words in the snippet.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return Snippet(text="", highlights=[])
+    # documents repeat most of their words, so each distinct word is only tokenized once
+    word_terms = {word: frozenset(query_terms.intersection(tokenize_word(word))) for word in set(words)}
+    positions = [position for position, word in enumerate(words) if word_terms[word]]
+
+    start = 0
+    if positions:
+        first_match = _best_window(positions, [word_terms[words[position]] for position in positions], length)
+        last_match = max(position for position in positions if position < first_match + length)
+        start = max(0, min(first_match - (length - (last_match - first_match + 1)) // 2, len(words) - length))
+    window = list(itertools.islice(WORD.finditer(text), start, start + length))
+
+    offset = window[0].start()
+    snippet = re.sub(r"\s", " ", text[offset:window[-1].end()])
+    highlights = [
+        (match.start() - offset, match.end() - offset) for match in window if word_terms[match.group()]
+    ]
+    return Snippet(text=snippet, highlights=highlights)
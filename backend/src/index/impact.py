@@ -0,0 +1,164 @@
+"""
+Impact-ordered postings for score-at-a-time retrieval.
+
+When an index is built in impact-ordered mode, the BM25 score of every posting is computed once at index time (with
+the default `b` and `k_1` of `bm25_rank`) and quantized to a small integer "impact". Each term's postings are then
+grouped into segments of equal impact, highest first. A query only has to add up impacts, processing the segments of
+all its terms in decreasing order of impact, and can stop early once the top results cannot change.
+"""
+from __future__ import annotations
+
+import heapq
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Optional
+
+from common.metrics import SEARCH_PHASE_SECONDS, time_phase
+from index.pagination import Cursor, RankedDocument, select_ranked_documents
+from index.ranking import BM25
+from index.schema import QueryProfile
+
+if TYPE_CHECKING:
+    from index.indexer import Index
+
+IMPACT_BITS = 8
+MAX_IMPACT = (1 << IMPACT_BITS) - 1
+
+ImpactSegment = tuple[int, list[str]]
+
+
+def build_impact_postings(index: Index) -> tuple[dict[str, list[ImpactSegment]], float]:
+    """ Computes the quantized BM25 impact of every posting in the index and groups them into impact-ordered segments.
+
+    Postings with a negative BM25 score, i.e. of terms found in more than half of the documents, are given an impact
+    of zero and dropped, since impacts can only be accumulated upwards.
+
+    Returns the segments keyed by term, and the score that one unit of impact represents.
+    """
+    ranker = BM25(index)
+    length_ratios = index.get_length_ratios()
+    scores: dict[str, list[tuple[float, str]]] = {}
+    max_score = 0.0
+    for term, _ in index.iter_document_frequencies():
+        idf = ranker.idfs[term]
+        if idf <= 0:
+            continue
+        term_scores = [
+            (idf * ranker.weight_term_frequency(term_frequency, length_ratios[document_id]), document_id)
+            for document_id, term_frequency in index.get_postings(term).items()
+        ]
+        max_score = max(max_score, max(score for score, _ in term_scores))
+        scores[term] = term_scores
+
+    if not max_score:
+        return {}, 0.0
+
+    impact_scale = max_score / MAX_IMPACT
+    impact_postings = {}
+    for term, term_scores in scores.items():
+        segments: defaultdict[int, list[str]] = defaultdict(list)
+        for score, document_id in term_scores:
+            impact = round(score / impact_scale)
+            if impact:
+                segments[impact].append(document_id)
+        impact_postings[term] = sorted(segments.items(), reverse=True)
+
+    return impact_postings, impact_scale
+
+
+def _can_terminate(accumulators: dict[str, int], top_k: int, remaining_impact: int) -> tuple[bool, int]:
+    """ Checks whether the top k documents can still change, given the most impact left to be accumulated.
+
+    They cannot once the k-th highest score is out of reach of every document below it, including those not yet seen.
+    Returns whether processing can stop, and the current k-th highest score.
+    """
+    largest = heapq.nlargest(top_k + 1, accumulators.values())
+    threshold = largest[top_k - 1] if len(largest) >= top_k else 0
+    runner_up = largest[top_k] if len(largest) > top_k else 0
+    return threshold > runner_up + remaining_impact, threshold
+
+
+def rank_documents_by_impact(
+        query_terms: list[str],
+        inverted_index: Index,
+        top_k: Optional[int] = None,
+        profile: Optional[QueryProfile] = None,
+        after: Optional[Cursor] = None,
+) -> list[RankedDocument]:
+    """ Ranks documents for the provided query terms using score-at-a-time accumulation over impact-ordered postings.
+
+    Without `top_k`, every posting of the query terms is accumulated. With it, processing stops as soon as the set of
+    top k documents is settled, in which case their order reflects the impacts accumulated up to that point. The
+    documents outside the set score less than the last document in it even so, so a cursor after it is still exact.
+    Pages after a cursor are ranked from every posting. If a `profile` is provided, the cost of the query is recorded
+    in it.
+    """
+    query_counter = Counter(query_terms)
+    impact_postings = inverted_index.impact_postings
+    timings = profile.phase_seconds if profile is not None else None
+    with time_phase(SEARCH_PHASE_SECONDS, "candidates", timings):
+        heap = [
+            (-impact_postings[term][0][0] * query_term_frequency, term, 0)
+            for term, query_term_frequency in query_counter.items()
+            if impact_postings.get(term)
+        ]
+        heapq.heapify(heap)
+
+    with time_phase(SEARCH_PHASE_SECONDS, "scoring", timings):
+        accumulators, number_of_postings = _accumulate_impacts(
+            heap, impact_postings, query_counter, top_k if after is None else None
+        )
+
+    if profile is not None:
+        profile.posting_lengths = {
+            term: sum(len(documents) for _, documents in impact_postings.get(term, ()))
+            for term in query_counter
+        }
+        profile.ranking_evaluations = number_of_postings
+        profile.candidate_documents = len(accumulators)
+
+    with time_phase(SEARCH_PHASE_SECONDS, "sort", timings):
+        impact_scale = inverted_index.impact_scale
+        scores = {document_id: impact * impact_scale for document_id, impact in accumulators.items()}
+        return select_ranked_documents(scores, top_k=top_k, after=after)
+
+
+def _accumulate_impacts(
+        heap: list[tuple[int, str, int]],
+        impact_postings: dict[str, list[ImpactSegment]],
+        query_counter: Counter,
+        top_k: Optional[int],
+) -> tuple[dict[str, int], int]:
+    """ Accumulates the impacts of the segments on the heap, highest impact first, until done or able to terminate.
+
+    Returns the accumulated impacts keyed by document ID, and the number of postings that were accumulated.
+    """
+    upper_bounds = {term: -negative_impact for negative_impact, term, _ in heap}
+    accumulators: dict[str, int] = {}
+    threshold = 0
+    number_of_postings = 0
+    postings_since_check = 0
+    while heap:
+        negative_impact, term, position = heapq.heappop(heap)
+        impact, documents = -negative_impact, impact_postings[term][position][1]
+        for document_id in documents:
+            accumulators[document_id] = accumulators.get(document_id, 0) + impact
+        number_of_postings += len(documents)
+        postings_since_check += len(documents)
+
+        if position + 1 < len(impact_postings[term]):
+            next_impact = impact_postings[term][position + 1][0] * query_counter[term]
+            heapq.heappush(heap, (-next_impact, term, position + 1))
+            upper_bounds[term] = next_impact
+        else:
+            upper_bounds[term] = 0
+
+        # only look for the k-th score once it may be out of reach, or once enough postings have been processed
+        # since the last look for the cost of finding it to be amortised
+        remaining_impact = sum(upper_bounds.values())
+        if top_k and (remaining_impact < threshold or postings_since_check >= len(accumulators)):
+            postings_since_check = 0
+            terminate, threshold = _can_terminate(accumulators, top_k, remaining_impact)
+            if terminate:
+                break
+
+    return accumulators, number_of_postings
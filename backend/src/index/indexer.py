@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import itertools
 import logging
-import math
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from functools import cached_property
-from typing import Iterable, Optional
-
-from index.schema import SearchResult
+from typing import TYPE_CHECKING, Iterable, Iterator, Mapping, Optional
+
+from common.metrics import SEARCH_PHASE_SECONDS, deep_getsizeof, time_phase
+from index.build import DEFAULT_BATCH_SIZE, PartialIndex, gc_paused, iter_partial_indexes
+from index.compact import (EMPTY_POSTINGS, CompactFieldPostings, CompactImpactPostings, CompactTermValues,
+                           TermDictionary, TermFrequencies)
+from index.impact import ImpactSegment, build_impact_postings, rank_documents_by_impact
+from index.nlp import TextProcessor, get_analyzer_id
+from index.pagination import Cursor, RankedDocument, select_ranked_documents
+from index.planner import build_common_term_top_documents, plan_query
+from index.ranking import BM25_B, BM25_K_1, RANKING_FUNCTIONS, Postings, get_ranking_function, rsj_idf
+from index.schema import Fields, QueryProfile, RankingFunctionTypes, SearchResult
+
+if TYPE_CHECKING:
+    from wikipedia.schema import ArticleSchema
 
 logger = logging.getLogger(__name__)
 
@@ -44,20 +56,19 @@ class TermData:
         self.document_index = document_index or defaultdict(DocumentTermInfo)
         self.corpus_term_frequency = corpus_term_frequency
 
-    @cached_property
-    def documents_containing_term(self) -> list[str]:
-        """ Returns a list of document IDs that contain the term. """
-        return list(self.document_index.keys())
-
-    @cached_property
+    @property
     def number_of_documents_containing_term(self) -> int:
         """ Returns the number of documents that contain the term. """
-        return len(self.documents_containing_term)
+        return len(self.document_index)
 
     def get_document_info(self, document_id: str) -> DocumentTermInfo:
         """ Returns the DocumentTermInfo for the provided document ID. """
         return self.document_index[document_id]
 
+    def copy(self) -> TermData:
+        """ Returns a copy of the term data whose document index can be updated without changing this one. """
+        return TermData(defaultdict(DocumentTermInfo, self.document_index), self.corpus_term_frequency)
+
     def add_document_info(self, document_id: str, term_frequency: int, document_length: int) -> None:
         """ Adds a document ID and its DocumentTermInfo (term frequency & length) to the document index. """
         self.document_index[document_id] = DocumentTermInfo(
@@ -65,42 +76,76 @@ class TermData:
             document_length=document_length
         )
 
-    def reset_cached_properties(self):
-        """ To be used if the index is ever updated with more articles after instantiation and use. """
-        _reset_cached_properties(
-            self,
-            properties=(
-                "documents_containing_term",
-                "number_of_documents_containing_term"
-            )
-        )
-
 
 class Index:
     """ Inverted index of processed Wikipedia articles.
 
     Contains information about the corpus, including a term index for the corpus.
     The term index in turn consists of a document index so that the documents relevant to the term can be easily
-    retrieved.
+    retrieved. Article titles are indexed in a separate term index so that ranking functions can weight them apart.
     Other corpus information stored for use in ranking algorithm.
+
+    If the index is impact ordered, the quantized BM25 score of each posting is also precomputed, see `index.impact`.
+    If the index has compact terms, the term indexes are replaced by a compact, read-only layout once its statistics
+    are precomputed, see `compact`.
+    If the index has a common term IDF, queries skip most of the postings of terms with a lower IDF, and the top
+    documents of each such term are precomputed, see `index.planner`.
+
+    An index must not be updated while it is being searched. Instead, documents are added to its `next_generation`,
+    which then replaces it for new searches, while searches that already started finish on the old generation.
     """
     terms: defaultdict[str, TermData] = defaultdict(TermData)
+    title_terms: defaultdict[str, TermData] = defaultdict(TermData)
     number_of_documents: int = 0
-    document_lengths: list[int] = []
+    document_lengths: dict[str, int] = {}
+    title_lengths: dict[str, int] = {}
+    impact_ordered: bool = False
+    impact_postings: dict[str, list[ImpactSegment]] = {}
+    impact_scale: float = 0.0
+    analyzer_id: Optional[str] = None
+    compact_terms: bool = False
+    common_term_idf: Optional[float] = None
+    common_term_top_documents: dict[str, list[str]] = {}
+    generation: int = 0
 
     def __init__(
             self,
             terms: defaultdict[str, TermData] | None = None,
             number_of_documents: int = 0,
-            document_lengths: Optional[list[int]] = None,
+            document_lengths: Optional[dict[str, int]] = None,
+            title_terms: defaultdict[str, TermData] | None = None,
+            title_lengths: Optional[dict[str, int]] = None,
+            impact_ordered: bool = False,
+            analyzer_id: Optional[str] = None,
+            compact_terms: bool = False,
+            common_term_idf: Optional[float] = None,
     ):
         self.terms = terms or defaultdict(TermData)
+        self.title_terms = title_terms or defaultdict(TermData)
         self.number_of_documents = number_of_documents
-        self.document_lengths = document_lengths or []
+        self.document_lengths = document_lengths or {}
+        self.title_lengths = title_lengths or {}
+        self.impact_ordered = impact_ordered
+        self.impact_postings = {}
+        self.impact_scale = 0.0
+        self.analyzer_id = analyzer_id
+        self.compact_terms = compact_terms
+        self.common_term_idf = common_term_idf
+        self.common_term_top_documents = {}
+        self._idfs: dict[RankingFunctionTypes, Mapping[str, float]] = {}
+        # the compact layout of the term indexes, if they have been compacted
+        self._vocabulary: Optional[TermDictionary] = None
+        self._compact_fields: dict[Fields, CompactFieldPostings] = {}
+        self._document_ids: list[str] = []
+        self._document_numbers: dict[str, int] = {}
+        self.generation = 0
+        # the term indexes of the previous generation, whose term data is shared until a document containing the term
+        # is added to this generation
+        self._shared_terms: dict[Fields, dict[str, TermData]] = {}
 
     @cached_property
     def corpus_size(self) -> int:
-        return sum(self.document_lengths)
+        return sum(self.document_lengths.values())
 
     @cached_property
     def average_document_length(self) -> float:
@@ -108,34 +153,338 @@ class Index:
             raise ValueError("Cannot calculate average document length without any documents.")
         return self.corpus_size / self.number_of_documents
 
+    @cached_property
+    def document_length_ratios(self) -> dict[str, float]:
+        """ The length of each document relative to the average document length, keyed by document ID. """
+        return _length_ratios(self.document_lengths)
+
+    @cached_property
+    def title_length_ratios(self) -> dict[str, float]:
+        """ The length of each title relative to the average title length, keyed by document ID. """
+        return _length_ratios(self.title_lengths)
+
     def get_term_data(self, search_term: str) -> TermData:
         return self.terms[search_term]
 
-    def process_document(self, document_id: str, tokenized_document: list[str]) -> None:
+    def get_field_terms(self, field: Fields = Fields.BODY) -> defaultdict[str, TermData]:
+        """ Returns the term index for the given field. """
+        if field is Fields.TITLE:
+            return self.title_terms
+        return self.terms
+
+    def get_postings(self, term: str, field: Fields = Fields.BODY) -> Mapping[str, int]:
+        """ Returns the term frequency of a term in each document containing it in the given field, by document ID.
+
+        Does not add the term if it is not indexed.
+        """
+        if self._vocabulary is not None:
+            term_id = self._vocabulary.lookup(term)
+            if term_id is None:
+                return EMPTY_POSTINGS
+            return self._compact_fields[field].get_postings(term_id, self._document_ids, self._document_numbers)
+
+        term_data = self.get_field_terms(field).get(term)
+        if term_data is None:
+            return EMPTY_POSTINGS
+        return TermFrequencies(term_data.document_index)
+
+    def iter_document_frequencies(self, field: Fields = Fields.BODY) -> Iterator[tuple[str, int]]:
+        """ Yields every term in the given field with the number of documents containing it. """
+        if self._vocabulary is not None:
+            field_postings = self._compact_fields[field]
+            for term_id, term in enumerate(self._vocabulary):
+                if document_frequency := field_postings.document_frequency(term_id):
+                    yield term, document_frequency
+            return
+
+        for term, term_data in self.get_field_terms(field).items():
+            if term_data.document_index:
+                yield term, term_data.number_of_documents_containing_term
+
+    def get_vocabulary_size(self, field: Fields = Fields.BODY) -> int:
+        if self._vocabulary is not None:
+            return self._compact_fields[field].vocabulary_size
+        return len(self.get_field_terms(field))
+
+    def get_number_of_postings(self, field: Fields = Fields.BODY) -> int:
+        if self._vocabulary is not None:
+            return len(self._compact_fields[field].documents)
+        return sum(term_data.number_of_documents_containing_term for term_data in self.get_field_terms(field).values())
+
+    def get_length_ratios(self, field: Fields = Fields.BODY) -> dict[str, float]:
+        """ Returns the per-document length ratios for the given field. """
+        if field is Fields.TITLE:
+            return self.title_length_ratios
+        return self.document_length_ratios
+
+    def get_idfs(self, ranking_function: RankingFunctionTypes) -> Mapping[str, float]:
+        """ Returns the IDF of every term as computed by the given ranking function, computing them if not cached. """
+        if ranking_function not in self._idfs:
+            self._idfs[ranking_function] = RANKING_FUNCTIONS[ranking_function].compute_idfs(self)
+        return self._idfs[ranking_function]
+
+    def process_document(
+            self,
+            document_id: str,
+            tokenized_document: list[str],
+            tokenized_title: Optional[list[str]] = None,
+    ) -> None:
+        if self._vocabulary is not None:
+            self._expand()
         self.number_of_documents += 1
-        document_term_frequencies = Counter(tokenized_document)
-        document_length = len(tokenized_document)
-        self.document_lengths.append(document_length)
-
-        for term, term_frequency in document_term_frequencies.items():
-            term_data = self.get_term_data(term)
-            term_data.add_document_info(
-                document_id=document_id,
-                term_frequency=term_frequency,
-                document_length=document_length
+        self.document_lengths[document_id] = _add_field_postings(
+            self.terms, document_id, tokenized_document, self._shared_terms.get(Fields.BODY)
+        )
+        self.title_lengths[document_id] = _add_field_postings(
+            self.title_terms, document_id, tokenized_title or [], self._shared_terms.get(Fields.TITLE)
+        )
+
+    def next_generation(self) -> Index:
+        """ Returns the next generation of the index, to add documents to without changing this generation.
+
+        The two generations share everything that documents are not added to. The term indexes and lengths are copied
+        (a dict of references each), and the document index of a term is only copied when a document containing the
+        term is added to the next generation, so this generation can still be searched while the next one is built.
+        Statistics are recomputed for the next generation when documents are added to it.
+        """
+        next_generation = Index(
+            terms=defaultdict(TermData, self.terms),
+            number_of_documents=self.number_of_documents,
+            document_lengths=dict(self.document_lengths),
+            title_terms=defaultdict(TermData, self.title_terms),
+            title_lengths=dict(self.title_lengths),
+            impact_ordered=self.impact_ordered,
+            analyzer_id=self.analyzer_id,
+            compact_terms=self.compact_terms,
+            common_term_idf=self.common_term_idf,
+        )
+        next_generation.generation = self.generation + 1
+        next_generation._shared_terms = {Fields.BODY: self.terms, Fields.TITLE: self.title_terms}
+        next_generation._idfs = dict(self._idfs)
+        next_generation.impact_postings = self.impact_postings
+        next_generation.impact_scale = self.impact_scale
+        next_generation._vocabulary = self._vocabulary
+        next_generation._compact_fields = self._compact_fields
+        next_generation._document_ids = self._document_ids
+        next_generation._document_numbers = self._document_numbers
+        return next_generation
+
+    def add_partial_indexes(self, partial_indexes: Iterable[PartialIndex]) -> None:
+        """ Adds the documents of partial indexes of batches of documents, built in parallel (see `index.build`).
+
+        The documents of each partial index are numbered from 0, and are remapped to their document IDs as they are
+        added. If the index has compact terms and no documents yet, the compact layout is built straight from the
+        partial indexes instead, with documents numbered in the order of the batches.
+        """
+        with gc_paused():
+            self._add_partial_indexes(partial_indexes)
+
+    def _add_partial_indexes(self, partial_indexes: Iterable[PartialIndex]) -> None:
+        if self.compact_terms and not self.number_of_documents:
+            partial_indexes = list(partial_indexes)
+            document_ids = [
+                document_id for partial_index in partial_indexes for document_id in partial_index.document_ids
+            ]
+            # documents indexed more than once are only kept once, which the compact layout cannot do on its own
+            if len(set(document_ids)) == len(document_ids):
+                self._load_compact_partial_indexes(partial_indexes, document_ids)
+                return
+
+        if self._vocabulary is not None:
+            self._expand()
+        for partial_index in partial_indexes:
+            document_ids = partial_index.document_ids
+            for field, postings, lengths in (
+                    (Fields.BODY, partial_index.body, partial_index.document_lengths),
+                    (Fields.TITLE, partial_index.title, partial_index.title_lengths),
+            ):
+                field_terms = self.get_field_terms(field)
+                shared_terms = self._shared_terms.get(field)
+                for term, start, end in zip(postings.terms, postings.offsets, postings.offsets[1:]):
+                    documents = postings.documents[start:end]
+                    term_frequencies = postings.term_frequencies[start:end]
+                    _get_writable_term_data(field_terms, term, shared_terms).document_index.update(zip(
+                        map(document_ids.__getitem__, documents),
+                        map(DocumentTermInfo, term_frequencies, map(lengths.__getitem__, documents)),
+                    ))
+            self.number_of_documents += len(document_ids)
+            self.document_lengths.update(zip(document_ids, partial_index.document_lengths))
+            self.title_lengths.update(zip(document_ids, partial_index.title_lengths))
+
+    def _load_compact_partial_indexes(self, partial_indexes: list[PartialIndex], document_ids: list[str]) -> None:
+        """ Builds the compact layout of the term indexes of an empty index straight from partial indexes. """
+        self._vocabulary = TermDictionary(
+            term for partial_index in partial_indexes for term in partial_index.body.terms + partial_index.title.terms
+        )
+        term_ids = {term: term_id for term_id, term in enumerate(self._vocabulary)}
+        document_offsets = list(itertools.accumulate(
+            (len(partial_index.document_ids) for partial_index in partial_indexes[:-1]), initial=0
+        ))
+        self._compact_fields = {
+            Fields.BODY: CompactFieldPostings.from_partial_postings(
+                term_ids, [partial_index.body for partial_index in partial_indexes], document_offsets
+            ),
+            Fields.TITLE: CompactFieldPostings.from_partial_postings(
+                term_ids, [partial_index.title for partial_index in partial_indexes], document_offsets
+            ),
+        }
+        self._document_ids = document_ids
+        self._document_numbers = {document_id: number for number, document_id in enumerate(document_ids)}
+        self.number_of_documents = len(document_ids)
+        for partial_index in partial_indexes:
+            self.document_lengths.update(zip(partial_index.document_ids, partial_index.document_lengths))
+            self.title_lengths.update(zip(partial_index.document_ids, partial_index.title_lengths))
+
+    def precompute_statistics(self) -> None:
+        """ Computes the statistics used by the ranking functions up front, rather than on the first query. """
+        # the generation is complete, so the previous generation's term indexes do not need to be kept alive
+        self._shared_terms = {}
+        if not self.number_of_documents:
+            return
+        self.document_length_ratios
+        self.title_length_ratios
+        for ranking_function in RankingFunctionTypes:
+            self.get_idfs(ranking_function)
+        if self.impact_ordered:
+            self.impact_postings, self.impact_scale = build_impact_postings(self)
+        if self.common_term_idf is not None:
+            self.common_term_top_documents = build_common_term_top_documents(self)
+        if self.compact_terms:
+            self.compact()
+
+    def compact(self) -> None:
+        """ Replaces the term indexes, and the IDFs and impact postings keyed by term, with a compact layout.
+
+        The terms of both fields are kept in one sorted `TermDictionary`, and everything else in arrays indexed by term
+        ID (see `index.compact`), so there are no objects per term left. Searching reads the arrays directly. Adding
+        documents expands the term indexes again, so it is much slower than adding them to a dynamic index.
+        """
+        if self._vocabulary is None:
+            self._document_ids = list(self.document_lengths)
+            self._document_numbers = {document_id: number for number, document_id in enumerate(self._document_ids)}
+            self._vocabulary = TermDictionary(list(self.terms) + list(self.title_terms))
+            self._compact_fields = {
+                Fields.BODY: CompactFieldPostings.from_terms(self._vocabulary, self.terms, self._document_numbers),
+                Fields.TITLE: CompactFieldPostings.from_terms(
+                    self._vocabulary, self.title_terms, self._document_numbers
+                ),
+            }
+            self.terms = defaultdict(TermData)
+            self.title_terms = defaultdict(TermData)
+
+        # statistics computed since the index was compacted are still dicts
+        self._idfs = {
+            ranking_function: idfs if isinstance(idfs, CompactTermValues) else CompactTermValues(self._vocabulary, idfs)
+            for ranking_function, idfs in self._idfs.items()
+        }
+        if self.impact_postings and not isinstance(self.impact_postings, CompactImpactPostings):
+            self.impact_postings = CompactImpactPostings(
+                self._vocabulary, self.impact_postings, self._document_ids, self._document_numbers
             )
 
+    def _expand(self) -> None:
+        """ Rebuilds the term indexes from their compact layout, so that more documents can be added. """
+        field_lengths = {Fields.BODY: self.document_lengths, Fields.TITLE: self.title_lengths}
+        for field, field_postings in self._compact_fields.items():
+            field_terms = self.get_field_terms(field)
+            for term_id, term in enumerate(self._vocabulary):
+                if not field_postings.document_frequency(term_id):
+                    continue
+                term_data = field_terms[term]
+                postings = field_postings.get_postings(term_id, self._document_ids, self._document_numbers)
+                for document_id, term_frequency in postings.items():
+                    term_data.add_document_info(document_id, term_frequency, field_lengths[field][document_id])
+        self._vocabulary = None
+        self._compact_fields = {}
+        self._document_ids = []
+        self._document_numbers = {}
+        self._idfs = {}
+        self.impact_postings = {}
+
+    def memory_usage(self) -> dict[str, int]:
+        """ Returns the approximate memory used by each structure of the index, in bytes.
+
+        Anything shared between structures, such as the vocabulary of a compact index, is counted once, in the first.
+        """
+        seen: set[int] = set()
+        return {
+            "vocabulary": (
+                deep_getsizeof(self._vocabulary, seen)
+                + deep_getsizeof(self._document_ids, seen)
+                + deep_getsizeof(self._document_numbers, seen)
+            ),
+            "terms": deep_getsizeof(self.terms, seen) + deep_getsizeof(self._compact_fields.get(Fields.BODY), seen),
+            "title_terms": (
+                deep_getsizeof(self.title_terms, seen) + deep_getsizeof(self._compact_fields.get(Fields.TITLE), seen)
+            ),
+            "document_lengths": deep_getsizeof(self.document_lengths, seen),
+            "title_lengths": deep_getsizeof(self.title_lengths, seen),
+            "length_ratios": (
+                deep_getsizeof(self.document_length_ratios, seen) + deep_getsizeof(self.title_length_ratios, seen)
+            ),
+            "idfs": deep_getsizeof(self._idfs, seen),
+            "impact_postings": deep_getsizeof(self.impact_postings, seen),
+            "common_term_top_documents": deep_getsizeof(self.common_term_top_documents, seen),
+        }
+
     def reset_cached_properties(self: Index):
         """ To be used if the index is ever updated with more articles after instantiation and use. """
         _reset_cached_properties(
             self,
             properties=(
                 "average_document_length",
-                "corpus_size"
+                "corpus_size",
+                "document_length_ratios",
+                "title_length_ratios",
             )
         )
-        for term_data in self.terms.values():
-            term_data.reset_cached_properties()
+        self._idfs = {}
+        self.impact_postings = {}
+        self.impact_scale = 0.0
+        self.common_term_top_documents = {}
+
+
+def _get_writable_term_data(
+        field_terms: defaultdict[str, TermData],
+        term: str,
+        shared_terms: Optional[dict[str, TermData]] = None,
+) -> TermData:
+    """ Returns the data of a term to add documents to, copying it first if the previous generation shares it. """
+    term_data = field_terms[term]
+    if shared_terms is not None and shared_terms.get(term) is term_data:
+        term_data = field_terms[term] = term_data.copy()
+    return term_data
+
+
+def _add_field_postings(
+        field_terms: defaultdict[str, TermData],
+        document_id: str,
+        tokens: list[str],
+        shared_terms: Optional[dict[str, TermData]] = None,
+) -> int:
+    """ Adds a document's postings to the term index of a field. Returns the length of the field in the document.
+
+    Term data shared with the previous generation of the index (see `Index.next_generation`) is copied before adding to
+    it.
+    """
+    document_length = len(tokens)
+    for term, term_frequency in Counter(tokens).items():
+        _get_writable_term_data(field_terms, term, shared_terms).add_document_info(
+            document_id=document_id,
+            term_frequency=term_frequency,
+            document_length=document_length
+        )
+    return document_length
+
+
+def _length_ratios(lengths: dict[str, int]) -> dict[str, float]:
+    """ Returns each length divided by the average of the lengths. """
+    if not lengths:
+        return {}
+    average_length = sum(lengths.values()) / len(lengths)
+    if not average_length:
+        return {document_id: 0.0 for document_id in lengths}
+    return {document_id: length / average_length for document_id, length in lengths.items()}
 
 
 INDEX = Index()
@@ -161,13 +510,11 @@ def bm25_rank(
     kept between 0.5 and 0.8 and coefficient k_1 should be between 1.2 and 2.0
     """
     if b is None:
-        b = 0.8  # 0.5 <= b <= 0.8
+        b = BM25_B
     if k_1 is None:
-        k_1 = 2.0  # 1.2 <= k <= 2.0
+        k_1 = BM25_K_1
 
-    ratio_numerator = total_number_of_documents - number_of_documents_containing_term + 0.5
-    ratio_denominator = number_of_documents_containing_term + 0.5
-    w_rsj = math.log(ratio_numerator / ratio_denominator)
+    w_rsj = rsj_idf(total_number_of_documents, number_of_documents_containing_term)
 
     b_calc = ((1 - b) + b * (document_length / average_document_length))
     k_1_calc = (k_1 * b_calc + term_frequency_in_document)
@@ -175,72 +522,271 @@ def bm25_rank(
     return (term_frequency_in_document / k_1_calc) * w_rsj
 
 
+def _filter_articles_by_analyzer(
+        articles: Iterable[ArticleSchema],
+        analyzer_id: Optional[str],
+        skipped: list[str],
+) -> Iterator[ArticleSchema]:
+    """ Yields the articles that were tokenized by the analyzer, and adds the titles of the others, including those
+    tokenized by an unknown one, to `skipped`.
+    """
+    for article in articles:
+        if analyzer_id and article.text_processor != analyzer_id:
+            skipped.append(article.title)
+            continue
+        yield article
+
+
 def create_or_update_inverted_index(
-        articles: list["ArticleSchema"],  # noqa: F821
-        index: Optional[Index] = INDEX
+        articles: Iterable[ArticleSchema],
+        index: Optional[Index] = INDEX,
+        text_processor: Optional[TextProcessor] = None,
+        impact_ordered: Optional[bool] = None,
+        precompute: bool = True,
+        compact_terms: Optional[bool] = None,
+        workers: int = 1,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        common_term_idf: Optional[float] = None,
 ):
-    """ Creates or updates existing inverted index model, processes articles and populates index with corpus terms. """
+    """ Creates or updates existing inverted index model, processes articles and populates index with corpus terms.
+
+    Article titles are only indexed if a text processor is provided to tokenize them with, which should be the same
+    processor that the article content and queries are tokenized with.
+    The index records the ID of the analyzer for the text processor (see `index.nlp.ANALYZERS`), so that queries can be
+    tokenized the same way, and articles that were tokenized by another analyzer, or do not record one, are skipped
+    rather than mixed in.
+    If `impact_ordered` or `compact_terms` are provided, they switch impact-ordered postings or the compact layout of
+    the term indexes on or off for the index. If `common_term_idf` is provided, queries treat terms with a lower IDF as
+    common terms, see `index.planner`.
+    When adding articles in several batches, `precompute` can be switched off for all but the last batch, so that the
+    statistics used for ranking are only computed once.
+    With more than one worker, partial indexes of batches of `batch_size` articles are built in that many processes and
+    merged into the index, see `index.build`.
+    """
     if index:
         index.reset_cached_properties()
     else:
         index = Index()
+    if impact_ordered is not None:
+        index.impact_ordered = impact_ordered
+    if compact_terms is not None:
+        index.compact_terms = compact_terms
+    if common_term_idf is not None:
+        index.common_term_idf = common_term_idf
+    if text_processor and index.analyzer_id is None:
+        index.analyzer_id = get_analyzer_id(text_processor)
+
+    skipped: list[str] = []
+    articles = _filter_articles_by_analyzer(articles, index.analyzer_id, skipped)
+    if workers > 1:
+        index.add_partial_indexes(iter_partial_indexes(articles, text_processor, workers, batch_size))
+    else:
+        for article in articles:
+            logger.info(f"Processing article: {article.title}")
 
-    for article in articles:
-        logger.info(f"Processing article: {article.title}")
+            index.process_document(
+                document_id=article.title,
+                tokenized_document=article.tokenized_content or [],
+                tokenized_title=text_processor(article.title) if text_processor else None,
+            )
+    if skipped:
+        logger.warning(f"Skipped {len(skipped)} articles that were not tokenized by analyzer '{index.analyzer_id}'")
+
+    if precompute:
+        _precompute_statistics(index, skipped)
+    return index
 
-        index.process_document(document_id=article.title, tokenized_document=article.tokenized_content)
 
+def _precompute_statistics(index: Index, skipped: list[str]) -> None:
+    """ Precomputes the statistics of the index and logs them, or warns that it is empty, e.g. if every article was
+    tokenized by another analyzer.
+    """
+    index.precompute_statistics()
+    if not index.number_of_documents:
+        logger.warning(f"The index is empty, {len(skipped)} articles were skipped")
+        return
     logger.info(f"__Number of documents: {index.number_of_documents}")
     logger.info(f"__Corpus size: {index.corpus_size}")
     logger.info(f"__Avg. document length: {index.average_document_length}")
-    return index
 
 
 def get_set_of_documents_containing_terms(index: Index, terms: Iterable[str]) -> set[str]:
     """ Returns a set of document IDs that contain the provided terms. """
     matching_docs = set()
     for term in terms:
-        documents_containing_term = index.get_term_data(search_term=term).documents_containing_term
-        if not documents_containing_term:
-            continue
-        matching_docs.update(documents_containing_term)
+        matching_docs.update(index.get_postings(term))
 
     return matching_docs
 
 
-def rank_documents(query_terms: list[str], inverted_index: Index | None = INDEX, **kwargs) -> list[SearchResult]:
-    """ Creates a dict of document IDs and ranks for the provided query terms, ordered by rank. """
-    results = {}
+def _record_profile(profile: QueryProfile, term_postings: dict[str, list[dict]], results: dict[str, float]) -> None:
+    """ Records the postings and candidates of a query in its profile. """
+    profile.posting_lengths = {
+        term: sum(len(field_postings) for field_postings in postings)
+        for term, postings in term_postings.items()
+    }
+    profile.ranking_evaluations = sum(profile.posting_lengths.values())
+    profile.candidate_documents = len(results)
+
+
+def rank_documents(
+        query_terms: list[str],
+        inverted_index: Index | None = INDEX,
+        ranking_function: RankingFunctionTypes = RankingFunctionTypes.BM25,
+        top_k: Optional[int] = None,
+        profile: Optional[QueryProfile] = None,
+        after: Optional[Cursor] = None,
+        **kwargs
+) -> list[SearchResult]:
+    """ Creates a list of search results for the provided query terms, ordered by rank. See `rank_document_ids`. """
+    return _to_search_results(rank_document_ids(
+        query_terms,
+        inverted_index=inverted_index,
+        ranking_function=ranking_function,
+        top_k=top_k,
+        profile=profile,
+        after=after,
+        **kwargs
+    ))
+
+
+def rank_document_ids(
+        query_terms: list[str],
+        inverted_index: Index | None = INDEX,
+        ranking_function: RankingFunctionTypes = RankingFunctionTypes.BM25,
+        top_k: Optional[int] = None,
+        profile: Optional[QueryProfile] = None,
+        after: Optional[Cursor] = None,
+        **kwargs
+) -> list[RankedDocument]:
+    """ Creates a list of document IDs and ranks for the provided query terms, ordered by rank.
+
+    Documents with the same rank are ordered by ID. Any keyword arguments (`b`, `k_1`, `delta`, `title_boost`) are
+    passed to the ranking function. If `top_k` is provided, only the top k documents are returned. If a cursor is
+    provided as `after`, only the documents ranked after it are returned (see `index.pagination`). If a `profile` is
+    provided, the cost of the query is recorded in it.
+    BM25 queries with default parameters are served from the impact-ordered postings if the index has them. Otherwise,
+    if the index has a common term IDF, the postings of common terms are only scored for candidate documents, see
+    `index.planner`.
+    """
+    if (
+            inverted_index.impact_ordered
+            and ranking_function is RankingFunctionTypes.BM25
+            and all(value is None for value in kwargs.values())
+    ):
+        return rank_documents_by_impact(
+            query_terms, inverted_index=inverted_index, top_k=top_k, profile=profile, after=after
+        )
+
+    results: dict[str, float] = {}
     query_counter = Counter(query_terms)
+    ranker = get_ranking_function(ranking_function, inverted_index, **kwargs)
+    timings = profile.phase_seconds if profile is not None else None
 
-    matching_docs = get_set_of_documents_containing_terms(
-        index=inverted_index,
-        terms=query_counter.keys()
-    )
-
-    for document_id in matching_docs:
-        document_rank = 0
-        for term in query_counter.keys():
-            term_data = inverted_index.get_term_data(term)
-            document_info = term_data.get_document_info(document_id=document_id)
-            if not document_info:
-                continue
-
-            rank = bm25_rank(
-                total_number_of_documents=inverted_index.number_of_documents,
-                number_of_documents_containing_term=term_data.number_of_documents_containing_term,
-                term_frequency_in_document=document_info.term_frequency,
-                document_length=document_info.document_length,
-                average_document_length=inverted_index.average_document_length,
-                **kwargs
-            )
+    with time_phase(SEARCH_PHASE_SECONDS, "candidates", timings):
+        term_postings = {term: ranker.get_postings(term) for term in query_counter}
+        common_terms = []
+        if inverted_index.common_term_idf is not None:
+            term_postings, common_terms = plan_query(inverted_index, term_postings, top_k)
+
+    with time_phase(SEARCH_PHASE_SECONDS, "scoring", timings):
+        for term, postings in term_postings.items():
+            ranker.accumulate(term, query_counter[term], postings, results)
+
+    if profile is not None:
+        _record_profile(profile, term_postings, results)
+        profile.common_terms = common_terms
+
+    with time_phase(SEARCH_PHASE_SECONDS, "sort", timings):
+        return select_ranked_documents(results, top_k=top_k, after=after)
 
-            # add this score for every occurrence of the term in the doc
-            document_rank += (rank * query_counter[term])
 
-        results[document_id] = document_rank
+def _to_search_results(ranked_documents: list[RankedDocument]) -> list[SearchResult]:
+    return [SearchResult(title=document_id, ranking=score) for document_id, score in ranked_documents]
+
+
+def _plan_queries(
+        index: Index,
+        query_counters: dict[tuple[str, ...], Counter],
+        term_postings: dict[str, list[Postings]],
+        top_k: Optional[int],
+) -> dict[tuple[str, ...], dict[str, list[Postings]]]:
+    """ Returns the postings to score for each term of each query, planned as `rank_document_ids` would if the index
+    has a common term IDF, see `index.planner`.
+    """
+    query_postings = {
+        query_terms: {term: term_postings[term] for term in query_counter}
+        for query_terms, query_counter in query_counters.items()
+    }
+    if index.common_term_idf is None:
+        return query_postings
+    return {query_terms: plan_query(index, postings, top_k)[0] for query_terms, postings in query_postings.items()}
+
+
+def rank_documents_batch(
+        queries: list[list[str]],
+        inverted_index: Index | None = INDEX,
+        ranking_function: RankingFunctionTypes = RankingFunctionTypes.BM25,
+        top_k: Optional[int] = None,
+        **kwargs
+) -> list[list[SearchResult]]:
+    """ Ranks documents for each of a batch of queries, returning the results of each query in order.
+
+    Identical queries are only ranked once, and the postings of every distinct term are read once for the whole batch.
+    The scores of a term that appears in more than one query are computed once and then added to the scores of each of
+    those queries, so the results match ranking each query with `rank_documents`.
+    """
+    unique_queries = list(dict.fromkeys(tuple(query_terms) for query_terms in queries))
+    if (
+            inverted_index.impact_ordered
+            and ranking_function is RankingFunctionTypes.BM25
+            and all(value is None for value in kwargs.values())
+    ):
+        # impact scores are precomputed, so there is nothing to share between queries
+        ranked = {
+            query_terms: _to_search_results(
+                rank_documents_by_impact(list(query_terms), inverted_index=inverted_index, top_k=top_k)
+            )
+            for query_terms in unique_queries
+        }
+        return [ranked[tuple(query_terms)] for query_terms in queries]
+
+    query_counters = {query_terms: Counter(query_terms) for query_terms in unique_queries}
+    ranker = get_ranking_function(ranking_function, inverted_index, **kwargs)
+
+    with time_phase(SEARCH_PHASE_SECONDS, "candidates"):
+        term_postings = {
+            term: ranker.get_postings(term) for query_counter in query_counters.values() for term in query_counter
+        }
+        query_postings = _plan_queries(inverted_index, query_counters, term_postings, top_k)
+        # only the full postings of a term can be scored once for all the queries, not those planned for one query
+        term_queries = Counter(
+            term
+            for postings in query_postings.values()
+            for term, planned_postings in postings.items()
+            if planned_postings is term_postings[term]
+        )
 
-    return [
-        SearchResult(title=k, ranking=results[k])
-        for k in sorted(results, key=results.get, reverse=True)
-    ]
+    with time_phase(SEARCH_PHASE_SECONDS, "scoring"):
+        shared_term_scores: dict[str, dict[str, float]] = {}
+        for term, number_of_queries in term_queries.items():
+            if number_of_queries > 1:
+                ranker.accumulate(term, 1, term_postings[term], shared_term_scores.setdefault(term, {}))
+
+        query_results: dict[tuple[str, ...], dict[str, float]] = {}
+        for query_terms, query_counter in query_counters.items():
+            results = query_results[query_terms] = {}
+            for term, query_term_frequency in query_counter.items():
+                postings = query_postings[query_terms][term]
+                if term not in shared_term_scores or postings is not term_postings[term]:
+                    ranker.accumulate(term, query_term_frequency, postings, results)
+                    continue
+                for document_id, score in shared_term_scores[term].items():
+                    results[document_id] = results.get(document_id, 0.0) + score * query_term_frequency
+
+    with time_phase(SEARCH_PHASE_SECONDS, "sort"):
+        ranked = {
+            query_terms: _to_search_results(select_ranked_documents(results, top_k=top_k))
+            for query_terms, results in query_results.items()
+        }
+    return [ranked[tuple(query_terms)] for query_terms in queries]
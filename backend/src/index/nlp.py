@@ -1,17 +1,56 @@
 import re
+import sys
+from dataclasses import dataclass
 from enum import Enum
-from typing import Callable
+from functools import cache, lru_cache
+from typing import Callable, Optional
 
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from nltk.stem.porter import PorterStemmer
 
+NLTK_RESOURCES = ("stopwords", "wordnet", "omw-1.4")
+# the number of distinct words whose stem or lemma is remembered, which covers most words in a Zipfian corpus
+WORD_CACHE_SIZE = 2 ** 18
+QUERY_CACHE_SIZE = 4096
 
-def set_up_nltk():
-    nltk.download('stopwords')
-    nltk.download('wordnet')
-    nltk.download('omw-1.4')
+
+def set_up_nltk(download_dir: Optional[str] = None):
+    """ Downloads the NLTK resources used by the text processors.
+
+    This needs network access, so should be done when provisioning the app (e.g. building the Docker image), not when
+    the app runs. NLTK looks for the resources in the directories in `nltk.data.path`, which includes the `NLTK_DATA`
+    environment variable, so `download_dir` should be one of those.
+    """
+    for resource in NLTK_RESOURCES:
+        nltk.download(resource, download_dir=download_dir, quiet=True, raise_on_error=True)
+
+
+@cache
+def _stop_words() -> frozenset[str]:
+    """ Loads the English stopwords the first time they are needed. """
+    return frozenset(stopwords.words('english'))
+
+
+@cache
+def _stemmer() -> PorterStemmer:
+    return PorterStemmer()
+
+
+@cache
+def _lemmatizer() -> WordNetLemmatizer:
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _stem_word(word: str) -> str:
+    return _stemmer().stem(word)
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _lemmatize_word(word: str) -> str:
+    return _lemmatizer().lemmatize(word)
 
 
 class TextProcessorTypes(Enum):
@@ -58,22 +97,20 @@ def basic_preprocess(text: str) -> list[str]:
 
 def stopword_removal(text: str) -> list[str]:
     """ Removes stopwords from text. """
-    stop_words = set(stopwords.words('english'))
+    stop_words = _stop_words()
     return [word for word in basic_preprocess(text) if word not in stop_words]
 
 
 def stem(text: str) -> list[str]:
     """ Converts words in text to their stem word using the Porter Stemmer."""
-    stemmer = PorterStemmer()
     words = stopword_removal(text)
-    return [stemmer.stem(word) for word in words]
+    return [_stem_word(word) for word in words]
 
 
 def lemmatize(text: str) -> list[str]:
     """ Converts words in text to their lemma using the WordNet lemmatizer."""
-    lemmatizer = WordNetLemmatizer()
     words = stopword_removal(text)
-    return [lemmatizer.lemmatize(w) for w in words]
+    return [_lemmatize_word(w) for w in words]
 
 
 TEXT_PROCESSORS = {
@@ -82,3 +119,77 @@ TEXT_PROCESSORS = {
     TextProcessorTypes.STEMMING: stem,
     TextProcessorTypes.LEMMATIZATION: lemmatize,
 }
+
+
+@dataclass(frozen=True)
+class Analyzer:
+    """ A version of a text processor, which can be called like one.
+
+    Whenever a change to a text processor changes the tokens it produces, a new version of its analyzer should be
+    registered, so that indexes built with the old version are not queried with tokens from the new one.
+    """
+    type: TextProcessorTypes
+    version: int
+    text_processor: TextProcessor
+
+    @property
+    def id(self) -> str:
+        """ The ID of the analyzer, e.g. `lemmatization:v1`, which is stored along with the tokens it produces. """
+        return f"{self.type.value}:v{self.version}"
+
+    def __call__(self, text: str) -> list[str]:
+        return self.text_processor(text)
+
+
+# every analyzer by ID, including older versions that indexes may still have been built with
+ANALYZERS: dict[str, Analyzer] = {
+    analyzer.id: analyzer
+    for analyzer in (
+        Analyzer(TextProcessorTypes.BASIC, 1, basic_preprocess),
+        Analyzer(TextProcessorTypes.STOPWORD_REMOVAL, 1, stopword_removal),
+        Analyzer(TextProcessorTypes.STEMMING, 1, stem),
+        Analyzer(TextProcessorTypes.LEMMATIZATION, 1, lemmatize),
+    )
+}
+
+
+def get_analyzer(analyzer_id: str) -> Analyzer:
+    """ Returns the analyzer with the given ID, raising a ValueError if there is no such analyzer. """
+    if analyzer_id not in ANALYZERS:
+        raise ValueError(f"Invalid analyzer '{analyzer_id}', must be one of {list(ANALYZERS)}")
+    return ANALYZERS[analyzer_id]
+
+
+def get_analyzer_id(text_processor: TextProcessor) -> Optional[str]:
+    """ Returns the ID of the latest analyzer for a text processor, or of the analyzer itself if given one.
+
+    Returns None for text processors that are not registered.
+    """
+    if isinstance(text_processor, Analyzer):
+        return text_processor.id
+    analyzers = [analyzer for analyzer in ANALYZERS.values() if analyzer.text_processor is text_processor]
+    return max(analyzers, key=lambda analyzer: analyzer.version).id if analyzers else None
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def analyze_query(analyzer_id: str, query: str) -> tuple[str, ...]:
+    """ Tokenizes a query with the analyzer that the index being searched was built with.
+
+    Popular queries are repeated often, so their tokens are cached.
+    """
+    return tuple(get_analyzer(analyzer_id)(query))
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def analyze_word(analyzer_id: str, word: str) -> tuple[str, ...]:
+    """ Tokenizes a single word of a document with an analyzer, e.g. to find where query terms are in its text. """
+    return tuple(get_analyzer(analyzer_id)(word))
+
+
+def warm_up(text_processor: TextProcessor) -> None:
+    """ Loads any NLTK resources used by the text processor, so the first request using it is not slowed down. """
+    text_processor("Warming up the text processors")
+
+
+if __name__ == "__main__":
+    set_up_nltk(download_dir=sys.argv[1] if len(sys.argv) > 1 else None)
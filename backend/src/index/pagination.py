@@ -0,0 +1,58 @@
+"""
+Ordering and cursor-based pagination of ranked documents.
+
+Documents are ordered by score, highest first, with ties broken by title so that the order is the same on every
+request. A cursor holds the score and title of the last document of a page, and the next page starts right after it,
+so pages do not need the documents before them to be ranked again and do not shift if the index changes in between.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import heapq
+import json
+from typing import Iterable, Optional
+
+# a document ID and its score
+RankedDocument = tuple[str, float]
+# the score and document ID of the last document of a page
+Cursor = tuple[float, str]
+
+
+def _sort_key(ranked_document: RankedDocument) -> tuple[float, str]:
+    document_id, score = ranked_document
+    return -score, document_id
+
+
+def select_ranked_documents(
+        scores: dict[str, float],
+        top_k: Optional[int] = None,
+        after: Optional[Cursor] = None,
+) -> list[RankedDocument]:
+    """ Returns the (top k) documents in ranked order, starting after the cursor if there is one. """
+    ranked_documents: Iterable[RankedDocument] = scores.items()
+    if after is not None:
+        after_key = (-after[0], after[1])
+        ranked_documents = [
+            ranked_document for ranked_document in ranked_documents if _sort_key(ranked_document) > after_key
+        ]
+    if top_k is None:
+        return sorted(ranked_documents, key=_sort_key)
+    return heapq.nsmallest(top_k, ranked_documents, key=_sort_key)
+
+
+def encode_cursor(ranked_document: RankedDocument) -> str:
+    """ Returns an opaque cursor for the page after the given document. """
+    document_id, score = ranked_document
+    return base64.urlsafe_b64encode(json.dumps([score, document_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """ Returns the score and document ID held by a cursor, raising a ValueError if it is not a valid cursor. """
+    try:
+        score, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'") from e
+    if not isinstance(score, (int, float)) or not isinstance(document_id, str):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return float(score), document_id
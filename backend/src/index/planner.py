@@ -0,0 +1,98 @@
+"""
+Query planning for common terms, which most documents contain, e.g. stopwords when the text processor keeps them.
+
+Scoring a term takes a step for every document containing it, so with the basic text processor a query such as "the
+history of" scores nearly every document for "the" and "of", although their IDF is so low that they barely change the
+ranking. If the index has a `common_term_idf`, terms with a lower IDF (`log(N / df)`, whatever the ranking function)
+are common, and the postings of the query's common terms are cut down to a set of candidate documents before scoring:
+
+- If the query has other, selective, terms, the candidates are the documents containing any of them. Common terms are
+  only looked up for those documents, so their scores are exact, but documents containing only common terms are left
+  out.
+- If the query has only common terms, the candidates are the top documents of each term, by BM25 weight, which the
+  index keeps for its common terms (see `build_common_term_top_documents`). Every term is then scored exactly for the
+  candidates. This is only done for queries asking for at most `COMMON_TERM_TOP_DOCUMENTS` results, otherwise every
+  document is scored.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from typing import TYPE_CHECKING, Optional
+
+from index.ranking import BM25, Postings
+
+if TYPE_CHECKING:
+    from index.indexer import Index
+
+COMMON_TERM_TOP_DOCUMENTS = 1000
+
+
+def is_common_term(index: Index, document_frequency: int) -> bool:
+    """ Returns whether a term in this many documents is common in the index, i.e. has an IDF below its threshold. """
+    return bool(document_frequency) and (
+        math.log(index.number_of_documents / document_frequency) < index.common_term_idf
+    )
+
+
+def build_common_term_top_documents(index: Index, top_n: int = COMMON_TERM_TOP_DOCUMENTS) -> dict[str, list[str]]:
+    """ Returns the IDs of the `top_n` documents with the highest BM25 weight for each common term of the index.
+
+    The weight of a term only depends on its frequency in the document and the length of the document, so the same top
+    documents are used as candidates whichever ranking function (and parameters) a query is scored with.
+    """
+    bm25 = BM25(index)
+    length_ratios = index.get_length_ratios()
+
+    def weight(posting: tuple[str, int]) -> float:
+        return bm25.weight_term_frequency(posting[1], length_ratios[posting[0]])
+
+    return {
+        term: [document_id for document_id, _ in heapq.nlargest(top_n, index.get_postings(term).items(), key=weight)]
+        for term, document_frequency in index.iter_document_frequencies()
+        if is_common_term(index, document_frequency)
+    }
+
+
+def _candidates(
+        index: Index,
+        term_postings: dict[str, list[Postings]],
+        common_terms: list[str],
+        top_k: Optional[int],
+) -> Optional[set[str]]:
+    """ Returns the documents to score the common terms of a query for, or None to score every document. """
+    selective_terms = [term for term, postings in term_postings.items() if postings and term not in common_terms]
+    if selective_terms:
+        return set().union(*(field_postings for term in selective_terms for field_postings in term_postings[term]))
+    if (
+            top_k is not None
+            and top_k <= COMMON_TERM_TOP_DOCUMENTS
+            and all(term in index.common_term_top_documents for term in common_terms)
+    ):
+        return set().union(*(index.common_term_top_documents[term] for term in common_terms))
+    return None
+
+
+def plan_query(
+        index: Index,
+        term_postings: dict[str, list[Postings]],
+        top_k: Optional[int] = None,
+) -> tuple[dict[str, list[Postings]], list[str]]:
+    """ Returns the postings to score for each term of a query, with those of the common terms only for the candidate
+    documents, and the common terms.
+
+    :param index: The index searched, with a `common_term_idf`.
+    :param term_postings: The postings of each term of the query, for each field of the ranking function.
+    :param top_k: The number of results the query asks for, if limited.
+    """
+    common_terms = [
+        term for term, postings in term_postings.items() if postings and is_common_term(index, len(postings[0]))
+    ]
+    candidates = _candidates(index, term_postings, common_terms, top_k) if common_terms else None
+    if candidates is None:
+        return term_postings, common_terms
+
+    planned_postings = dict(term_postings)
+    for term in common_terms:
+        planned_postings[term] = [field_postings.restrict(candidates) for field_postings in term_postings[term]]
+    return planned_postings, common_terms
@@ -0,0 +1,219 @@
+"""
+Ranking functions for scoring indexed documents against query terms.
+
+Each ranking function reads the per-term IDFs and per-document length ratios that the index precomputes after it has
+been built or updated, so choosing one ranking function over another costs nothing extra at query time.
+"""
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Mapping, Optional
+
+from index.schema import Fields, RankingFunctionTypes
+
+if TYPE_CHECKING:
+    from index.indexer import Index
+
+# the term frequency of a term in each document containing it, by document ID
+Postings = Mapping[str, int]
+
+BM25_B = 0.8  # 0.5 <= b <= 0.8
+BM25_K_1 = 2.0  # 1.2 <= k <= 2.0
+BM25_PLUS_DELTA = 1.0
+BM25F_TITLE_BOOST = 2.0
+
+
+def rsj_idf(total_number_of_documents: int, number_of_documents_containing_term: int) -> float:
+    """ The Robertson/Spärck Jones inverse document frequency, as used by BM25. """
+    ratio_numerator = total_number_of_documents - number_of_documents_containing_term + 0.5
+    ratio_denominator = number_of_documents_containing_term + 0.5
+    return math.log(ratio_numerator / ratio_denominator)
+
+
+class RankingFunction:
+    """ Base class for ranking functions.
+
+    Subclasses provide the IDF of each term, computed once per index, and a term frequency weighting for a document
+    given its length relative to the average document length.
+    """
+    type: RankingFunctionTypes
+    fields: tuple[Fields, ...] = (Fields.BODY,)
+
+    def __init__(
+            self,
+            index: Index,
+            b: Optional[float] = None,
+            k_1: Optional[float] = None,
+            delta: Optional[float] = None,
+            title_boost: Optional[float] = None,
+    ):
+        self.index = index
+        self.idfs = index.get_idfs(self.type)
+
+    @classmethod
+    def compute_idfs(cls, index: Index) -> dict[str, float]:
+        """ Computes the IDF of every term in the index. Called by the index, which caches the result (as a dict, or a
+        mapping backed by an array once the index is compacted).
+        """
+        raise NotImplementedError
+
+    def weight_term_frequency(self, term_frequency: int, length_ratio: float) -> float:
+        """ Returns the weighted term frequency for a document, given its length relative to the average length. """
+        raise NotImplementedError
+
+    def get_postings(self, term: str) -> list[Postings]:
+        """ Returns the postings of the term for each field the ranking function scores, in order. """
+        if term not in self.idfs:
+            return []
+        return [self.index.get_postings(term, field=field) for field in self.fields]
+
+    def accumulate(
+            self,
+            term: str,
+            query_term_frequency: int,
+            postings: list[Postings],
+            scores: dict[str, float],
+    ) -> None:
+        """ Adds the score of every document in the term's postings to `scores`, keyed by document ID. """
+        if not postings:
+            return
+
+        # add this score for every occurrence of the term in the query
+        weight = self.idfs[term] * query_term_frequency
+        length_ratios = self.index.get_length_ratios()
+        for document_id, term_frequency in postings[0].items():
+            score = self.weight_term_frequency(term_frequency, length_ratios[document_id])
+            scores[document_id] = scores.get(document_id, 0.0) + score * weight
+
+
+class BM25(RankingFunction):
+    """ The Okapi BM25 model https://en.wikipedia.org/wiki/Okapi_BM25. """
+    type = RankingFunctionTypes.BM25
+
+    def __init__(self, index: Index, b: Optional[float] = None, k_1: Optional[float] = None, **kwargs):
+        super().__init__(index, **kwargs)
+        b = BM25_B if b is None else b
+        k_1 = BM25_K_1 if k_1 is None else k_1
+        # k_1 * ((1 - b) + b * length_ratio), split so only one multiplication is done per document
+        self._constant_norm = k_1 * (1 - b)
+        self._length_norm = k_1 * b
+
+    @classmethod
+    def compute_idfs(cls, index: Index) -> dict[str, float]:
+        return {
+            term: rsj_idf(index.number_of_documents, document_frequency)
+            for term, document_frequency in index.iter_document_frequencies()
+        }
+
+    def weight_term_frequency(self, term_frequency: int, length_ratio: float) -> float:
+        return term_frequency / (self._constant_norm + self._length_norm * length_ratio + term_frequency)
+
+
+class BM25Plus(BM25):
+    """ BM25+, which adds a lower bound to the weight of a matching term so long documents are not over-penalised.
+
+    See Lv & Zhai, "Lower-Bounding Term Frequency Normalization" (2011).
+    """
+    type = RankingFunctionTypes.BM25_PLUS
+
+    def __init__(self, index: Index, delta: Optional[float] = None, **kwargs):
+        super().__init__(index, **kwargs)
+        self._delta = BM25_PLUS_DELTA if delta is None else delta
+
+    @classmethod
+    def compute_idfs(cls, index: Index) -> dict[str, float]:
+        return {
+            term: math.log((index.number_of_documents + 1) / document_frequency)
+            for term, document_frequency in index.iter_document_frequencies()
+        }
+
+    def weight_term_frequency(self, term_frequency: int, length_ratio: float) -> float:
+        return super().weight_term_frequency(term_frequency, length_ratio) + self._delta
+
+
+class BM25F(RankingFunction):
+    """ BM25F, which combines the title and body fields of a document before saturating the term frequency.
+
+    Term frequencies are length normalised per field and the title frequency is boosted. See Zaragoza et al.,
+    "Microsoft Cambridge at TREC-13: Web and HARD tracks" (2004).
+    """
+    type = RankingFunctionTypes.BM25F
+    fields = (Fields.BODY, Fields.TITLE)
+
+    def __init__(
+            self,
+            index: Index,
+            b: Optional[float] = None,
+            k_1: Optional[float] = None,
+            title_boost: Optional[float] = None,
+            **kwargs
+    ):
+        super().__init__(index, **kwargs)
+        self._b = BM25_B if b is None else b
+        self._k_1 = BM25_K_1 if k_1 is None else k_1
+        self._boosts = {
+            Fields.BODY: 1.0,
+            Fields.TITLE: BM25F_TITLE_BOOST if title_boost is None else title_boost,
+        }
+
+    @classmethod
+    def compute_idfs(cls, index: Index) -> dict[str, float]:
+        idfs = BM25.compute_idfs(index)
+        for term, _ in index.iter_document_frequencies(field=Fields.TITLE):
+            documents = set(index.get_postings(term, field=Fields.TITLE))
+            documents.update(index.get_postings(term, field=Fields.BODY))
+            idfs[term] = rsj_idf(index.number_of_documents, len(documents))
+        return idfs
+
+    def accumulate(
+            self,
+            term: str,
+            query_term_frequency: int,
+            postings: list[Postings],
+            scores: dict[str, float],
+    ) -> None:
+        if not postings:
+            return
+
+        pseudo_term_frequencies: dict[str, float] = {}
+        for field, field_postings in zip(self.fields, postings):
+            length_ratios = self.index.get_length_ratios(field=field)
+            boost = self._boosts[field]
+            for document_id, term_frequency in field_postings.items():
+                norm = (1 - self._b) + self._b * length_ratios[document_id]
+                pseudo_term_frequencies[document_id] = (
+                    pseudo_term_frequencies.get(document_id, 0.0) + boost * term_frequency / norm
+                )
+
+        weight = self.idfs[term] * query_term_frequency
+        for document_id, term_frequency in pseudo_term_frequencies.items():
+            score = term_frequency / (self._k_1 + term_frequency)
+            scores[document_id] = scores.get(document_id, 0.0) + score * weight
+
+
+class TFIDF(RankingFunction):
+    """ Log-scaled term frequency weighted by the inverse document frequency. """
+    type = RankingFunctionTypes.TF_IDF
+
+    @classmethod
+    def compute_idfs(cls, index: Index) -> dict[str, float]:
+        return {
+            term: math.log(index.number_of_documents / document_frequency)
+            for term, document_frequency in index.iter_document_frequencies()
+        }
+
+    def weight_term_frequency(self, term_frequency: int, length_ratio: float) -> float:
+        return 1 + math.log(term_frequency)
+
+
+RANKING_FUNCTIONS: dict[RankingFunctionTypes, type[RankingFunction]] = {
+    RankingFunctionTypes.BM25: BM25,
+    RankingFunctionTypes.BM25_PLUS: BM25Plus,
+    RankingFunctionTypes.BM25F: BM25F,
+    RankingFunctionTypes.TF_IDF: TFIDF,
+}
+
+
+def get_ranking_function(ranking_function: RankingFunctionTypes, index: Index, **kwargs) -> RankingFunction:
+    """ Returns the ranking function of the given type for the index, with any parameters (b, k_1 etc.) applied. """
+    return RANKING_FUNCTIONS[ranking_function](index, **kwargs)
@@ -1,6 +1,64 @@
-from pydantic import BaseModel
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+MAX_BATCH_QUERIES = 1000
+
+
+class Fields(Enum):
+    """ Document fields that are indexed separately. """
+    BODY = "body"
+    TITLE = "title"
+
+
+class RankingFunctionTypes(Enum):
+    """ Possible ranking functions for scoring documents against a query. """
+    BM25 = "bm25"
+    BM25_PLUS = "bm25_plus"
+    BM25F = "bm25f"
+    TF_IDF = "tf_idf"
+
+    @classmethod
+    def values(cls):
+        """
+        Get a list of the values of the enum.
+        :return: A list of the values of the enum.
+        """
+        return [e.value for e in cls]
 
 
 class SearchResult(BaseModel):
     title: str
     ranking: float
+    # a snippet of the text of the article, and the start and end offsets of the query terms in it, if requested
+    snippet: Optional[str] = None
+    highlights: Optional[list[tuple[int, int]]] = None
+
+
+class QueryProfile(BaseModel):
+    """ A breakdown of the cost of a query, returned by `/search` when profiling is requested. """
+    tokens: list[str] = Field(default_factory=list)
+    posting_lengths: dict[str, int] = Field(default_factory=dict)
+    # terms whose postings were only scored for candidate documents, see `index.planner`
+    common_terms: list[str] = Field(default_factory=list)
+    candidate_documents: int = 0
+    ranking_evaluations: int = 0
+    phase_seconds: dict[str, float] = Field(default_factory=dict)
+
+
+class ProfiledSearchResults(BaseModel):
+    results: list[SearchResult]
+    profile: QueryProfile
+
+
+class BatchSearchRequest(BaseModel):
+    """ A batch of queries for `/search/batch`, all ranked with the same ranking function and parameters. """
+    queries: list[str] = Field(max_length=MAX_BATCH_QUERIES)
+    ranking_function: RankingFunctionTypes = RankingFunctionTypes.BM25
+    b: Optional[float] = Field(default=None, ge=0, le=1)
+    k_1: Optional[float] = Field(default=None, ge=0)
+    delta: Optional[float] = Field(default=None, ge=0)
+    title_boost: Optional[float] = Field(default=None, ge=0)
+    limit: Optional[int] = Field(default=None, gt=0)
+    analyzer: Optional[str] = None
@@ -1,28 +1,54 @@
 from __future__ import annotations
 
+import itertools
 import logging
+import threading
 import time
-from contextlib import asynccontextmanager
-from typing import Annotated, Optional, Union
+from contextlib import asynccontextmanager, nullcontext
+from functools import partial
+from typing import Annotated, Iterable, Iterator, Optional, Union
 
-from fastapi import Depends, FastAPI, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session as DBSession
 from sqlalchemy.orm import sessionmaker
 
 import wikipedia.service as article_service
-from index.indexer import create_or_update_inverted_index, rank_documents
-from index.schema import SearchResult
+from common.metrics import (INGEST_PHASE_SECONDS, SEARCH_PHASE_SECONDS, time_phase, update_index_memory_metrics,
+                            update_index_metrics)
+from index.forward import ForwardIndex, WordTokenizer
+from index.indexer import INDEX, Index, create_or_update_inverted_index, rank_document_ids, rank_documents_batch
+from index.nlp import Analyzer, analyze_query, analyze_word, get_analyzer, get_analyzer_id, warm_up
+from index.pagination import Cursor, RankedDocument, decode_cursor, encode_cursor
+from index.schema import BatchSearchRequest, ProfiledSearchResults, QueryProfile, RankingFunctionTypes, SearchResult
 from settings import Settings
+from wikipedia.cache import ResponseCache
+from wikipedia.retokenize import iter_retokenized_articles, retokenize_articles
 from wikipedia.schema import ArticleSchema, ArticleTitlesGet
 
 logger = logging.getLogger(__name__)
 
 settings = Settings()
 
-engine = create_engine(settings.postgres_dsn.unicode_string())
+engine = create_engine(settings.database_dsn)
 db_session_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+http_cache = (
+    ResponseCache(settings.http_cache_path, revalidate=settings.http_cache_revalidate)
+    if settings.http_cache_path else None
+)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON = "application/x-ndjson"
+# indexes by the ID of the analyzer they were built with: the configured text processor, and any extra analyzers.
+# Published indexes are never updated, new articles are added to their next generation, which then replaces them here.
+indexes: dict[str, Index] = {}
+# only one ingest builds the next generation of the indexes at a time
+ingest_lock = threading.Lock()
+# the plain text of the articles, shared by all indexes, for snippets of search results
+forward_index = ForwardIndex() if settings.forward_index else None
 
 
 async def get_db_session():
@@ -40,8 +66,31 @@ async def get_db_session():
 DbSessionDeps = Annotated[Optional[DBSession], Depends(get_db_session)]
 
 
+def _retokenize_articles(db_session: DBSession):
+    """ Tokenizes articles tokenized by another text processor again, if enabled, or otherwise only logs how many there
+    are, as the index skips them until they are tokenized again, e.g. with `python -m wikipedia.retokenize`.
+    """
+    if not settings.retokenize_on_startup:
+        analyzer_id = get_analyzer_id(settings.text_processor)
+        if stale := article_service.count_articles_tokenized_by_other_analyzers(db_session, analyzer_id):
+            logger.warning(
+                f"{stale} articles were tokenized by another text processor than '{analyzer_id}', or by an unknown "
+                "one, so are not indexed. Run `python -m wikipedia.retokenize` to tokenize them again."
+            )
+        return
+
+    with INGEST_PHASE_SECONDS.labels("retokenize").time():
+        retokenized = retokenize_articles(
+            db_session, text_processor=settings.text_processor, workers=settings.retokenize_workers
+        )
+    if retokenized:
+        logger.info(f"Tokenized {retokenized} articles again with the configured text processor")
+
+
 def _index_documents(db_session: DBSession):
     """ Helper function for indexing documents. """
+    _retokenize_articles(db_session)
+
     logger.info("Indexing documents...")
 
     articles = article_service.get_articles_as_schema(db_session=db_session)
@@ -51,15 +100,84 @@ def _index_documents(db_session: DBSession):
             db_session=db_session,
             params=ArticleTitlesGet(rnlimit=settings.default_number_of_articles),
             text_processor=settings.text_processor,
+            cache=http_cache,
+            url=settings.wikipedia_api_url,
         )
 
+    if forward_index is not None:
+        with INGEST_PHASE_SECONDS.labels("forward_index").time():
+            added = forward_index.add_articles(articles)
+        logger.info(f"Added the text of {added} of {len(articles)} articles to the forward index")
+
     index_start_time = time.time()
-    create_or_update_inverted_index(
-        articles=articles
-    )
+    with INGEST_PHASE_SECONDS.labels("index").time():
+        index = create_or_update_inverted_index(
+            articles=articles,
+            index=Index(),
+            text_processor=settings.text_processor,
+            impact_ordered=settings.impact_ordered_index,
+            compact_terms=settings.compact_index,
+            workers=settings.index_workers,
+            common_term_idf=settings.common_term_idf,
+        )
     index_stop_time = time.time()
 
     logger.info(f"Time taken to index articles: {index_stop_time - index_start_time}")
+    indexes[index.analyzer_id] = index
+    update_index_metrics(index)
+
+    for analyzer_id in settings.extra_analyzers:
+        _index_documents_with_analyzer(db_session, get_analyzer(analyzer_id))
+
+
+def _index_documents_with_analyzer(db_session: DBSession, analyzer: Analyzer):
+    """ Helper function for indexing documents with another analyzer than the configured text processor, e.g. to
+    compare rankings. The articles are tokenized from their plain text, but not written back to the DB.
+    """
+    logger.info(f"Indexing documents with analyzer '{analyzer.id}'...")
+    index = Index(
+        impact_ordered=settings.impact_ordered_index,
+        compact_terms=settings.compact_index,
+        analyzer_id=analyzer.id,
+        common_term_idf=settings.common_term_idf,
+    )
+    with INGEST_PHASE_SECONDS.labels("index").time():
+        batches = iter_retokenized_articles(db_session, analyzer, workers=settings.retokenize_workers, force=True)
+        create_or_update_inverted_index(
+            itertools.chain.from_iterable(batches),
+            index=index,
+            text_processor=analyzer,
+            precompute=False,
+            workers=settings.index_workers,
+        )
+        if index.number_of_documents:
+            index.precompute_statistics()
+    indexes[analyzer.id] = index
+
+
+def _get_index(analyzer: Optional[str]) -> Index:
+    """ Returns the index built with the given analyzer, or with the configured text processor by default. """
+    if analyzer is None:
+        return indexes.get(get_analyzer_id(settings.text_processor), INDEX)
+    if analyzer not in indexes:
+        raise HTTPException(
+            status_code=400, detail=f"No index for analyzer '{analyzer}', must be one of {list(indexes)}"
+        )
+    return indexes[analyzer]
+
+
+def _tokenize_query(index: Index, query: str) -> list[str]:
+    """ Tokenizes a query with the analyzer that the index was built with. """
+    if index.analyzer_id:
+        return list(analyze_query(index.analyzer_id, query))
+    return settings.text_processor(query)
+
+
+def _word_tokenizer(index: Index) -> WordTokenizer:
+    """ Returns a function that tokenizes a word of a document the same way as the index, to highlight query terms. """
+    if index.analyzer_id:
+        return partial(analyze_word, index.analyzer_id)
+    return settings.text_processor
 
 
 @asynccontextmanager
@@ -68,6 +186,8 @@ async def lifespan(app: FastAPI):
     Runs this function when the app starts up.
     :param app:
     """
+    if settings.warm_up_text_processor:
+        warm_up(settings.text_processor)
     db_session = db_session_maker()
     _index_documents(db_session)
     db_session.close()
@@ -86,6 +206,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
@@ -116,30 +237,198 @@ async def get_articles(
 async def fetch_new_articles(db_session: Annotated[DBSession, Depends(get_db_session)]):
     """ Get some random articles from Wikipedia, add to the DB, and reindex.
 
-    Returns the new articles.
+    Returns the new articles. Fetching, adding and indexing the articles run in worker threads, so that searches are
+    not blocked in the meantime.
 
     :param db_session: The database session dependency.
     """
-    new_articles = article_service.fetch_and_add_articles(
+    new_articles = await run_in_threadpool(
+        article_service.fetch_and_add_articles,
         db_session=db_session,
         params=ArticleTitlesGet(rnlimit=settings.default_number_of_articles),
         text_processor=settings.text_processor,
+        cache=http_cache,
+        url=settings.wikipedia_api_url,
     )
-    create_or_update_inverted_index(
-        articles=new_articles
-    )
+    await run_in_threadpool(_index_new_articles, new_articles)
     return new_articles
 
 
-@app.get("/search", response_model=list[SearchResult])
-async def get_results(query: Union[str, None] = Query(default=None)):
+def _index_new_articles(new_articles: list[ArticleSchema]):
+    """ Helper function for adding new articles to the next generation of each index, and swapping it in.
+
+    Searches that already started finish on the index generation they started on, and each index is only replaced by its
+    next generation once all of the new articles have been added to it, so searches never see a partial update.
+    """
+    with ingest_lock, INGEST_PHASE_SECONDS.labels("index").time():
+        default_analyzer_id = get_analyzer_id(settings.text_processor)
+        next_indexes = {
+            default_analyzer_id: create_or_update_inverted_index(
+                articles=new_articles,
+                index=_get_index(None).next_generation(),
+                text_processor=settings.text_processor,
+            )
+        }
+        for analyzer_id in settings.extra_analyzers:
+            analyzer = get_analyzer(analyzer_id)
+            next_indexes[analyzer_id] = create_or_update_inverted_index(
+                articles=[
+                    ArticleSchema(
+                        title=article.title, tokenized_content=analyzer(article.text), text_processor=analyzer_id
+                    )
+                    for article in new_articles
+                ],
+                index=indexes[analyzer_id].next_generation(),
+                text_processor=analyzer,
+            )
+        if forward_index is not None:
+            forward_index.add_articles(new_articles)
+        indexes.update(next_indexes)
+    update_index_metrics(next_indexes[default_analyzer_id])
+
+
+@app.get("/search", response_model=Union[list[SearchResult], ProfiledSearchResults], response_model_exclude_none=True)
+async def get_results(
+        response: Response,
+        query: Union[str, None] = Query(default=None),
+        ranking_function: RankingFunctionTypes = Query(default=RankingFunctionTypes.BM25),
+        b: Optional[float] = Query(default=None, ge=0, le=1),
+        k_1: Optional[float] = Query(default=None, ge=0),
+        delta: Optional[float] = Query(default=None, ge=0),
+        title_boost: Optional[float] = Query(default=None, ge=0),
+        limit: Optional[int] = Query(default=None, gt=0),
+        cursor: Optional[str] = Query(default=None),
+        stream: bool = Query(default=False),
+        profile: bool = Query(default=False),
+        analyzer: Optional[str] = Query(default=None),
+        snippets: bool = Query(default=False),
+):
     """ Search for articles that the app has already indexed from Wikipedia, based on a query string.
 
+    Ranking function parameters that are not provided fall back to the ranking function's defaults, and are ignored by
+    ranking functions that do not use them.
+
+    Results are ordered by ranking, then by title. If there may be more results than the `limit`, the cursor for the
+    next page is returned in the `X-Next-Cursor` header.
+
+    :param response: The response, to set headers on.
     :param query: The query string to search for.
+    :param ranking_function: The ranking function to score articles with.
+    :param b: The document length normalisation coefficient, used by the BM25 family.
+    :param k_1: The term frequency saturation coefficient, used by the BM25 family.
+    :param delta: The lower bound added to the weight of a matching term, used by BM25+.
+    :param title_boost: The weight of a title match relative to a body match, used by BM25F.
+    :param limit: The (optional) maximum number of results to return, i.e. the page size.
+    :param cursor: The (optional) cursor of the page to return, from the `X-Next-Cursor` header of the previous page.
+    :param stream: Whether to stream the results as newline-delimited JSON, one result per line, rather than as a list.
+    :param profile: Whether to return a breakdown of the cost of the query alongside the results.
+    :param analyzer: The ID of the analyzer whose index to search, e.g. `stemming:v1`, if not the configured text
+        processor. The query is always tokenized with the analyzer that the searched index was built with.
+    :param snippets: Whether to return a snippet of the text of each result, with the offsets of the query terms in it
+        to highlight. Snippets are only made for the results returned, and need `FORWARD_INDEX` to be enabled.
     """
-    results = []
+    if stream and profile:
+        raise HTTPException(status_code=400, detail="Profiling is not available when streaming results")
+    if snippets and forward_index is None:
+        raise HTTPException(status_code=400, detail="Snippets are not available without the forward index")
+    index = _get_index(analyzer)
+    after = _decode_cursor_or_none(cursor)
+    ranked_documents = []
+    query_profile = QueryProfile() if profile else None
+    timings = query_profile.phase_seconds if profile else None
     if query:
-        query = settings.text_processor(query)
-        results = rank_documents(query)
+        with time_phase(SEARCH_PHASE_SECONDS, "tokenize", timings):
+            query = _tokenize_query(index, query)
+        ranked_documents = rank_document_ids(
+            query,
+            inverted_index=index,
+            ranking_function=ranking_function,
+            top_k=limit,
+            profile=query_profile,
+            after=after,
+            b=b,
+            k_1=k_1,
+            delta=delta,
+            title_boost=title_boost,
+        )
 
+    headers = {}
+    if limit and len(ranked_documents) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(ranked_documents[-1])
+    results = _to_search_results(ranked_documents, _word_tokenizer(index) if snippets else None, query or [])
+    if stream:
+        return StreamingResponse(_stream_search_results(results), media_type=NDJSON, headers=headers)
+
+    response.headers.update(headers)
+    with time_phase(SEARCH_PHASE_SECONDS, "snippets", timings) if snippets else nullcontext():
+        results = list(results)
+    if profile:
+        query_profile.tokens = query or []
+        return ProfiledSearchResults(results=results, profile=query_profile)
     return results
+
+
+def _decode_cursor_or_none(cursor: Optional[str]) -> Optional[Cursor]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _to_search_results(
+        ranked_documents: list[RankedDocument],
+        tokenize_word: Optional[WordTokenizer] = None,
+        query_terms: Iterable[str] = (),
+) -> Iterator[SearchResult]:
+    """ Yields ranked documents as search results, with snippets of their text if a word tokenizer is given. """
+    for document_id, score in ranked_documents:
+        result = SearchResult(title=document_id, ranking=score)
+        if tokenize_word is not None:
+            snippet = forward_index.get_snippet(document_id, query_terms, tokenize_word)
+            if snippet is not None:
+                result.snippet, result.highlights = snippet
+        yield result
+
+
+def _stream_search_results(results: Iterable[SearchResult]) -> Iterator[str]:
+    """ Serializes search results as newline-delimited JSON, one at a time as they are sent. """
+    for result in results:
+        yield result.model_dump_json(exclude_none=True) + "\n"
+
+
+@app.post("/search/batch", response_model=list[list[SearchResult]], response_model_exclude_none=True)
+async def get_batch_results(request: BatchSearchRequest):
+    """ Search for the results of many queries at once, e.g. for offline evaluation or prefetching.
+
+    Returns the results of each query, in the same order as the queries. The queries are ranked together, so that
+    terms shared between queries are only looked up and scored once. Ranking runs in a worker thread so that other
+    requests are not blocked, but it holds the GIL, so batches are not ranked in parallel with each other.
+
+    :param request: The queries, and the ranking function and parameters to rank them with, as for `/search`.
+    """
+    index = _get_index(request.analyzer)
+
+    def rank_batch() -> list[list[SearchResult]]:
+        with time_phase(SEARCH_PHASE_SECONDS, "tokenize"):
+            queries = [_tokenize_query(index, query) for query in request.queries]
+        return rank_documents_batch(
+            queries,
+            inverted_index=index,
+            ranking_function=request.ranking_function,
+            top_k=request.limit,
+            b=request.b,
+            k_1=request.k_1,
+            delta=request.delta,
+            title_boost=request.title_boost,
+        )
+
+    return await run_in_threadpool(rank_batch)
+
+
+@app.get("/metrics")
+async def metrics():
+    """ Prometheus metrics for the app. """
+    await run_in_threadpool(update_index_memory_metrics, _get_index(None), forward_index)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -2,18 +2,17 @@
 This file contains all the settings for the application.
 """
 import logging
-from typing import Any, Tuple, Type
+from typing import Any, Optional, Tuple, Type
 
 from pydantic import PostgresDsn
 from pydantic.fields import FieldInfo
 from pydantic_settings import BaseSettings, EnvSettingsSource, PydanticBaseSettingsSource, SettingsConfigDict
 
-from index.nlp import TEXT_PROCESSORS, TextProcessor, TextProcessorTypes, lemmatize, set_up_nltk
+from common.schema import WIKIPEDIA_API_URL
+from index.nlp import TEXT_PROCESSORS, TextProcessor, TextProcessorTypes, get_analyzer, lemmatize
 
 logging.basicConfig()
 
-set_up_nltk()
-
 
 class TextProcessorSource(EnvSettingsSource):
     def prepare_field_value(
@@ -25,6 +24,9 @@ class TextProcessorSource(EnvSettingsSource):
                     f"Invalid text processor '{value}', must be one of {valid_entries}"
                 )
             return TEXT_PROCESSORS[TextProcessorTypes(value)]
+        if field_name == 'extra_analyzers' and value:
+            # a comma-separated list of analyzer IDs, e.g. "stemming:v1,basic:v1"
+            return [get_analyzer(analyzer_id.strip()).id for analyzer_id in value.split(",")]
         return value
 
 
@@ -36,8 +38,30 @@ class Settings(BaseSettings):
     postgres_db: str = "test"
     postgres_host: str = "test"
     postgres_port: int = 0000
+    # overrides the Postgres settings, e.g. "sqlite:///articles.db" for load tests
+    database_url: Optional[str] = None
+    wikipedia_api_url: str = WIKIPEDIA_API_URL
     default_number_of_articles: int = 10
     text_processor: TextProcessor = lemmatize
+    # BM25 searches with default parameters add up precomputed scores, leaving out terms with a negative IDF
+    impact_ordered_index: bool = False
+    compact_index: bool = False
+    # terms with a lower IDF are only scored for documents containing the query's other terms, see `index.planner`
+    common_term_idf: Optional[float] = None
+    forward_index: bool = False
+    index_workers: int = 1
+    warm_up_text_processor: bool = False
+    http_cache_path: Optional[str] = None
+    http_cache_revalidate: bool = True
+    # tokenizing every article again can take a long time, so by default stale articles are only counted at startup
+    retokenize_on_startup: bool = False
+    retokenize_workers: int = 1
+    extra_analyzers: list[str] = []
+
+    @property
+    def database_dsn(self) -> str:
+        """ The URL of the database to connect to: `database_url` if set, otherwise the Postgres settings. """
+        return self.database_url or self.postgres_dsn.unicode_string()
 
     @property
     def postgres_dsn(self) -> PostgresDsn:
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import pytest
+from index.nlp import basic_preprocess
+from wikipedia.cache import ResponseCache
+from wikipedia.client import get_and_parse_articles, get_and_parse_random_articles
+from wikipedia.schema import ArticleTitlesGet
+
+
+class FakeResponse:
+    def __init__(self, body: dict | None, status_code: int = 200, headers: dict | None = None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self) -> dict:
+        return self.body
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeSession:
+    """ Serves the Wikipedia API for a fixed set of articles, honouring `If-None-Match`, and records requests. """
+
+    def __init__(self, articles: dict[str, tuple[int, str]]):
+        self.articles = articles
+        self.requests = []
+        self.random_requests = 0
+
+    def get(self, url: str, params: dict, headers: dict) -> FakeResponse:
+        self.requests.append(params["action"])
+        if params.get("list") == "random":
+            # serves the articles in turn, so that every request gets different ones
+            titles = list(self.articles)
+            start = self.random_requests
+            self.random_requests += 1
+            random = [{"title": titles[(start + i) % len(titles)]} for i in range(params["rnlimit"])]
+            return FakeResponse({"query": {"random": random}}, headers={"ETag": f'"{start}"'})
+        if params["action"] == "query":
+            pages = {
+                str(i): {"title": title, "lastrevid": self.articles[title][0]}
+                for i, title in enumerate(params["titles"].split("|"))
+            }
+            return FakeResponse({"query": {"pages": pages}})
+
+        revision_id, text = self.articles[params["page"]]
+        etag = f'"{revision_id}"'
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(None, status_code=304)
+        body = {"parse": {"revid": revision_id, "text": {"*": f"<div><p>{text}</p></div>"}}}
+        return FakeResponse(body, headers={"ETag": etag})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_unchanged_articles_are_not_downloaded_again(cache):
+    """ Test that only articles whose latest revision is not cached are downloaded again. """
+    session = FakeSession({"Helsinki": (1, "Capital of Finland"), "Oslo": (2, "Capital of Norway")})
+    get_and_parse_articles(session, ["Helsinki", "Oslo"], basic_preprocess, cache=cache)
+    assert session.requests == ["query", "parse", "parse"]
+
+    session.requests.clear()
+    session.articles["Oslo"] = (3, "Capital city of Norway")
+    articles = get_and_parse_articles(session, ["Helsinki", "Oslo"], basic_preprocess, cache=cache)
+
+    assert session.requests == ["query", "parse"]
+    assert [article.tokenized_content for article in articles] == [
+        ["capital", "of", "finland"], ["capital", "city", "of", "norway"],
+    ]
+
+
+def test_cache_without_revalidation_does_not_touch_the_network(cache, tmp_path):
+    """ Test that cached articles are used as they are when the cache is not revalidated. """
+    session = FakeSession({"Helsinki": (1, "Capital of Finland")})
+    get_and_parse_articles(session, ["Helsinki"], basic_preprocess, cache=cache)
+
+    session.requests.clear()
+    offline_cache = ResponseCache(str(tmp_path / "cache.sqlite"), revalidate=False)
+    articles = get_and_parse_articles(session, ["Helsinki"], str.split, cache=offline_cache)
+    offline_cache.close()
+
+    assert session.requests == []
+    assert articles[0].tokenized_content == ["Capital", "of", "Finland"]
+
+
+@pytest.mark.parametrize("revalidate", [True, False])
+def test_random_article_lists_are_not_cached(tmp_path, revalidate):
+    """ Test that every request for random articles gets new ones, however the cache is configured. """
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), revalidate=revalidate)
+    session = FakeSession({"Helsinki": (1, "Capital of Finland"), "Oslo": (2, "Capital of Norway")})
+    params = ArticleTitlesGet(rnlimit=1)
+
+    first = get_and_parse_random_articles(session, params, basic_preprocess, cache=cache)
+    second = get_and_parse_random_articles(session, params, basic_preprocess, cache=cache)
+    cache.close()
+
+    assert [article.title for article in first + second] == ["Helsinki", "Oslo"]
@@ -0,0 +1,60 @@
+import math
+
+import pytest
+from evaluation.harness import diff_rankings, evaluate, load_judgments
+from evaluation.metrics import ndcg_at_k, recall_at_k, reciprocal_rank
+from index.indexer import Index, create_or_update_inverted_index, rank_document_ids
+from test_ranking import ARTICLES
+
+JUDGMENTS = {"Linus Torvalds": 3, "Linux kernel": 1, "Helsinki": 0}
+
+
+def test_relevance_measures():
+    """ Test NDCG, reciprocal rank and recall against values worked out by hand. """
+    ranking = ["Helsinki", "Linux kernel", "Oslo", "Linus Torvalds"]
+
+    dcg = 1 / math.log2(3) + 7 / math.log2(5)
+    ideal_dcg = 7 + 1 / math.log2(3)
+    assert ndcg_at_k(ranking, JUDGMENTS, 4) == pytest.approx(dcg / ideal_dcg)
+    assert ndcg_at_k(["Linus Torvalds", "Linux kernel"], JUDGMENTS, 2) == pytest.approx(1.0)
+    assert reciprocal_rank(ranking, JUDGMENTS) == 0.5
+    assert recall_at_k(ranking, JUDGMENTS, 2) == 0.5
+    assert recall_at_k(ranking, JUDGMENTS, 4) == 1.0
+    assert ndcg_at_k(ranking, {}, 10) == reciprocal_rank(ranking, {}) == recall_at_k(ranking, {}, 10) == 0.0
+
+
+def test_load_judgments_reports_invalid_lines():
+    """ Test that judgments are parsed from JSON lines, and that an invalid line is reported by its line number. """
+    lines = ['{"query": "linux", "judgments": {"Linux kernel": 2}}', "", '{"query": "oslo"}']
+    judgments = load_judgments(lines)
+    assert [(judged.query, judged.judgments) for judged in judgments] == [("linux", {"Linux kernel": 2}), ("oslo", {})]
+
+    with pytest.raises(ValueError, match="line 2"):
+        load_judgments(['{"query": "linux"}', '{"judgments": {}}'])
+
+
+def test_evaluate_and_diff_impact_ordered_ranking():
+    """ Test that evaluating an index measures each query, and that an impact-ordered index is diffed against it. """
+    query_judgments = load_judgments([
+        '{"query": "finnish creator", "judgments": {"Linus Torvalds": 2}}',
+        '{"query": "capital torvalds", "judgments": {"Helsinki": 2, "Linux kernel": 1}}',
+    ])
+    rankings = {}
+    for impact_ordered in (False, True):
+        index = create_or_update_inverted_index(articles=ARTICLES, index=Index(), impact_ordered=impact_ordered)
+        results, rankings[impact_ordered] = evaluate(
+            query_judgments,
+            lambda query: rank_document_ids(query.split(), inverted_index=index, top_k=3),
+            cutoffs=(1, 3),
+        )
+        assert [query["query"] for query in results["queries"]] == ["finnish creator", "capital torvalds"]
+        assert results["mean"]["mrr"] == results["mean"]["recall@3"] == 1.0
+        assert set(results["latency"]) == {"p50_ms", "p90_ms", "p99_ms", "max_ms", "mean_ms"}
+
+    # impact-ordered postings leave out negative scores, such as those of "capital", which most documents contain
+    diff = diff_rankings([judged.query for judged in query_judgments], rankings[False], rankings[True], k=3)
+    assert diff["identical_fraction"] == 0.5
+    assert diff["mean_overlap@3"] == pytest.approx((1 + 2 / 3) / 2)
+    assert [
+        (difference["query"], difference["missing"], difference["extra"]) for difference in diff["differences"]
+    ] == [("capital torvalds", ["Copenhagen"], [])]
@@ -0,0 +1,44 @@
+import zlib
+
+from index.forward import ForwardIndex, make_snippet
+from index.nlp import basic_preprocess
+from wikipedia.schema import ArticleSchema
+
+TEXT = (
+    "Helsinki is the capital of Finland. It lies on the coast of the Gulf of Finland.\n"
+    "Linus Torvalds, the creator of the Linux kernel, was born in Helsinki."
+)
+
+
+def _highlighted(snippet):
+    return [snippet.text[start:end] for start, end in snippet.highlights]
+
+
+def test_make_snippet_picks_window_with_most_query_terms():
+    """ Test that the snippet is the window matching the most distinct query terms, with those terms highlighted. """
+    snippet = make_snippet(TEXT, {"linux", "helsinki"}, basic_preprocess, length=8)
+    assert snippet.text == "of the Linux kernel, was born in Helsinki"
+    assert _highlighted(snippet) == ["Linux", "Helsinki"]
+
+    snippet = make_snippet(TEXT, {"gulf"}, basic_preprocess, length=5)
+    assert snippet.text == "of the Gulf of Finland"
+    assert _highlighted(snippet) == ["Gulf"]
+
+    snippet = make_snippet(TEXT, {"oslo"}, basic_preprocess, length=3)
+    assert snippet == ("Helsinki is the", [])
+
+
+def test_forward_index_stores_compressed_text_of_articles():
+    """ Test that articles' text is stored whether it was just fetched or read compressed from the database. """
+    forward_index = ForwardIndex()
+    added = forward_index.add_articles([
+        ArticleSchema(title="Helsinki", tokenized_content=["capital"], text=TEXT),
+        ArticleSchema(title="Oslo", tokenized_content=["capital"], raw_content=zlib.compress(b"Capital of\nNorway")),
+        ArticleSchema(title="Stockholm", tokenized_content=["capital"]),
+    ])
+
+    assert added == len(forward_index) == 2
+    assert "Stockholm" not in forward_index
+    assert forward_index.get_text("Helsinki") == TEXT
+    assert forward_index.get_snippet("Oslo", ["norway"], basic_preprocess) == ("Capital of Norway", [(11, 17)])
+    assert forward_index.get_snippet("Stockholm", ["capital"], basic_preprocess) is None
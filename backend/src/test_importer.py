@@ -0,0 +1,142 @@
+import bz2
+import json
+
+import pytest
+from common.models import Base
+from index.indexer import Index, create_or_update_inverted_index, rank_documents
+from index.nlp import basic_preprocess
+from sqlalchemy import StaticPool, create_engine
+from sqlalchemy.orm import sessionmaker
+from wikipedia.importer import _open, import_pages, iter_jsonl_dump, iter_xml_dump
+from wikipedia.retokenize import iter_retokenized_articles, retokenize_articles
+from wikipedia.service import count_articles_tokenized_by_other_analyzers, get_articles_as_schema
+
+XML_DUMP = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="en">
+  <siteinfo><sitename>Wikipedia</sitename></siteinfo>
+  <page>
+    <title>Linus Torvalds</title>
+    <ns>0</ns>
+    <id>1</id>
+    <revision><id>10</id><text xml:space="preserve">{{Infobox person|name=Linus}}
+'''Linus Torvalds''' is a [[Finland|Finnish]] software engineer.&lt;ref&gt;Citation&lt;/ref&gt;
+[[Category:Living people]]</text></revision>
+  </page>
+  <page>
+    <title>Torvalds</title>
+    <ns>0</ns>
+    <id>2</id>
+    <redirect title="Linus Torvalds" />
+    <revision><id>20</id><text xml:space="preserve">#REDIRECT [[Linus Torvalds]]</text></revision>
+  </page>
+  <page>
+    <title>Talk:Linus Torvalds</title>
+    <ns>1</ns>
+    <id>3</id>
+    <revision><id>30</id><text xml:space="preserve">Discussion</text></revision>
+  </page>
+  <page>
+    <title>Linux kernel</title>
+    <ns>0</ns>
+    <id>4</id>
+    <revision><id>40</id><text xml:space="preserve">The [[Linux]] kernel is a free kernel.</text></revision>
+  </page>
+</mediawiki>
+"""
+
+
+@pytest.fixture
+def db_session():
+    """ Returns a session for a new, empty in-memory database. """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+@pytest.fixture
+def xml_dump_path(tmp_path):
+    """ Writes a small, compressed XML dump and returns its path. """
+    path = tmp_path / "dump.xml.bz2"
+    path.write_bytes(bz2.compress(XML_DUMP.encode()))
+    return str(path)
+
+
+def test_iter_xml_dump_yields_articles_only(xml_dump_path):
+    """ Test that redirects and pages outside the article namespace are skipped. """
+    with _open(xml_dump_path) as file:
+        titles = [title for title, _, _ in iter_xml_dump(file)]
+    assert titles == ["Linus Torvalds", "Linux kernel"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_import_pages_adds_articles_to_db_and_index(db_session, xml_dump_path, workers):
+    """ Test that imported articles are tokenized from plain text and added to the database and index. """
+    index = Index()
+    with _open(xml_dump_path) as file:
+        number_of_articles = import_pages(
+            iter_xml_dump(file), db_session, text_processor=basic_preprocess, index=index, batch_size=1, workers=workers
+        )
+
+    assert number_of_articles == 2
+    articles = {article.title: article for article in get_articles_as_schema(db_session)}
+    assert articles["Linus Torvalds"].tokenized_content == [
+        "linus", "torvalds", "is", "a", "finnish", "software", "engineer",
+    ]
+    assert [result.title for result in rank_documents(["kernel"], inverted_index=index)] == ["Linux kernel"]
+
+
+def test_import_pages_keeps_pages_without_tokens(db_session):
+    """ Test that pages whose text has no tokens, e.g. only templates, are imported, tokenized again and indexed without
+    any content rather than failing the import.
+    """
+    pages = [("Infobox only", "{{Infobox person|name=Linus}}", True), ("Helsinki", "Helsinki is a city", False)]
+    index = Index()
+    assert import_pages(pages, db_session, text_processor=basic_preprocess, index=index) == 2
+    assert index.number_of_documents == 2
+
+    articles = {article.title: article for article in get_articles_as_schema(db_session)}
+    assert articles["Infobox only"].tokenized_content is None
+    assert retokenize_articles(db_session, text_processor=basic_preprocess, force=True) == 2
+
+    batches = iter_retokenized_articles(db_session, basic_preprocess, force=True)
+    retokenized_index = create_or_update_inverted_index(
+        [article for batch in batches for article in batch], index=Index(), text_processor=basic_preprocess
+    )
+    assert retokenized_index.number_of_documents == 2
+    assert [result.title for result in rank_documents(["city"], inverted_index=retokenized_index)] == ["Helsinki"]
+
+
+def test_import_pages_skips_existing_articles(db_session, tmp_path):
+    """ Test that importing a JSONL export twice does not add its articles again. """
+    path = tmp_path / "dump.jsonl"
+    path.write_text("\n".join(json.dumps({"title": title, "text": title}) for title in ("Helsinki", "Oslo")))
+
+    for expected_number_of_articles in (2, 0):
+        with _open(str(path)) as file:
+            number_of_articles = import_pages(iter_jsonl_dump(file), db_session, text_processor=basic_preprocess)
+        assert number_of_articles == expected_number_of_articles
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_retokenize_articles_uses_kept_text(db_session, xml_dump_path, workers):
+    """ Test that articles are tokenized again from their kept text, and only if another text processor was used. """
+    with _open(xml_dump_path) as file:
+        import_pages(iter_xml_dump(file), db_session, text_processor=str.split)
+
+    assert retokenize_articles(db_session, text_processor=basic_preprocess, batch_size=1, workers=workers) == 2
+    assert retokenize_articles(db_session, text_processor=basic_preprocess) == 0
+
+    articles = {article.title: article for article in get_articles_as_schema(db_session)}
+    assert articles["Linux kernel"].tokenized_content == ["the", "linux", "kernel", "is", "a", "free", "kernel"]
+    assert articles["Linux kernel"].text_processor == "basic:v1"
+
+
+def test_count_articles_tokenized_by_other_analyzers(db_session, xml_dump_path):
+    """ Test that articles are counted if tokenized by another analyzer, or by an unknown one. """
+    with _open(xml_dump_path) as file:
+        import_pages(iter_xml_dump(file), db_session, text_processor=str.split)
+    assert count_articles_tokenized_by_other_analyzers(db_session, "basic:v1") == 2
+
+    retokenize_articles(db_session, text_processor=basic_preprocess)
+    assert count_articles_tokenized_by_other_analyzers(db_session, "basic:v1") == 0
+    assert count_articles_tokenized_by_other_analyzers(db_session, "stemming:v1") == 2
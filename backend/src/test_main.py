@@ -1,11 +1,17 @@
+import asyncio
+import json
 import logging
 
+import main
 import pytest
 from common.models import Base
 from fastapi.testclient import TestClient
-from main import _index_documents, app, get_db_session
-from sqlalchemy import StaticPool, create_engine
+from index.forward import ForwardIndex
+from index.nlp import basic_preprocess, get_analyzer, get_analyzer_id
+from main import _index_documents, _index_documents_with_analyzer, app, get_db_session, settings
+from sqlalchemy import StaticPool, create_engine, delete
 from sqlalchemy.orm import sessionmaker
+from wikipedia.models import Article
 from wikipedia.schema import ArticleSchema
 
 logging.basicConfig()
@@ -48,10 +54,21 @@ TEST_ARTICLE = ArticleSchema(
     tokenized_content=[
         "Linus", "Benedict", "Torvalds", "is", "a", "Finnish", "American", "software", "engineer", "who", "is",
         "the", "creator", "and", "historically", "the", "principal", "developer", "of", "the", "Linux", "kernel",
-    ]
+    ],
+    text_processor=get_analyzer_id(settings.text_processor),
 )
 
 
+BASIC_ARTICLES = [
+    ArticleSchema(title=title, tokenized_content=basic_preprocess(text), text=text, text_processor="basic:v1")
+    for title, text in (
+        ("Helsinki", "Helsinki is the capital of Finland."),
+        ("Oslo", "Oslo is the capital of Norway."),
+        ("Stockholm", "Stockholm is the capital and largest city of Sweden."),
+    )
+]
+
+
 @pytest.fixture
 def article():
     """ Returns a test article DB model. """
@@ -85,6 +102,24 @@ def index_documents():
     db_session.close()
 
 
+@pytest.fixture
+def basic_index(monkeypatch):
+    """
+    Adds articles tokenized by the basic text processor, which needs no NLTK data, to the database, and indexes them
+    with it into a new set of indexes.
+    """
+    monkeypatch.setattr(settings, "text_processor", basic_preprocess)
+    monkeypatch.setattr("main.indexes", {})
+    db_session = TestingSessionLocal()
+    db_session.add_all(article.to_db_model() for article in BASIC_ARTICLES)
+    db_session.commit()
+    _index_documents(db_session)
+    yield
+    db_session.execute(delete(Article))
+    db_session.commit()
+    db_session.close()
+
+
 def test_get_articles_returns_empty_array_if_no_records():
     """ Test that the get_articles endpoint returns an empty array if there are no records in the database. """
     response = client.get("/articles")
@@ -141,3 +176,153 @@ def test_get_search_results_empty_response(add_article, index_documents):
     response = client.get("/search?query=football")
     assert response.status_code == 200
     assert len(response.json()) == 0
+
+
+def test_get_metrics():
+    """ Test that the metrics endpoint serves the Prometheus metrics. """
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "search_phase_seconds" in response.text
+    assert "index_documents" in response.text
+    assert "index_memory_bytes{" in response.text
+
+
+def test_get_metrics_reports_forward_index_memory(basic_index, monkeypatch):
+    """ Test that the memory used by the forward index, if kept, is reported alongside the inverted index. """
+    monkeypatch.setattr("main.forward_index", ForwardIndex())
+    db_session = TestingSessionLocal()
+    _index_documents(db_session)
+    db_session.close()
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'index_memory_bytes{structure="forward_index"}' in response.text
+
+
+def test_get_batch_search_results(basic_index):
+    """ Test that the batch search endpoint returns the results of each query in order, without empty fields. """
+    response = client.post(
+        "/search/batch", json={"queries": ["finland", "largest city", "", "finland"], "limit": 1}
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [[result["title"] for result in query_results] for query_results in results] == [
+        ["Helsinki"], ["Stockholm"], [], ["Helsinki"],
+    ]
+    assert set(results[0][0]) == {"title", "ranking"}
+
+
+def test_get_profiled_search_results(basic_index):
+    """ Test that the search endpoint returns a breakdown of the cost of the query alongside results if profiled. """
+    response = client.get("/search?query=capital finland&profile=true")
+    assert response.status_code == 200
+    body = response.json()
+    assert {result["title"] for result in body["results"]} == {"Helsinki", "Oslo", "Stockholm"}
+    assert body["profile"]["tokens"] == ["capital", "finland"]
+    assert body["profile"]["posting_lengths"] == {"capital": 3, "finland": 1}
+    assert body["profile"]["candidate_documents"] == 3
+    assert {"tokenize", "candidates", "scoring", "sort"} <= set(body["profile"]["phase_seconds"])
+
+    assert client.get("/search?query=capital&profile=true&stream=true").status_code == 400
+
+
+def test_get_search_results_with_analyzer(basic_index):
+    """ Test that the search endpoint searches the index of the requested analyzer, tokenizing the query with it. """
+    db_session = TestingSessionLocal()
+    _index_documents_with_analyzer(db_session, get_analyzer("stemming:v1"))
+    db_session.close()
+
+    response = client.get("/search?query=cities&analyzer=stemming:v1")
+    assert response.status_code == 200
+    assert [result["title"] for result in response.json()] == ["Stockholm"]
+
+    response = client.get("/search?query=cities&analyzer=basic:v1")
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_get_search_results_with_unknown_analyzer(basic_index):
+    """ Test that the search endpoint rejects an analyzer that it has no index for. """
+    response = client.get("/search?query=city&analyzer=missing:v1")
+    assert response.status_code == 400
+    assert "missing:v1" in response.json()["detail"]
+
+
+def test_get_search_results_pages_with_cursor(basic_index):
+    """ Test that the search endpoint returns the cursor of the next page in a header, until the last page. """
+    expected = [result["title"] for result in client.get("/search?query=capital").json()]
+    assert len(expected) == 3
+
+    titles = []
+    response = client.get("/search?query=capital&limit=2")
+    while True:
+        assert response.status_code == 200
+        titles.extend(result["title"] for result in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        response = client.get(f"/search?query=capital&limit=2&cursor={response.headers['X-Next-Cursor']}")
+    assert titles == expected
+
+    assert client.get("/search?query=capital&cursor=invalid").status_code == 400
+
+
+def test_get_search_results_streamed(basic_index):
+    """ Test that the search endpoint streams results as newline-delimited JSON if requested. """
+    expected = client.get("/search?query=capital").json()
+
+    response = client.get("/search?query=capital&stream=true")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+
+def test_get_search_results_with_snippets(basic_index, monkeypatch):
+    """ Test that the search endpoint returns snippets of the results, with the offsets of the query terms in them. """
+    assert client.get("/search?query=finland&snippets=true").status_code == 400
+
+    monkeypatch.setattr("main.forward_index", ForwardIndex())
+    db_session = TestingSessionLocal()
+    _index_documents(db_session)
+    db_session.close()
+
+    response = client.get("/search?query=capital finland&snippets=true&limit=1")
+    assert response.status_code == 200
+    [result] = response.json()
+    assert result["title"] == "Helsinki"
+    assert result["snippet"] == "Helsinki is the capital of Finland"
+    assert [result["snippet"][start:end] for start, end in result["highlights"]] == ["capital", "Finland"]
+
+
+def test_fetch_new_articles_swaps_in_next_index_generation(basic_index, monkeypatch):
+    """ Test that adding articles builds the next generation of the index and swaps it in, leaving the generation that
+    earlier searches started on unchanged.
+    """
+    text = "Copenhagen is the capital of Denmark."
+    new_article = ArticleSchema(
+        title="Copenhagen", tokenized_content=basic_preprocess(text), text=text, text_processor="basic:v1"
+    )
+    monkeypatch.setattr("wikipedia.service.fetch_and_add_articles", lambda **kwargs: [new_article])
+    index = main.indexes["basic:v1"]
+
+    response = client.post("/articles")
+    assert response.status_code == 200
+    assert [article["title"] for article in response.json()] == ["Copenhagen"]
+
+    next_index = main.indexes["basic:v1"]
+    assert next_index is not index
+    assert next_index.generation == index.generation + 1
+    assert (index.number_of_documents, next_index.number_of_documents) == (3, 4)
+    assert [result["title"] for result in client.get("/search?query=denmark").json()] == ["Copenhagen"]
+
+
+def test_fetch_new_articles_off_the_event_loop(basic_index, monkeypatch):
+    """ Test that articles are fetched and added to the database in a worker thread, so searches are not blocked. """
+    def fetch_and_add_articles(**kwargs):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        return []
+
+    monkeypatch.setattr("wikipedia.service.fetch_and_add_articles", fetch_and_add_articles)
+    response = client.post("/articles")
+    assert response.status_code == 200
+    assert response.json() == []
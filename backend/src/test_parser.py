@@ -0,0 +1,28 @@
+from wikipedia.parser import parse_text_from_html
+
+ARTICLE_HTML = """
+<div class="mw-parser-output">
+<table class="infobox vcard"><tr><th>Born</th><td>28 December 1969<br>Helsinki</td></tr></table>
+<p><b>Linus Torvalds</b> is a Finnish software engineer<sup class="reference"><a href="#cite_note-1">[1]</a></sup>
+who is the creator of the <a href="/wiki/Linux_kernel">Linux kernel</a>.</p>
+<h2>Career<span class="mw-editsection">[edit]</span></h2>
+<p>Torvalds &amp; others</p>
+<div class="navbox"><div><a href="/wiki/Linux">Linux</a> navigation</div></div>
+<div class="mw-references-wrap"><ol class="references"><li>Citation</li></ol></div>
+</div>
+<div>Footer</div>
+"""
+
+
+def test_parse_text_from_html_returns_prose_of_first_div():
+    """ Test that the text of the first div is returned, without references, infoboxes, navboxes or edit links. """
+    text = parse_text_from_html(ARTICLE_HTML)
+    assert text.split() == [
+        "Linus", "Torvalds", "is", "a", "Finnish", "software", "engineer", "who", "is", "the", "creator", "of", "the",
+        "Linux", "kernel.", "Career", "Torvalds", "&", "others",
+    ]
+
+
+def test_parse_text_from_html_handles_missing_html():
+    """ Test that an article without HTML has no text. """
+    assert parse_text_from_html(None) == ""
@@ -0,0 +1,327 @@
+import pytest
+from index.indexer import Index, bm25_rank, create_or_update_inverted_index, rank_documents, rank_documents_batch
+from index.nlp import analyze_query, basic_preprocess, get_analyzer_id
+from index.pagination import decode_cursor, encode_cursor
+from index.planner import build_common_term_top_documents
+from index.schema import QueryProfile, RankingFunctionTypes
+from wikipedia.schema import ArticleSchema
+
+ARTICLES = [
+    ArticleSchema(
+        title="Linux kernel",
+        tokenized_content=["free", "open", "source", "kernel", "created", "by", "torvalds"],
+        text_processor="basic:v1",
+    ),
+    ArticleSchema(
+        title="Linus Torvalds",
+        tokenized_content=["finnish", "software", "engineer", "creator", "of", "the", "linux", "kernel"],
+        text_processor="basic:v1",
+    ),
+    ArticleSchema(
+        title="Helsinki",
+        tokenized_content=["capital", "of", "finland", "birthplace", "of", "torvalds"],
+        text_processor="basic:v1",
+    ),
+    ArticleSchema(title="Oslo", tokenized_content=["capital", "of", "norway"], text_processor="basic:v1"),
+    ArticleSchema(title="Stockholm", tokenized_content=["capital", "of", "sweden"], text_processor="basic:v1"),
+    ArticleSchema(title="Copenhagen", tokenized_content=["capital", "of", "denmark"], text_processor="basic:v1"),
+]
+
+
+@pytest.fixture
+def index() -> Index:
+    """ Returns a new index of the test articles, with titles indexed. """
+    return create_or_update_inverted_index(articles=ARTICLES, index=Index(), text_processor=basic_preprocess)
+
+
+@pytest.mark.parametrize("ranking_function", list(RankingFunctionTypes))
+def test_ranking_functions_return_matching_documents(index, ranking_function):
+    """ Test that every ranking function returns the documents that contain the query terms. """
+    results = rank_documents(["finnish", "creator"], inverted_index=index, ranking_function=ranking_function)
+    assert [result.title for result in results] == ["Linus Torvalds"]
+
+
+def test_bm25_matches_bm25_rank(index):
+    """ Test that the BM25 ranking function, using precomputed statistics, matches `bm25_rank`. """
+    results = rank_documents(["kernel"], inverted_index=index, b=0.6, k_1=1.5)
+    expected = {
+        article.title: bm25_rank(
+            total_number_of_documents=index.number_of_documents,
+            number_of_documents_containing_term=2,
+            term_frequency_in_document=1,
+            document_length=len(article.tokenized_content),
+            average_document_length=index.average_document_length,
+            b=0.6,
+            k_1=1.5,
+        )
+        for article in ARTICLES[:2]
+    }
+    assert {result.title: result.ranking for result in results} == pytest.approx(expected)
+
+
+def test_bm25f_ranks_title_matches_higher(index):
+    """ Test that BM25F ranks a document matching the query in its title above one matching only in its body. """
+    results = rank_documents(["linux"], inverted_index=index, ranking_function=RankingFunctionTypes.BM25F)
+    assert [result.title for result in results] == ["Linux kernel", "Linus Torvalds"]
+
+    body_only = rank_documents(["linux"], inverted_index=index, ranking_function=RankingFunctionTypes.BM25)
+    assert [result.title for result in body_only] == ["Linus Torvalds"]
+
+
+def test_impact_ordered_ranking_matches_exhaustive_ranking(index):
+    """ Test that ranking from quantized impact-ordered postings matches exhaustive BM25 ranking. """
+    query = ["kernel", "finnish", "torvalds", "finland"]
+    exhaustive = rank_documents(query, inverted_index=index)
+
+    impact_index = create_or_update_inverted_index(articles=ARTICLES, index=Index(), impact_ordered=True)
+    results = rank_documents(query, inverted_index=impact_index)
+    assert [result.title for result in results] == [result.title for result in exhaustive]
+    for result, expected in zip(results, exhaustive):
+        assert result.ranking == pytest.approx(expected.ranking, abs=impact_index.impact_scale * len(query))
+
+    top = rank_documents(query, inverted_index=impact_index, top_k=2)
+    assert {result.title for result in top} == {result.title for result in exhaustive[:2]}
+
+
+def test_impact_ordered_ranking_leaves_out_negative_idf_terms(index):
+    """ Test that terms with a negative BM25 IDF, i.e. in more than half of the documents, have no impact-ordered
+    postings, so that impact-ordered ranking leaves out the documents only they match, unlike exhaustive ranking.
+    """
+    index.precompute_statistics()
+    impact_index = create_or_update_inverted_index(
+        articles=ARTICLES, index=Index(), text_processor=basic_preprocess, impact_ordered=True
+    )
+    assert index.get_idfs(RankingFunctionTypes.BM25)["of"] < 0
+    assert "of" not in impact_index.impact_postings
+
+    assert rank_documents(["of"], inverted_index=impact_index) == []
+    assert len(rank_documents(["of"], inverted_index=index)) == 5
+    results = rank_documents(["of", "finland"], inverted_index=impact_index)
+    assert [result.title for result in results] == ["Helsinki"]
+    assert len(rank_documents(["of", "finland"], inverted_index=index)) == 5
+
+
+@pytest.mark.parametrize("impact_ordered", [False, True])
+def test_rank_documents_records_profile(impact_ordered):
+    """ Test that ranking documents records the postings, candidates and phase timings of the query in a profile. """
+    index = create_or_update_inverted_index(articles=ARTICLES, index=Index(), impact_ordered=impact_ordered)
+    profile = QueryProfile()
+    results = rank_documents(["kernel", "torvalds", "missing"], inverted_index=index, profile=profile)
+
+    assert profile.posting_lengths == {"kernel": 2, "torvalds": 2, "missing": 0}
+    assert profile.ranking_evaluations == 4
+    assert profile.candidate_documents == len(results) == 3
+    assert set(profile.phase_seconds) == {"candidates", "scoring", "sort"}
+
+
+@pytest.mark.parametrize("ranking_function", list(RankingFunctionTypes))
+@pytest.mark.parametrize("impact_ordered", [False, True])
+def test_rank_documents_batch_matches_rank_documents(index, ranking_function, impact_ordered):
+    """ Test that ranking queries in a batch, with shared and repeated terms, matches ranking them one at a time. """
+    index.impact_ordered = impact_ordered
+    index.precompute_statistics()
+    queries = [["capital", "of", "finland"], ["capital", "capital", "torvalds"], ["capital", "of", "finland"], []]
+
+    batch_results = rank_documents_batch(queries, inverted_index=index, ranking_function=ranking_function, top_k=3)
+    assert batch_results == [
+        rank_documents(query, inverted_index=index, ranking_function=ranking_function, top_k=3) for query in queries
+    ]
+
+
+@pytest.mark.parametrize("impact_ordered", [False, True])
+def test_pages_after_cursors_match_full_ranking(index, impact_ordered):
+    """ Test that paging through results with cursors returns every result once, in a stable order. """
+    index.impact_ordered = impact_ordered
+    index.precompute_statistics()
+    query = ["capital", "of", "torvalds"]
+
+    pages, cursor = [], None
+    while page := rank_documents(query, inverted_index=index, top_k=2, after=cursor):
+        pages.extend(page)
+        cursor = decode_cursor(encode_cursor((page[-1].title, page[-1].ranking)))
+
+    full_ranking = rank_documents(query, inverted_index=index)
+    assert [result.title for result in pages] == [result.title for result in full_ranking]
+    assert full_ranking == sorted(full_ranking, key=lambda result: (-result.ranking, result.title))
+
+
+@pytest.mark.parametrize("impact_ordered", [False, True])
+def test_compact_index_ranks_like_dynamic_index(index, impact_ordered):
+    """ Test that compacting the index keeps every ranking the same, including after adding more articles. """
+    compact_index = create_or_update_inverted_index(
+        articles=ARTICLES, index=Index(), text_processor=basic_preprocess, compact_terms=True
+    )
+    index.impact_ordered = compact_index.impact_ordered = impact_ordered
+    index.precompute_statistics()
+    compact_index.precompute_statistics()
+    assert not compact_index.terms and compact_index.get_vocabulary_size() == index.get_vocabulary_size()
+
+    new_article = ArticleSchema(
+        title="Linux", tokenized_content=["kernel", "by", "linus", "torvalds"], text_processor="basic:v1"
+    )
+    for _ in range(2):
+        for ranking_function in RankingFunctionTypes:
+            for query in (["linux", "kernel"], ["capital", "of", "finland"], ["missing"]):
+                assert rank_documents(query, inverted_index=compact_index, ranking_function=ranking_function) == (
+                    rank_documents(query, inverted_index=index, ranking_function=ranking_function)
+                )
+        for updated_index in (index, compact_index):
+            create_or_update_inverted_index([new_article], index=updated_index, text_processor=basic_preprocess)
+
+
+def test_compact_postings_look_up_documents_like_dynamic_postings(index):
+    """ Test that the postings of a compact index look up and restrict to documents like those of a dynamic index. """
+    compact_index = create_or_update_inverted_index(
+        articles=ARTICLES, index=Index(), text_processor=basic_preprocess, compact_terms=True
+    )
+    candidate_sets = [{"Oslo"}, {"Copenhagen", "Linux kernel", "Missing"}, {article.title for article in ARTICLES}]
+    for term in ("capital", "of", "kernel", "missing"):
+        postings, compact_postings = index.get_postings(term), compact_index.get_postings(term)
+        assert {document_id: compact_postings[document_id] for document_id in compact_postings} == dict(postings)
+        assert "Missing" not in compact_postings
+        for candidates in candidate_sets:
+            assert compact_postings.restrict(candidates) == postings.restrict(candidates)
+
+
+@pytest.mark.parametrize("compact_terms", [False, True])
+def test_parallel_build_ranks_like_serial_build(index, compact_terms):
+    """ Test that merging partial indexes built in parallel gives the same index as adding articles one by one. """
+    parallel_index = create_or_update_inverted_index(
+        articles=ARTICLES,
+        index=Index(),
+        text_processor=basic_preprocess,
+        compact_terms=compact_terms,
+        workers=2,
+        batch_size=4,
+    )
+    assert parallel_index.number_of_documents == index.number_of_documents
+    assert parallel_index.document_lengths == index.document_lengths
+    assert parallel_index.title_lengths == index.title_lengths
+    assert parallel_index.get_number_of_postings() == index.get_number_of_postings()
+    for ranking_function in RankingFunctionTypes:
+        for query in (["linux", "kernel"], ["capital", "of", "finland"], ["missing"]):
+            assert rank_documents(query, inverted_index=parallel_index, ranking_function=ranking_function) == (
+                rank_documents(query, inverted_index=index, ranking_function=ranking_function)
+            )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_next_generation_leaves_previous_generation_unchanged(workers):
+    """ Test that adding articles to the next generation of an index leaves the rankings of the previous one as is. """
+    queries = (["linux", "kernel"], ["capital", "of", "finland"], ["torvalds"])
+    previous = create_or_update_inverted_index(articles=ARTICLES[:4], index=Index(), text_processor=basic_preprocess)
+    previous_rankings = [rank_documents(query, inverted_index=previous) for query in queries]
+    previous_postings = previous.get_number_of_postings()
+
+    new_articles = ARTICLES[4:] + [
+        ArticleSchema(
+            title="Linux Foundation",
+            tokenized_content=["torvalds", "linux", "kernel", "sponsor"],
+            text_processor="basic:v1",
+        ),
+    ]
+    next_generation = create_or_update_inverted_index(
+        articles=new_articles,
+        index=previous.next_generation(),
+        text_processor=basic_preprocess,
+        workers=workers,
+        batch_size=2,
+    )
+    assert (previous.generation, next_generation.generation) == (0, 1)
+    assert previous.number_of_documents == 4
+    assert previous.get_number_of_postings() == previous_postings
+    assert [rank_documents(query, inverted_index=previous) for query in queries] == previous_rankings
+
+    fresh = create_or_update_inverted_index(
+        articles=ARTICLES[:4] + new_articles, index=Index(), text_processor=basic_preprocess
+    )
+    assert next_generation.document_lengths == fresh.document_lengths
+    for query in queries:
+        assert rank_documents(query, inverted_index=next_generation) == rank_documents(query, inverted_index=fresh)
+
+
+@pytest.mark.parametrize("ranking_function", list(RankingFunctionTypes))
+def test_common_terms_are_only_scored_for_documents_with_selective_terms(index, ranking_function):
+    """ Test that the common terms of a query are only scored for the documents containing its other terms. """
+    planned_index = create_or_update_inverted_index(
+        articles=ARTICLES, index=Index(), text_processor=basic_preprocess, common_term_idf=0.5
+    )
+    profile = QueryProfile()
+    results = rank_documents(
+        ["capital", "of", "finland"], inverted_index=planned_index, ranking_function=ranking_function, profile=profile
+    )
+    expected = rank_documents(["capital", "of", "finland"], inverted_index=index, ranking_function=ranking_function)
+    assert results == [result for result in expected if result.title == "Helsinki"]
+    assert profile.common_terms == ["capital", "of"]
+    assert profile.posting_lengths == {"capital": 1, "of": 1, "finland": 1}
+
+
+@pytest.mark.parametrize("ranking_function", list(RankingFunctionTypes))
+@pytest.mark.parametrize("compact_terms", [False, True])
+def test_rank_documents_batch_plans_common_terms_like_rank_documents(ranking_function, compact_terms):
+    """ Test that ranking queries with common terms in a batch plans each query like ranking it on its own, although
+    the queries share the common terms but not the candidates to score them for.
+    """
+    planned_index = create_or_update_inverted_index(
+        articles=ARTICLES,
+        index=Index(),
+        text_processor=basic_preprocess,
+        common_term_idf=0.5,
+        compact_terms=compact_terms,
+    )
+    queries = [["capital", "of", "finland"], ["capital", "of", "torvalds"], ["capital", "of"], ["capital", "of"]]
+
+    batch_results = rank_documents_batch(
+        queries, inverted_index=planned_index, ranking_function=ranking_function, top_k=3
+    )
+    assert batch_results == [
+        rank_documents(query, inverted_index=planned_index, ranking_function=ranking_function, top_k=3)
+        for query in queries
+    ]
+    assert [result.title for result in batch_results[0]] == ["Helsinki"]
+
+
+def test_queries_of_only_common_terms_score_their_top_documents(index):
+    """ Test that a query of only common terms scores the precomputed top documents of each term, and only if it asks
+    for no more results than are kept for each term.
+    """
+    planned_index = create_or_update_inverted_index(
+        articles=ARTICLES, index=Index(), text_processor=basic_preprocess, common_term_idf=0.5
+    )
+    assert set(planned_index.common_term_top_documents) == {"capital", "of"}
+    planned_index.common_term_top_documents = build_common_term_top_documents(planned_index, top_n=2)
+    assert planned_index.common_term_top_documents == {"capital": ["Oslo", "Stockholm"], "of": ["Helsinki", "Oslo"]}
+
+    profile = QueryProfile()
+    results = rank_documents(["capital", "of"], inverted_index=planned_index, top_k=3, profile=profile)
+    expected = {result.title: result for result in rank_documents(["capital", "of"], inverted_index=index)}
+    assert results == [expected[title] for title in ("Helsinki", "Oslo", "Stockholm")]
+    assert profile.candidate_documents == 3
+
+    results = rank_documents(["capital", "of"], inverted_index=planned_index)
+    assert results == list(expected.values())
+
+
+def test_index_records_analyzer_and_skips_articles_from_other_analyzers():
+    """ Test that the index records its analyzer, and does not mix in articles tokenized by another analyzer, or that do
+    not record one.
+    """
+    articles = [
+        ArticleSchema(title="Oslo", tokenized_content=["capital", "of", "norway"], text_processor="basic:v1"),
+        ArticleSchema(title="Bergen", tokenized_content=["citi", "norway"], text_processor="stemming:v1"),
+        ArticleSchema(title="Trondheim", tokenized_content=["city", "of", "norway"]),
+    ]
+    index = create_or_update_inverted_index(articles=articles, index=Index(), text_processor=basic_preprocess)
+
+    assert get_analyzer_id(basic_preprocess) == index.analyzer_id == "basic:v1"
+    query = list(analyze_query(index.analyzer_id, "Norway"))
+    assert [result.title for result in rank_documents(query, inverted_index=index)] == ["Oslo"]
+
+
+def test_index_of_only_articles_from_other_analyzers_is_empty():
+    """ Test that an index is created, empty, when every article was tokenized by another analyzer. """
+    articles = [ArticleSchema(title="Bergen", tokenized_content=["citi", "norway"], text_processor="stemming:v1")]
+    index = create_or_update_inverted_index(articles=articles, index=Index(), text_processor=basic_preprocess)
+
+    assert index.number_of_documents == 0
+    assert rank_documents(["norway"], inverted_index=index) == []
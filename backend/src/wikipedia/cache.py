@@ -0,0 +1,86 @@
+"""
+Persistent cache of Wikipedia API responses, stored in a local SQLite database.
+
+Responses are stored along with the revision ID of the article they are for (if any) and the `ETag` and
+`Last-Modified` headers they were served with, so that they can be revalidated rather than downloaded again.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class CachedResponse:
+    """ A cached API response body, with what is needed to check whether it is still current. """
+    body: dict
+    revision_id: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def conditional_headers(self) -> dict[str, str]:
+        """ Returns the headers for a conditional request, which the server answers with 304 if nothing changed. """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """ A cache of API responses keyed by request, e.g. by article title for parsed article content.
+
+    If `revalidate` is False, cached responses are always treated as current, so that runs which only need articles
+    that have been fetched before (e.g. to tokenize them again) do not touch the network at all.
+    """
+
+    def __init__(self, path: str, revalidate: bool = True):
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS response (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    revision_id INTEGER,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, revision_id, etag, last_modified FROM response WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        body, revision_id, etag, last_modified = row
+        return CachedResponse(
+            body=json.loads(zlib.decompress(body)),
+            revision_id=revision_id,
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        body = zlib.compress(json.dumps(response.body).encode())
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?)",
+                (key, body, response.revision_id, response.etag, response.last_modified, time.time()),
+            )
+
+    def close(self) -> None:
+        self._connection.close()
@@ -8,54 +8,143 @@
 """
 from __future__ import annotations
 
+import json
+from typing import Optional
+
 from requests.sessions import Session
 
-from index.nlp import TextProcessor
-from wikipedia.parser import parse_article_html_or_none, parse_article_titles, parse_text_from_html
-from wikipedia.schema import ArticleSchema, ArticleTitlesGet, ContentGet
+from common.metrics import HTTP_CACHE_REQUESTS, INGEST_PHASE_SECONDS
+from common.schema import WIKIPEDIA_API_URL
+from index.nlp import TextProcessor, get_analyzer_id
+from wikipedia.cache import CachedResponse, ResponseCache
+from wikipedia.parser import (parse_article_html_or_none, parse_article_revision_id_or_none,
+                              parse_article_titles, parse_latest_revision_ids, parse_text_from_html)
+from wikipedia.schema import ArticleSchema, ArticleTitlesGet, ContentGet, PageInfoGet
+
+# the maximum number of titles the API accepts in a single query
+TITLES_PER_REQUEST = 50
+
+
+def _cache_key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True)
+
+
+def _get(session: Session, params: dict, cache: Optional[ResponseCache] = None, url: str = WIKIPEDIA_API_URL) -> dict:
+    """ Gets a response from the API at the URL, revalidating the cached response for the same request if there is one.
 
-URL = "https://en.wikipedia.org/w/api.php"
+    If the server answers the conditional request with 304 Not Modified, the cached body is returned.
+    """
+    key = _cache_key(params)
+    cached = cache.get(key) if cache else None
+    headers = cached.conditional_headers if cached else {}
+    with INGEST_PHASE_SECONDS.labels("fetch").time():
+        r = session.get(url=url, params=params, headers=headers)
+    if cached and r.status_code == 304:
+        HTTP_CACHE_REQUESTS.labels("revalidated").inc()
+        return cached.body
+    r.raise_for_status()
+
+    body = r.json()
+    if cache:
+        HTTP_CACHE_REQUESTS.labels("miss").inc()
+        cache.set(key, CachedResponse(
+            body=body,
+            revision_id=parse_article_revision_id_or_none(body),
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+        ))
+    return body
 
 
-def fetch_article_list(session: Session, params: ArticleTitlesGet) -> dict:
+def fetch_article_list(session: Session, params: ArticleTitlesGet, url: str = WIKIPEDIA_API_URL) -> dict:
     """ Get a list of articles from Wikipedia.
 
+    The list is never cached: random articles are different on every request, and a cached list would return the same
+    articles again, which are then already in the database.
+
     Check the API docs for more info. https://www.mediawiki.org/wiki/API:Lists/All
     """
-    r = session.get(url=URL, params=params.model_dump(by_alias=True, mode="json"))
-    r.raise_for_status()
+    return _get(session, params.model_dump(by_alias=True, mode="json"), url=url)
 
-    return r.json()
 
+def fetch_revision_ids(session: Session, titles: list[str], url: str = WIKIPEDIA_API_URL) -> dict[str, int]:
+    """ Get the ID of the latest revision of each article, by title, in as few requests as possible. """
+    revision_ids = {}
+    for start in range(0, len(titles), TITLES_PER_REQUEST):
+        params = PageInfoGet(titles="|".join(titles[start:start + TITLES_PER_REQUEST]))
+        params = params.model_dump(by_alias=True, mode="json")
+        revision_ids.update(parse_latest_revision_ids(_get(session, params, url=url)))
+    return revision_ids
 
-def fetch_article_content(session: Session, params: ContentGet) -> dict:
-    """ Get the content of an article from Wikipedia. """
-    r = session.get(url=URL, params=params.model_dump(by_alias=True, mode="json"))
-    r.raise_for_status()
 
-    return {"data": r.json()}
+def fetch_article_content(
+        session: Session,
+        params: ContentGet,
+        cache: Optional[ResponseCache] = None,
+        revision_id: Optional[int] = None,
+        url: str = WIKIPEDIA_API_URL,
+) -> dict:
+    """ Get the content of an article from Wikipedia.
+
+    A cached response is used without a request if it is for the given revision of the article, or if the cache is
+    not revalidated. Otherwise, it is revalidated with a conditional request.
+    """
+    params = params.model_dump(by_alias=True, mode="json")
+    cached = cache.get(_cache_key(params)) if cache else None
+    if cached and (not cache.revalidate or (revision_id is not None and revision_id == cached.revision_id)):
+        HTTP_CACHE_REQUESTS.labels("hit").inc()
+        return {"data": cached.body}
+    return {"data": _get(session, params, cache, url)}
 
 
-def fetch_parsed_text(session: Session, page_name: str):
+def fetch_parsed_text(
+        session: Session,
+        page_name: str,
+        cache: Optional[ResponseCache] = None,
+        revision_id: Optional[int] = None,
+        url: str = WIKIPEDIA_API_URL,
+):
     """ Helper function for fetching an article's content and then parsing the main text. """
-    content = fetch_article_content(session, ContentGet(page=page_name))
+    content = fetch_article_content(session, ContentGet(page=page_name), cache=cache, revision_id=revision_id, url=url)
     html = parse_article_html_or_none(content["data"])
-    return parse_text_from_html(html)
+    with INGEST_PHASE_SECONDS.labels("html_parse").time():
+        return parse_text_from_html(html)
+
+
+def get_and_parse_articles(
+        session: Session,
+        titles: list[str],
+        text_processor: TextProcessor,
+        cache: Optional[ResponseCache] = None,
+        url: str = WIKIPEDIA_API_URL,
+) -> list[ArticleSchema]:
+    """ Helper function for fetching and processing a list of articles by title.
+
+    With a cache that is revalidated, the latest revision IDs of all the articles are looked up first, so that
+    articles which are cached at their latest revision are not downloaded again.
+    """
+    revision_ids = fetch_revision_ids(session, titles, url) if cache and cache.revalidate else {}
+    analyzer_id = get_analyzer_id(text_processor)
+    articles = []
+    for title in titles:
+        text = fetch_parsed_text(session, page_name=title, cache=cache, revision_id=revision_ids.get(title), url=url)
+        articles.append(ArticleSchema(
+            title=title,
+            tokenized_content=text_processor(text),
+            text=text,
+            text_processor=analyzer_id,
+        ))
+    return articles
 
 
 def get_and_parse_random_articles(
         session: Session,
         params: ArticleTitlesGet,
         text_processor: TextProcessor,
+        cache: Optional[ResponseCache] = None,
+        url: str = WIKIPEDIA_API_URL,
 ) -> list[ArticleSchema]:
     """ Helper function for fetching and processing a list of random articles. """
-    articles = fetch_article_list(session, params)
-    return [
-        ArticleSchema(
-            title=entry["title"],
-            tokenized_content=text_processor(
-                fetch_parsed_text(session, page_name=entry["title"])
-            ),
-        )
-        for entry in parse_article_titles(articles)
-    ]
+    articles = fetch_article_list(session, params, url=url)
+    titles = [entry["title"] for entry in parse_article_titles(articles)]
+    return get_and_parse_articles(session, titles, text_processor, cache=cache, url=url)
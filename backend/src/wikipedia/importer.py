@@ -0,0 +1,213 @@
+"""
+Bulk importer for Wikipedia database dumps, as an alternative to fetching random articles through the API.
+
+Supports MediaWiki XML dumps (e.g. `enwiki-latest-pages-articles.xml.bz2` from https://dumps.wikimedia.org/) and JSONL
+exports with one `{"title": ..., "text": ...}` object of plain text per line, either of which may be compressed with
+bzip2, gzip or xz. Dumps are streamed, so memory use depends on the batch size rather than the size of the dump.
+
+Run from the `src` folder with e.g.:
+
+    python -m wikipedia.importer enwiki-latest-pages-articles.xml.bz2 --workers 8
+"""
+from __future__ import annotations
+
+import argparse
+import bz2
+import gzip
+import json
+import logging
+import lzma
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+from itertools import islice
+from multiprocessing import Pool
+from typing import IO, Iterable, Iterator, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from index.indexer import Index, create_or_update_inverted_index
+from index.nlp import TEXT_PROCESSORS, TextProcessor, TextProcessorTypes, get_analyzer_id
+from settings import Settings
+from wikipedia.parser import parse_text_from_wikitext
+from wikipedia.schema import ArticleSchema
+from wikipedia.service import add_articles_bulk, filter_existing_titles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+ARTICLE_NAMESPACE = "0"
+
+# (title, text, whether the text is wikitext)
+Page = tuple[str, str, bool]
+
+_text_processor: Optional[TextProcessor] = None
+
+
+def _open(path: str) -> IO[bytes]:
+    """ Opens a file for reading, decompressing it on the fly if its extension says it is compressed. """
+    if path.endswith(".bz2"):
+        return bz2.open(path)
+    if path.endswith(".gz"):
+        return gzip.open(path)
+    if path.endswith(".xz"):
+        return lzma.open(path)
+    return open(path, "rb")
+
+
+def _local_name(tag: str) -> str:
+    """ Strips the XML namespace from a tag, since it changes with the version of the dump format. """
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_xml_dump(file: IO[bytes]) -> Iterator[Page]:
+    """ Yields the articles in a MediaWiki XML dump, skipping redirects and pages outside the article namespace.
+
+    Each page is cleared from the tree once read, so memory use does not grow with the size of the dump.
+    """
+    events = ElementTree.iterparse(file, events=("start", "end"))
+    _, root = next(events)
+    for event, element in events:
+        if event != "end" or _local_name(element.tag) != "page":
+            continue
+
+        fields = {_local_name(child.tag): child for child in element.iter()}
+        namespace = fields.get("ns")
+        text = fields.get("text")
+        is_article = namespace is not None and namespace.text == ARTICLE_NAMESPACE
+        if is_article and "redirect" not in fields and text is not None and text.text:
+            yield fields["title"].text, text.text, True
+        root.clear()
+
+
+def iter_jsonl_dump(file: IO[bytes]) -> Iterator[Page]:
+    """ Yields the articles in a JSONL export, one JSON object with a title and plain text per line. """
+    for line in file:
+        if not line.strip():
+            continue
+        page = json.loads(line)
+        yield page["title"], page["text"], False
+
+
+def iter_dump(file: IO[bytes], dump_format: str) -> Iterator[Page]:
+    if dump_format == "jsonl":
+        return iter_jsonl_dump(file)
+    return iter_xml_dump(file)
+
+
+def _set_text_processor(text_processor: TextProcessor) -> None:
+    """ Sets the text processor for the current process, as text processors are not passed along with each page. """
+    global _text_processor
+    _text_processor = text_processor
+
+
+def _process_page(page: Page) -> ArticleSchema:
+    title, text, is_wikitext = page
+    if is_wikitext:
+        text = parse_text_from_wikitext(text)
+    return ArticleSchema(
+        title=title,
+        tokenized_content=_text_processor(text),
+        text=text,
+        text_processor=get_analyzer_id(_text_processor),
+    )
+
+
+def _batches(pages: Iterable[Page], batch_size: int) -> Iterator[list[Page]]:
+    pages = iter(pages)
+    while batch := list(islice(pages, batch_size)):
+        yield batch
+
+
+def import_pages(
+        pages: Iterable[Page],
+        db_session: Session,
+        text_processor: TextProcessor,
+        index: Optional[Index] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+) -> int:
+    """ Tokenizes pages and adds them to the database, and optionally the index, in batches.
+
+    Pages whose titles are already in the database are skipped. With more than one worker, pages are tokenized in
+    parallel processes.
+
+    :param pages: The pages to import.
+    :param db_session: The database session.
+    :param text_processor: The text processor to tokenize the pages with.
+    :param index: An (optional) index to add the articles to.
+    :param batch_size: The number of pages to tokenize and write at a time.
+    :param workers: The number of processes to tokenize pages with.
+    :return: The number of articles added.
+    """
+    pool = Pool(workers, initializer=_set_text_processor, initargs=(text_processor,)) if workers > 1 else None
+    _set_text_processor(text_processor)
+    number_of_articles = 0
+    try:
+        for batch in _batches(pages, batch_size):
+            unique_pages = {page[0]: page for page in batch}
+            existing_titles = filter_existing_titles(db_session, unique_pages)
+            batch = [page for title, page in unique_pages.items() if title not in existing_titles]
+            start = time.perf_counter()
+            articles = pool.map(_process_page, batch, chunksize=64) if pool else list(map(_process_page, batch))
+            tokenize_time = time.perf_counter() - start
+
+            add_articles_bulk(db_session, [article.to_db_model() for article in articles])
+            if index is not None:
+                create_or_update_inverted_index(articles, index=index, text_processor=text_processor, precompute=False)
+
+            number_of_articles += len(articles)
+            logger.info(f"Imported {number_of_articles} articles, tokenized batch in {tokenize_time:.2f}s")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    if index is not None and index.number_of_documents:
+        index.precompute_statistics()
+    return number_of_articles
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="wikipedia.importer", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="The dump to import, optionally compressed (.bz2, .gz or .xz).")
+    parser.add_argument("--format", choices=("xml", "jsonl"), help="The dump format. Defaults to the file extension.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="The number of processes to tokenize with.")
+    parser.add_argument("--limit", type=int, help="The (optional) maximum number of pages to import.")
+    parser.add_argument(
+        "--text-processor",
+        choices=TextProcessorTypes.values(),
+        help="Defaults to the text processor configured for the app.",
+    )
+    parser.add_argument("--database-url", help="Defaults to the database configured for the app.")
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> None:
+    parsed_args = _parse_args(args)
+    settings = Settings()
+    text_processor = (
+        TEXT_PROCESSORS[TextProcessorTypes(parsed_args.text_processor)]
+        if parsed_args.text_processor else settings.text_processor
+    )
+    dump_format = parsed_args.format or ("jsonl" if ".jsonl" in parsed_args.path else "xml")
+    engine = create_engine(parsed_args.database_url or settings.database_dsn)
+
+    start = time.perf_counter()
+    with _open(parsed_args.path) as file, sessionmaker(bind=engine)() as db_session:
+        pages = islice(iter_dump(file, dump_format), parsed_args.limit)
+        number_of_articles = import_pages(
+            pages,
+            db_session=db_session,
+            text_processor=text_processor,
+            batch_size=parsed_args.batch_size,
+            workers=parsed_args.workers,
+        )
+    logger.info(f"Imported {number_of_articles} articles in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv[1:])
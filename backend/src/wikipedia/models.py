@@ -3,16 +3,36 @@ DB models for Wikipedia articles
 """
 from __future__ import annotations
 
+import zlib
+
 from common.models import Base
-from sqlalchemy import Column, String
+from sqlalchemy import Column, LargeBinary, String
+
+
+def compress_text(text: str | None) -> bytes | None:
+    return zlib.compress(text.encode()) if text is not None else None
+
+
+def decompress_text(data: bytes | None) -> str | None:
+    return zlib.decompress(data).decode() if data is not None else None
 
 
 class Article(Base):
-    """ A Wikipedia article's tokenized content by title. """
+    """ A Wikipedia article's tokenized content by title.
+
+    The plain text the content was tokenized from is kept (compressed) along with the type and version of the text
+    processor used, so that articles can be tokenized again without fetching them again.
+    """
     __tablename__ = "article"
 
     title = Column(String, primary_key=True)
     tokenized_content = Column(String, nullable=True, default=None)  # can be None if content has not been tokenized yet
+    raw_content = Column(LargeBinary, nullable=True, default=None)  # can be None for articles added before it was kept
+    text_processor = Column(String, nullable=True, default=None)
+
+    def get_text(self) -> str | None:
+        """ Returns the plain text of the article, if it has been kept. """
+        return decompress_text(self.raw_content)
 
     @classmethod
     def from_dict(cls, article_dict: dict[str, str]) -> Article:
@@ -20,4 +40,6 @@ class Article(Base):
         return cls(
             title=article_dict["title"],
             tokenized_content=article_dict["tokenized_content"],
+            raw_content=compress_text(article_dict.get("text")),
+            text_processor=article_dict.get("text_processor"),
         )
@@ -1,6 +1,43 @@
 from __future__ import annotations
 
-from bs4 import BeautifulSoup
+import html as html_entities
+import re
+from html.parser import HTMLParser
+
+# elements that only hold references, infoboxes, navigation boxes and other non-prose content, by class
+SKIPPED_CLASSES = frozenset({
+    "reference",
+    "references",
+    "reflist",
+    "mw-references-wrap",
+    "infobox",
+    "navbox",
+    "navbox-styles",
+    "vertical-navbox",
+    "sidebar",
+    "mw-editsection",
+    "hatnote",
+    "metadata",
+    "noprint",
+    "mw-empty-elt",
+})
+SKIPPED_TAGS = frozenset({"script", "style"})
+# elements that have no closing tag, so must not be counted when tracking nesting
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+})
+FEED_CHUNK_SIZE = 64 * 1024
+
+_WIKITEXT_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_WIKITEXT_REFERENCE = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_WIKITEXT_TEMPLATE = re.compile(r"\{\{")
+_WIKITEXT_TABLE = re.compile(r"\{\|")
+_WIKITEXT_MEDIA_LINK = re.compile(r"\[\[(?:File|Image|Category):", re.IGNORECASE)
+_WIKITEXT_INTERNAL_LINK = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]")
+_WIKITEXT_EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]*\s?([^\]]*)\]")
+_WIKITEXT_HEADING = re.compile(r"^=+\s*(.*?)\s*=+\s*$", re.MULTILINE)
+_WIKITEXT_EMPHASIS = re.compile(r"'{2,}")
+_HTML_TAG = re.compile(r"<[^>]+>")
 
 
 def parse_article_titles(data: dict):
@@ -16,9 +53,131 @@ def parse_article_html_or_none(content: dict) -> str | None:
     return text.get("*")
 
 
-def parse_text_from_html(html: str) -> str:
-    """ Parse the main text from the HTML of a Wikipedia article. """
-    soup = BeautifulSoup(html, 'html.parser')
-    divs = soup.find_all('div')
-    main_text = divs[0].getText()
-    return main_text
+def _is_skipped(tag: str, attrs: list[tuple[str, str | None]]) -> bool:
+    if tag in SKIPPED_TAGS:
+        return True
+    for name, value in attrs:
+        if name == "class" and value and not SKIPPED_CLASSES.isdisjoint(value.split()):
+            return True
+    return False
+
+
+class _MainTextParser(HTMLParser):
+    """ Collects the text of the first div of an HTML document as it is parsed, without building a document tree.
+
+    Elements that are not part of the prose (see `SKIPPED_CLASSES`) are skipped along with everything inside them.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: list[str] = []
+        self.finished = False
+        self._div_depth = 0
+        self._skipped_tag: str | None = None
+        self._skipped_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if self.finished:
+            return
+        if self._skipped_tag:
+            # only elements of the same type as the skipped element affect when it ends
+            if tag == self._skipped_tag:
+                self._skipped_depth += 1
+            return
+        if self._div_depth and tag not in VOID_ELEMENTS and _is_skipped(tag, attrs):
+            self._skipped_tag, self._skipped_depth = tag, 1
+            return
+        if tag == "div":
+            self._div_depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.finished:
+            return
+        if self._skipped_tag:
+            if tag == self._skipped_tag:
+                self._skipped_depth -= 1
+                if not self._skipped_depth:
+                    self._skipped_tag = None
+            return
+        if tag == "div" and self._div_depth:
+            self._div_depth -= 1
+            self.finished = not self._div_depth
+
+    def handle_data(self, data: str) -> None:
+        if self._div_depth and not self._skipped_tag and not self.finished:
+            self.chunks.append(data)
+
+
+def parse_article_revision_id_or_none(content: dict) -> int | None:
+    """ Helper function for parsing the revision ID of an article from a parse response. """
+    return content.get("parse", {}).get("revid")
+
+
+def parse_latest_revision_ids(data: dict) -> dict[str, int]:
+    """ Helper function for parsing the latest revision ID of each page, by title, from a page info response. """
+    pages = data.get("query", {}).get("pages", {})
+    return {
+        page["title"]: page["lastrevid"]
+        for page in pages.values()
+        if "lastrevid" in page
+    }
+
+
+def parse_text_from_html(html: str | None) -> str:
+    """ Parse the main text from the HTML of a Wikipedia article.
+
+    The main text is the text of the first div, which wraps the article. The HTML is parsed incrementally and parsing
+    stops as soon as that div is closed. References, infoboxes, navboxes and the like are left out.
+    """
+    if not html:
+        return ""
+
+    parser = _MainTextParser()
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        if parser.finished:
+            break
+    parser.close()
+    return "".join(parser.chunks)
+
+
+def _remove_balanced(text: str, start: re.Pattern, opening: str, closing: str) -> str:
+    """ Removes every span of text that starts with the pattern, up to where its opening and closing marks balance. """
+    chunks = []
+    position = 0
+    while match := start.search(text, position):
+        chunks.append(text[position:match.start()])
+        depth, position = 1, match.end()
+        while depth:
+            next_opening, next_closing = text.find(opening, position), text.find(closing, position)
+            if next_closing == -1:
+                position = len(text)
+                break
+            if next_opening != -1 and next_opening < next_closing:
+                depth, position = depth + 1, next_opening + len(opening)
+            else:
+                depth, position = depth - 1, next_closing + len(closing)
+    chunks.append(text[position:])
+    return "".join(chunks)
+
+
+def parse_text_from_wikitext(wikitext: str | None) -> str:
+    """ Parse the main text from the wikitext of a Wikipedia article, as found in database dumps.
+
+    Like `parse_text_from_html`, references, templates (which include infoboxes and navboxes), tables, files and
+    categories are left out. Links are replaced by their labels and formatting is removed.
+    """
+    if not wikitext:
+        return ""
+
+    text = _WIKITEXT_COMMENT.sub("", wikitext)
+    text = _WIKITEXT_REFERENCE.sub("", text)
+    text = _remove_balanced(text, _WIKITEXT_TEMPLATE, "{{", "}}")
+    text = _remove_balanced(text, _WIKITEXT_TABLE, "{|", "|}")
+    text = _remove_balanced(text, _WIKITEXT_MEDIA_LINK, "[[", "]]")
+    text = _WIKITEXT_INTERNAL_LINK.sub(r"\1", text)
+    text = _WIKITEXT_EXTERNAL_LINK.sub(r"\1", text)
+    text = _WIKITEXT_HEADING.sub(r"\1", text)
+    text = _WIKITEXT_EMPHASIS.sub("", text)
+    text = _HTML_TAG.sub("", text)
+    return html_entities.unescape(text)
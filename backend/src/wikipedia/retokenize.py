@@ -0,0 +1,154 @@
+"""
+Job for tokenizing the articles in the database again from the plain text kept with them, e.g. after changing
+`TEXT_PROCESSOR`, without fetching anything from Wikipedia.
+
+Only articles tokenized by another text processor (or another version of it) are tokenized again, so the job can be
+stopped and resumed. Run it from the `src` folder after changing the text processor, before starting the app, e.g.:
+
+    python -m wikipedia.retokenize --text-processor stemming --workers 8
+
+The app only counts the articles tokenized by another text processor when it starts, which it skips when indexing,
+unless `RETOKENIZE_ON_STARTUP` is true, in which case it runs the job before indexing.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+from multiprocessing import Pool
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from index.nlp import TEXT_PROCESSORS, TextProcessor, TextProcessorTypes, get_analyzer_id
+from settings import Settings
+from wikipedia.models import decompress_text
+from wikipedia.schema import ArticleSchema
+from wikipedia.service import count_articles_without_text, filter_articles_to_retokenize, update_tokenized_content_bulk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+_text_processor: Optional[TextProcessor] = None
+
+
+def _set_text_processor(text_processor: TextProcessor) -> None:
+    """ Sets the text processor for the current process, as text processors are not passed along with each article. """
+    global _text_processor
+    _text_processor = text_processor
+
+
+def _retokenize(row: tuple[str, bytes]) -> ArticleSchema:
+    title, raw_content = row
+    return ArticleSchema(
+        title=title,
+        tokenized_content=_text_processor(decompress_text(raw_content)),
+        text_processor=get_analyzer_id(_text_processor),
+    )
+
+
+def iter_retokenized_articles(
+        db_session: Session,
+        text_processor: TextProcessor,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+        force: bool = False,
+) -> Iterator[list[ArticleSchema]]:
+    """ Yields batches of the articles in the database tokenized again with the text processor, in title order.
+
+    The articles are not written back, so this can also be used to index articles with other text processors than the
+    one they are stored with.
+
+    :param db_session: The database session.
+    :param text_processor: The text processor to tokenize the articles with.
+    :param batch_size: The number of articles to tokenize at a time.
+    :param workers: The number of processes to tokenize articles with.
+    :param force: Whether to tokenize articles that were already tokenized by the text processor too.
+    """
+    analyzer_id = get_analyzer_id(text_processor)
+    pool = Pool(workers, initializer=_set_text_processor, initargs=(text_processor,)) if workers > 1 else None
+    _set_text_processor(text_processor)
+    last_title = None
+    try:
+        while batch := filter_articles_to_retokenize(
+                db_session, analyzer_id, after_title=last_title, limit=batch_size, force=force
+        ):
+            articles = pool.map(_retokenize, batch, chunksize=64) if pool else list(map(_retokenize, batch))
+            last_title = articles[-1].title
+            yield articles
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+
+def retokenize_articles(
+        db_session: Session,
+        text_processor: TextProcessor,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+        force: bool = False,
+) -> int:
+    """ Tokenizes the articles in the database again with the text processor, in batches, and writes them back.
+
+    :param db_session: The database session.
+    :param text_processor: The text processor to tokenize the articles with.
+    :param batch_size: The number of articles to tokenize and write at a time.
+    :param workers: The number of processes to tokenize articles with.
+    :param force: Whether to tokenize articles that were already tokenized by the text processor too.
+    :return: The number of articles tokenized again.
+    """
+    if without_text := count_articles_without_text(db_session):
+        logger.warning(f"{without_text} articles have no plain text, so must be fetched again to be tokenized again")
+
+    number_of_articles = 0
+    for articles in iter_retokenized_articles(db_session, text_processor, batch_size, workers, force):
+        update_tokenized_content_bulk(db_session, articles)
+        number_of_articles += len(articles)
+        logger.info(f"Tokenized {number_of_articles} articles again")
+    return number_of_articles
+
+
+def _parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="wikipedia.retokenize", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="The number of processes to tokenize with.")
+    parser.add_argument(
+        "--force", action="store_true", help="Also tokenize articles already tokenized by the text processor."
+    )
+    parser.add_argument(
+        "--text-processor",
+        choices=TextProcessorTypes.values(),
+        help="Defaults to the text processor configured for the app.",
+    )
+    parser.add_argument("--database-url", help="Defaults to the database configured for the app.")
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> None:
+    parsed_args = _parse_args(args)
+    settings = Settings()
+    text_processor = (
+        TEXT_PROCESSORS[TextProcessorTypes(parsed_args.text_processor)]
+        if parsed_args.text_processor else settings.text_processor
+    )
+    engine = create_engine(parsed_args.database_url or settings.database_dsn)
+
+    start = time.perf_counter()
+    with sessionmaker(bind=engine)() as db_session:
+        number_of_articles = retokenize_articles(
+            db_session,
+            text_processor=text_processor,
+            batch_size=parsed_args.batch_size,
+            workers=parsed_args.workers,
+            force=parsed_args.force,
+        )
+    logger.info(f"Tokenized {number_of_articles} articles again in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv[1:])
@@ -6,7 +6,7 @@ from typing import Optional
 from pydantic import BaseModel, Field, field_validator
 
 from common.schema import Actions, DefaultParams
-from wikipedia.models import Article
+from wikipedia.models import Article, compress_text
 
 
 class ListTypes(Enum):
@@ -17,6 +17,14 @@ class ListTypes(Enum):
     RANDOM = "random"
 
 
+class PropTypes(Enum):
+    """
+    Page properties available from the Wiki API, of which we only use `info` for now. See
+    https://www.mediawiki.org/wiki/API:Properties for more.
+    """
+    INFO = "info"
+
+
 def reformat_tokenized_content(content: str) -> list[str]:
     """ Reformats the string representation of tokenized content into a list of strings.
 
@@ -29,6 +37,11 @@ def reformat_tokenized_content(content: str) -> list[str]:
 class ArticleSchema(BaseModel, from_attributes=True):
     title: str
     tokenized_content: Optional[list[str]]
+    # the plain text is only set when writing articles, as it is not needed to index them or in API responses
+    text: Optional[str] = Field(default=None, exclude=True)
+    # the compressed plain text, when reading articles from the database, e.g. to add to the forward index
+    raw_content: Optional[bytes] = Field(default=None, exclude=True)
+    text_processor: Optional[str] = None
 
     @field_validator('tokenized_content', mode="before")
     def validate_tokenized_content(cls, value: str | list[str] | None):
@@ -47,7 +60,9 @@ class ArticleSchema(BaseModel, from_attributes=True):
         """ Convert an ArticleSchema to a DB model. """
         return Article(
             title=self.title,
-            tokenized_content=",".join(self.tokenized_content),
+            tokenized_content=",".join(self.tokenized_content or []),
+            raw_content=compress_text(self.text),
+            text_processor=self.text_processor,
         )
 
 
@@ -67,3 +82,9 @@ class ContentGet(DefaultParams):
     """ Schema for fetching the content of an article. """
     action: Actions = Actions.PARSE
     page: str
+
+
+class PageInfoGet(DefaultParams):
+    """ Schema for fetching information about pages, including the ID of their latest revision. """
+    prop: PropTypes = PropTypes.INFO
+    titles: str  # up to 50 titles, separated by "|"
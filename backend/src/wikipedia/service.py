@@ -4,13 +4,16 @@ DB service for CRUD operations on Wikipedia Article model.
 from __future__ import annotations
 
 import logging
-from typing import Sequence
+from typing import Iterable, Optional, Sequence
 
 import requests
-from sqlalchemy import select
+from sqlalchemy import Row, func, or_, select, update
 from sqlalchemy.orm import Session
 
+from common.metrics import INGEST_PHASE_SECONDS
+from common.schema import WIKIPEDIA_API_URL
 from index.nlp import TextProcessor
+from wikipedia.cache import ResponseCache
 from wikipedia.client import get_and_parse_random_articles
 from wikipedia.models import Article
 from wikipedia.schema import ArticleSchema, ArticleTitlesGet
@@ -44,6 +47,87 @@ def filter_articles(session: Session, limit: int | None = None, offset: int | No
     return session.scalars(query).all()
 
 
+def filter_existing_titles(session: Session, titles: Iterable[str]) -> set[str]:
+    """ Get which of the given titles already have an article in the database.
+
+    :param session: The database session.
+    :param titles: The titles to look for.
+    """
+    query = select(Article.title).where(Article.title.in_(titles))
+    return set(session.scalars(query).all())
+
+
+def filter_articles_to_retokenize(
+        session: Session,
+        analyzer_id: str | None,
+        after_title: str | None = None,
+        limit: int | None = None,
+        force: bool = False,
+) -> Sequence[Row]:
+    """ Get the title and compressed plain text of articles that were tokenized by another text processor.
+
+    Articles are ordered by title, so that they can be fetched in batches by passing the last title of each batch as
+    `after_title`. Articles without plain text cannot be tokenized again, so are left out.
+
+    :param session: The database session.
+    :param analyzer_id: The ID of the analyzer the articles should be tokenized by.
+    :param after_title: The (optional) title to get articles after.
+    :param limit: The (optional) maximum number of articles to return.
+    :param force: Whether to get articles that were already tokenized by the text processor too.
+    """
+    query = select(Article.title, Article.raw_content).where(Article.raw_content.is_not(None)).order_by(Article.title)
+    if not force and analyzer_id:
+        query = query.where(or_(Article.text_processor.is_(None), Article.text_processor != analyzer_id))
+    if after_title is not None:
+        query = query.where(Article.title > after_title)
+    if limit:
+        query = query.limit(limit)
+
+    return session.execute(query).all()
+
+
+def count_articles_tokenized_by_other_analyzers(session: Session, analyzer_id: str) -> int:
+    """ Count the articles tokenized by another analyzer than the given one, or by an unknown one, which an index for it
+    skips.
+
+    :param session: The database session.
+    :param analyzer_id: The ID of the analyzer the articles should be tokenized by.
+    """
+    query = select(func.count()).select_from(Article).where(
+        or_(Article.text_processor.is_(None), Article.text_processor != analyzer_id)
+    )
+    return session.scalar(query)
+
+
+def count_articles_without_text(session: Session) -> int:
+    """ Count the articles whose plain text was not kept, so cannot be tokenized again without fetching them.
+
+    :param session: The database session.
+    """
+    query = select(func.count()).select_from(Article).where(Article.raw_content.is_(None))
+    return session.scalar(query)
+
+
+def update_tokenized_content_bulk(session: Session, articles: list[ArticleSchema]):
+    """ Update the tokenized content, and the text processor it was tokenized by, of a list of articles.
+
+    :param session: The database session.
+    :param articles: The articles to update.
+    """
+    session.execute(
+        update(Article),
+        [
+            {
+                "title": article.title,
+                "tokenized_content": ",".join(article.tokenized_content or []),
+                "text_processor": article.text_processor,
+            }
+            for article in articles
+        ],
+    )
+    session.commit()
+
+
 def add_article(session: Session, article: Article):
     """ Add an article to the database.
 
@@ -88,6 +172,8 @@ def fetch_and_add_articles(
         db_session: Session,
         params: ArticleTitlesGet,
         text_processor: TextProcessor,
+        cache: Optional[ResponseCache] = None,
+        url: str = WIKIPEDIA_API_URL,
 ) -> list[ArticleSchema]:
     """
     Fetches articles from Wikipedia and adds them to the database.
@@ -95,9 +181,11 @@ def fetch_and_add_articles(
     :param db_session: The database session.
     :param params: The parameters to pass to the Wikipedia API.
     :param text_processor: The text processor to use to process the articles.
+    :param cache: An (optional) cache of API responses.
+    :param url: The URL of the API, e.g. of a stub server for load tests.
     """
     with requests.Session() as session:
-        articles = get_and_parse_random_articles(session, params, text_processor)
+        articles = get_and_parse_random_articles(session, params, text_processor, cache=cache, url=url)
     logger.info(f"{len(articles)} articles fetched!")
     add_articles_bulk(
         session=db_session,
@@ -115,8 +203,9 @@ def get_articles_as_schema(db_session: Session, **filter_kwargs) -> list[Article
     :param db_session: The database session.
     :param filter_kwargs: Keyword arguments to filter the articles by.
     """
-    db_articles = filter_articles(session=db_session, **filter_kwargs)
-    return [
-        ArticleSchema.model_validate(article)
-        for article in db_articles
-    ]
+    with INGEST_PHASE_SECONDS.labels("db_load").time():
+        db_articles = filter_articles(session=db_session, **filter_kwargs)
+        return [
+            ArticleSchema.model_validate(article)
+            for article in db_articles
+        ]